@@ -1,6 +1,26 @@
-from .config import IceboxConfigCommand
-from .clone import IceboxCloneCommand
-from .freeze import IceboxFreezeCommand
-from .init import IceboxInitCommand
-from .list import IceboxListCommand
-from .thaw import IceboxThawCommand
+import importlib
+
+# command classes mapped to the modules that define them. Commands are
+# imported on first use, so that running one command does not pay for the
+# imports (e.g. storage client libraries) of the others.
+_COMMANDS = {
+    'IceboxConfigCommand': 'config',
+    'IceboxCloneCommand': 'clone',
+    'IceboxFreezeCommand': 'freeze',
+    'IceboxInitCommand': 'init',
+    'IceboxListCommand': 'list',
+    'IceboxThawCommand': 'thaw',
+}
+
+__all__ = list(_COMMANDS)
+
+
+def __getattr__(name: str):
+    if name not in _COMMANDS:
+        raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+    module = importlib.import_module(f".{_COMMANDS[name]}", __name__)
+    return getattr(module, name)
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
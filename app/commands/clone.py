@@ -16,15 +16,11 @@ class IceboxCloneCommand:
         # ensure that the icebox exists
         if not self.icebox:
             raise IceboxError("Icebox name required.")
-        folders, _ = self.storage.ListRemote()
         if not self.icebox.endswith(config.REMOTE_PATH_DELIMITER):
             self.icebox = f"{self.icebox}{config.REMOTE_PATH_DELIMITER}"
-        exists = False
-        for f in folders:
-            if f.name == self.icebox:
-                exists = True
-                break
-        if not exists:
+        # probe the icebox file rather than listing every icebox
+        if not self.storage.Exists(
+                f"{self.icebox}{config.ICEBOX_FILE_NAME}"):
             raise IceboxError(f"No icebox named '{self.icebox} found!'")
 
         # ensure that the path is a fresh folder
@@ -124,6 +124,9 @@ Enter your choice [1]:""", end=" ")
     def _configure_gcp(self, storage_config: Dict[str, str]):
         """Configure GoogleCloudStorage to check for any errors.
 
+        The bucket is checked (and created if needed) here, and recorded as
+        validated so that later commands use it without checking again.
+
         Raises
             TODO
         """
@@ -132,6 +135,7 @@ Enter your choice [1]:""", end=" ")
             storage_config['credentials'],
             storage_config['default_location'],
             storage_config['bucket'])
+        storage_config['validated_bucket'] = storage_config['bucket']
 
     def _create_aws_config(self):
         raise IceboxError("Not implemented!")
@@ -1,10 +1,14 @@
+import os
 import sys
+import time
 import typing
 
+from concurrent import futures
 from pathlib import Path
 
 from app import config
 from app.common import utils
+from app.elements.icebox import FrozenFile
 from app.elements.icebox import Icebox
 from app.elements.icebox import IceboxError
 from app.storage.icebox_storage import IceboxStorage
@@ -12,8 +16,10 @@ from app.storage.icebox_storage import IceboxStorageError
 
 
 class IceboxFreezeCommand:
-    def __init__(self, path: str):
+    def __init__(self, path: str, jobs: int = config.ICEBOX_JOBS):
         self.path: Path = utils.ResolvePath(path)
+        self.jobs: int = jobs
+        self.mode: str = config.ICEBOX_FREEZE_MODE
         self.icebox: Icebox = utils.FindIcebox(self.path)
         self.storage: IceboxStorage = utils.GetStorage()
 
@@ -25,71 +31,97 @@ class IceboxFreezeCommand:
             raise IceboxError(
                 f"'{self.path}' is not in an icebox! Please initialize first.")
 
+        if self.mode not in ["path", "content", "chunked"]:
+            raise IceboxError(f"Unknown freeze mode '{self.mode}'!")
+
         # good to go
         self.icebox = utils.Synchronize(self.icebox)
+        relpath = utils.GetRelativeRemotePath(str(self.path), self.icebox.path)
+        utils.LoadShards(
+            self.icebox, self.icebox.shards_to_load(relpath),
+            storage=self.storage)
+        # chunks referenced by the icebox do not need to be uploaded again.
+        self.known_chunks = frozenset(
+            digest for frozen_file in self.icebox.frozen_files.values()
+            for digest, _ in frozen_file.chunks or [])
         print(f"Freezing '{self.path}'...")
 
-        # create list of files in the path that need to be frozen
-        filelist = self.__get_files_to_freeze()
-        # TODO: temporary limit on maximum number of files to freeze at a
-        # time. Might not be required so we can remove it later.
-        if len(filelist) > 50:
-            raise IceboxError("Too many files to freeze!")
+        # files are uploaded as the walk finds them, and each one is frozen
+        # as soon as its upload finishes
+        uploads = utils.RunConcurrently(
+            self.__upload_file, self.__get_files_to_freeze(), jobs=self.jobs)
+        try:
+            for i, ((filepath, _), upload) in enumerate(uploads):
+                sys.stdout.write(f"Freezing {i+1} -> {filepath}... \r")
+                sys.stdout.flush()
+                self.__freeze_file(filepath, upload)
+        finally:
+            # files replaced so far must be recorded even if the run fails
+            utils.Finalize(self.icebox)
 
-        # for each file in filelist, freeze file recursively
-        for i in range(len(filelist)):
-            sys.stdout.write(
-                f"Freezing {i+1}/{len(filelist)} -> {filelist[i]}... \r")
-            sys.stdout.flush()
-            self.__freeze_file(filelist[i])
-        utils.Finalize(self.icebox)
+    def __get_files_to_freeze(
+            self) -> typing.Iterator[typing.Tuple[str, os.stat_result]]:
+        """Yield the files in the path that need to be frozen.
 
-    def __get_files_to_freeze(self) -> typing.List[str]:
-        filelist = []
+        Files are yielded along with their stat as the path is walked.
+        """
         if self.path.is_dir():
-            filelist = [f for f in sorted(self.path.glob("**/*"))
-                        if f.is_file() and f.stem != config.ICEBOX_FILE_NAME]
+            filelist = utils.WalkFiles(self.path)
         else:
-            filelist = [self.path]
+            filelist = [(str(self.path), self.path.stat())]
         # filter out files that have already been frozen
         # TODO: frozen files might have been locally overwritten. Saving file
         # metadata would help in identifying such cases.
-        filtered_filelist = []
-        for f in filelist:
-            if (utils.GetRelativeRemotePath(str(f), self.icebox.path)
+        for filepath, stat in filelist:
+            if (utils.GetRelativeRemotePath(filepath, self.icebox.path)
                     in self.icebox.frozen_files):
-                if f.stat().st_size == 0:
-                    print(f"Skipping frozen file at {str(f)}.")
-                else:
-                    # TODO introduce flag or env variable to change
-                    # this behaviour.
-                    print(f"Found locally overwritten file at {str(f)}.")
-                    filtered_filelist.append(f)
-            else:
-                filtered_filelist.append(f)
-        return filtered_filelist
+                if stat.st_size == 0:
+                    print(f"Skipping frozen file at {filepath}.")
+                    continue
+                # TODO introduce flag or env variable to change
+                # this behaviour.
+                print(f"Found locally overwritten file at {filepath}.")
+            yield filepath, stat
 
-    def __freeze_file(self, filepath: str):
+    def __freeze_file(self, filepath: str, upload: futures.Future):
         try:
-            self.__upload_file(filepath)
-        except IceboxStorageError as e:
+            frozen_file = upload.result()
+        except (IceboxStorageError, OSError) as e:
+            # e.g. removed since the walk found it
             # print error if upload was unsuccessful
             print(e)
             print(f"Unable to freeze {filepath}! Check stack trace for error.")
         else:
             # if successful, add to icebox
-            self.icebox.frozen_files.append(
-                utils.GetRelativeRemotePath(filepath, self.icebox.path))
+            relpath = utils.GetRelativeRemotePath(filepath, self.icebox.path)
+            self.icebox.add_frozen_file(relpath, frozen_file)
             # replace local with a metadata / preview file
             utils.ReplaceFile(filepath)
 
-    def __upload_file(self, filepath: str):
+    def __upload_file(
+            self, file: typing.Tuple[str, os.stat_result]) -> FrozenFile:
         """Wrapper function to upload file.
 
-        Enables testing by mocking.
+        Takes the path of the file along with its stat from the walk.
+        Enables testing by mocking. Returns the metadata of the frozen file.
 
         Raises
             IceboxStorageError
+            OSError
         """
-        # upload file
-        utils.UploadFile(self.icebox, filepath, storage=self.storage)
+        filepath, stat = file
+        frozen_file = FrozenFile(
+            size=stat.st_size, mtime=stat.st_mtime,
+            digest=utils.HashFile(filepath), frozen_at=time.time(),
+            mode=self.mode)
+        if self.mode == "content":
+            utils.UploadBlob(
+                filepath, frozen_file.digest, storage=self.storage)
+        elif self.mode == "chunked":
+            frozen_file.chunks = utils.UploadChunks(
+                filepath, self.known_chunks, storage=self.storage)
+        else:
+            # upload file
+            frozen_file.generation = utils.UploadFile(
+                self.icebox, filepath, storage=self.storage)
+        return frozen_file
@@ -1,42 +1,61 @@
 from __future__ import annotations
 
+import heapq
+import io
+import itertools
+import json
 import os
+import sys
 
 from datetime import datetime
 from pathlib import Path
-from typing import Any, List
+from typing import Any, Iterable, Iterator, List, Optional, TextIO, Tuple
 
 from pydantic import BaseModel
 
+from app import config
 from app.elements.icebox import IceboxError
 from app.common import utils
+from app.elements.icebox import FrozenFile
 from app.elements.icebox import Icebox
+from app.elements.icebox_files import IceboxLocalFile
+from app.elements.icebox_files import IceboxRemoteFile
 from app.storage.icebox_storage import IceboxStorage
 from app.storage.icebox_storage import IceboxStorageError
 
 
 class IceboxListCommand:
-    def __init__(self, path: str = None, remote: bool = False):
+    def __init__(
+            self, path: str = None, remote: bool = False,
+            limit: Optional[int] = None, sort: str = "name",
+            reverse: bool = False, as_json: bool = False,
+            rebuild: bool = False):
+        if sort not in SORT_KEYS:
+            raise IceboxError(
+                f"Unknown sort '{sort}', expected one of "
+                f"{', '.join(SORT_KEYS)}.")
+        if limit is not None and limit < 0:
+            raise IceboxError("Limit must not be negative.")
+        if rebuild and (path or not remote):
+            raise IceboxError(
+                "Only the remote listing of all iceboxes can be rebuilt.")
         self.path = path
         self.remote = remote
+        self.limit = limit
+        self.sort = sort
+        self.reverse = reverse
+        self.as_json = as_json
+        self.rebuild = rebuild
         self.storage: IceboxStorage = utils.GetStorage()
 
     def run(self):
         try:
             if self.remote:
-                result = self.list_remote()
+                print(self.list_remote().output, end="")
             else:
-                result =self.list_local()
-            print(result.output)
-            
-            # TODO: alternate formatting option
-            # max_time_width = len(
-            #     datetime.now().strftime(config.ICEBOX_TIME_FORMAT))
-            # for lf in files:
-            #     updated = lf.updated.strftime(config.ICEBOX_TIME_FORMAT)
-            #     print(
-            #         f"{lf.size:{max_size_width}} - {updated} - "
-            #         f"{lf.name}")
+                # local listings are written as the directory is read
+                icebox, entries = self.__scan_local()
+                self.__write(entries, sys.stdout, icebox=icebox)
         except IceboxStorageError as e:
             print(e)
             print(
@@ -48,13 +67,60 @@ class IceboxListCommand:
         
         icebox_name
         (* frozen, ~ locally modified)
-        total 5
-        
+
           spectacular-numbat_1/
           spectacular-numbat_2/
         * spectacular_file_1
         ~ spectacular_file_2
           spectacular_file_3
+
+        total 5
+        """
+        icebox, entries = self.__scan_local()
+        entries = list(entries)
+        output = io.StringIO()
+        self.__write(entries, output, icebox=icebox)
+        return ListResult(
+            output=output.getvalue(),
+            files=[x for x in entries if not x.is_dir],
+            folders=[x for x in entries if x.is_dir],
+            is_remote=False, icebox=icebox)
+
+    def list_remote(self) -> ListResult:
+        """Print remote iceboxes.
+
+        Print contents of the mentioned remote path. Print all iceboxes
+        within the configured storage if no path is given, along with their
+        number of files, total size and last change if they are known.
+        
+        spectacular-numbat_1/  (12 files, 1.2 MiB, 18 Oct 2026 10:31)
+        spectacular-numbat_2/
+        spectacular_file_1
+        spectacular_file_2
+        spectacular_file_3
+
+        total 5
+        """
+        
+        if self.path:
+            folders, files = self.__list_remote_icebox()
+        else:
+            folders, files = self.__list_iceboxes()
+        entries = list(self.__select(folders + files))
+        output = io.StringIO()
+        self.__write(entries, output)
+        return ListResult(
+            output=output.getvalue(),
+            files=[x for x in entries if not x.is_dir],
+            folders=[x for x in entries if x.is_dir],
+            is_remote=True, icebox=None)
+
+    def __scan_local(self) -> Tuple[Icebox, Iterator[IceboxLocalFile]]:
+        """Resolve the local path and scan it.
+
+        Raises
+            IceboxError
+            IceboxStorageError
         """
         # check if path is absolute or relative
         p = Path(os.getcwd())
@@ -75,51 +141,182 @@ class IceboxListCommand:
         # good to go
         icebox = utils.Synchronize(icebox)
         relative_path = utils.GetRelativeRemotePath(str(p), icebox.path)
-        folders, files = self.storage.List(icebox, relative_path)
-        total_items = len(files) + len(folders)
-        output = f"{os.linesep}{icebox.id}{os.linesep}"
-        output += f"total {total_items}{os.linesep}"
-        output += f"(* frozen, ~ locally modified){os.linesep}{os.linesep}"
-        for folder in folders:
-            output += f"  {folder.name}{os.linesep}"
-        for file in files:
-            marker = " "
-            if file.is_frozen:
-                marker = "*"
-            if file.is_modified:
-                marker = "~"
-            output += f"{marker} {file.name}{os.linesep}"
-        output += os.linesep
-        return ListResult(
-            output=output, files=files, folders=folders,
-            is_remote=False, icebox=icebox)
+        utils.LoadShards(
+            icebox, icebox.shards_to_load(relative_path, recursive=False),
+            storage=self.storage)
+        return icebox, self.__select(
+            self.storage.Scan(icebox, relative_path))
 
-    def list_remote(self) -> ListResult:
-        """Print remote iceboxes.
+    def __select(self, entries: Iterable[Any]) -> Iterator[Any]:
+        """Apply the sort order and limit to the listed entries.
 
-        Print contents of the mentioned remote path. Print all iceboxes
-        within the configured storage if no path is given.
-        
-        total 5
-        
-        spectacular-numbat_1/
-        spectacular-numbat_2/
-        spectacular_file_1
-        spectacular_file_2
-        spectacular_file_3
+        Folders come before files. Unsorted listings are never held in
+        memory, and limited ones only hold as many entries as the limit.
         """
-        
-        folders, files = self.storage.ListRemote(path=self.path)
-        total_items = len(files) + len(folders)
-        output = f"{os.linesep}total {total_items}{os.linesep}{os.linesep}"
-        for folder in folders:
-            output += f"{folder.name}{os.linesep}"
-        for file in files:
-            output += f"{file.name}{os.linesep}"
-        output += os.linesep
-        return ListResult(
-            output=output, files=files, folders=folders,
-            is_remote=True, icebox=None)
+        key = SORT_KEYS[self.sort]
+        if not key:
+            return itertools.islice(entries, self.limit)
+
+        def order(entry: Any) -> tuple:
+            # folders first in either direction
+            return (entry.is_dir == self.reverse, key(entry))
+
+        if self.limit is None:
+            return iter(sorted(entries, key=order, reverse=self.reverse))
+        select = heapq.nlargest if self.reverse else heapq.nsmallest
+        return iter(select(self.limit, entries, key=order))
+
+    def __write(
+            self, entries: Iterable[Any], out: TextIO,
+            icebox: Optional[Icebox] = None):
+        """Write entries to out one line at a time.
+
+        Local listings are marked with whether files are frozen or modified.
+        With as_json, every entry is written as a line of JSON instead.
+        """
+        if self.as_json:
+            for entry in entries:
+                out.write(json.dumps(_to_json(entry)))
+                out.write("\n")
+            return
+        if icebox:
+            out.write(f"{os.linesep}{icebox.id}{os.linesep}")
+            out.write(f"(* frozen, ~ locally modified){os.linesep}")
+        out.write(os.linesep)
+        total = 0
+        for entry in entries:
+            if icebox:
+                marker = " "
+                if entry.is_frozen:
+                    marker = "*"
+                if entry.is_modified:
+                    marker = "~"
+                out.write(f"{marker} ")
+            out.write(entry.name)
+            if getattr(entry, 'file_count', None) is not None:
+                out.write(f"  ({_summary(entry)})")
+            out.write(os.linesep)
+            total += 1
+        out.write(f"{os.linesep}total {total}{os.linesep}{os.linesep}")
+
+    def __list_iceboxes(self) -> Tuple[
+            List[IceboxRemoteFile], List[IceboxRemoteFile]]:
+        """List all iceboxes from the registry of the storage.
+
+        Storages without a registry are listed instead.
+
+        Raises
+            IceboxError
+            IceboxStorageError
+        """
+        if self.rebuild:
+            registry = utils.RebuildRegistry(storage=self.storage)
+        else:
+            registry, _ = utils.ReadRegistry(storage=self.storage)
+        if registry is None:
+            return utils.ListRemoteCached(storage=self.storage)
+        delimiter = config.REMOTE_PATH_DELIMITER
+        folders = []
+        for name, entry in sorted(registry['iceboxes'].items()):
+            folder = IceboxRemoteFile(
+                name=f"{name}{delimiter}", size=entry.get('size', 0),
+                is_dir=True, file_count=entry.get('files'))
+            if entry.get('updated'):
+                folder.updated = datetime.fromtimestamp(entry['updated'])
+            folders.append(folder)
+        return folders, []
+
+    def __list_remote_icebox(self) -> Tuple[
+            List[IceboxRemoteFile], List[IceboxRemoteFile]]:
+        """List a path inside a remote icebox.
+
+        The contents are listed from the remote icebox file, which knows
+        about every frozen file irrespective of how it is stored.
+
+        Raises
+            IceboxStorageError
+        """
+        delimiter = config.REMOTE_PATH_DELIMITER
+        icebox_name, _, relpath = self.path.strip(delimiter).partition(
+            delimiter)
+        icebox = utils.ReadRemoteIcebox(icebox_name, storage=self.storage)
+        relpath = relpath.strip(delimiter)
+        utils.LoadShards(
+            icebox, icebox.shards_to_load(relpath, recursive=False),
+            storage=self.storage)
+
+        folders, files = [], []
+        if relpath in icebox.frozen_files:
+            files.append(_remote_from_frozen_file(
+                relpath.rpartition(delimiter)[2],
+                icebox.frozen_files[relpath]))
+        else:
+            for name, is_dir in icebox.path_index().children(relpath):
+                if is_dir:
+                    folders.append(IceboxRemoteFile(
+                        name=f"{name}{delimiter}", is_dir=True))
+                else:
+                    child = f"{relpath}{delimiter}{name}" if relpath else name
+                    files.append(_remote_from_frozen_file(
+                        name, icebox.frozen_files[child]))
+            if not relpath:
+                # shards that are not loaded are top level folders too
+                names = {folder.name for folder in folders}
+                for name in icebox.shards:
+                    if f"{name}{delimiter}" not in names:
+                        folders.append(IceboxRemoteFile(
+                            name=f"{name}{delimiter}", is_dir=True))
+                folders = sorted(folders, key=lambda x: x.name)
+            if relpath and not folders and not files:
+                raise IceboxStorageError("Path not found!")
+        return folders, files
+
+
+def _timestamp(entry: Any) -> float:
+    if isinstance(entry, IceboxLocalFile):
+        return entry.mtime or 0
+    return entry.updated.timestamp() if entry.updated else 0
+
+
+def _to_json(entry: Any) -> dict:
+    if isinstance(entry, IceboxLocalFile):
+        return entry.dict()
+    data = {
+        'name': entry.name, 'size': entry.size,
+        'mtime': _timestamp(entry), 'is_dir': entry.is_dir,
+    }
+    if entry.file_count is not None:
+        data['files'] = entry.file_count
+    return data
+
+
+def _summary(entry: IceboxRemoteFile) -> str:
+    size = float(entry.size)
+    for unit in ["B", "KiB", "MiB", "GiB", "TiB"]:
+        if size < 1024 or unit == "TiB":
+            break
+        size /= 1024
+    size = f"{size:.0f} B" if unit == "B" else f"{size:.1f} {unit}"
+    files = "file" if entry.file_count == 1 else "files"
+    summary = f"{entry.file_count} {files}, {size}"
+    if entry.updated:
+        summary += f", {entry.updated.strftime(config.ICEBOX_TIME_FORMAT)}"
+    return summary
+
+
+SORT_KEYS = {
+    'name': lambda x: x.name,
+    'size': lambda x: x.size,
+    'time': _timestamp,
+    'none': None,
+}
+
+
+def _remote_from_frozen_file(
+        name: str, frozen_file: FrozenFile) -> IceboxRemoteFile:
+    return IceboxRemoteFile(
+        name=name, size=frozen_file.size or 0,
+        updated=datetime.fromtimestamp(frozen_file.frozen_at))
 
 
 class ListResult(BaseModel):
@@ -1,9 +1,10 @@
-import os
 import sys
 import typing
 
+from concurrent import futures
 from pathlib import Path
 
+from app import config
 from app.elements.icebox import IceboxError
 from app.common import utils
 from app.elements.icebox import Icebox
@@ -12,8 +13,9 @@ from app.storage.icebox_storage import IceboxStorageError
 
 
 class IceboxThawCommand:
-    def __init__(self, path: str):
+    def __init__(self, path: str, jobs: int = config.ICEBOX_JOBS):
         self.path: Path = utils.ResolvePath(path)
+        self.jobs: int = jobs
         self.icebox: Icebox = utils.FindIcebox(self.path)
         self.storage: IceboxStorage = utils.GetStorage()
 
@@ -22,40 +24,46 @@ class IceboxThawCommand:
         if not self.icebox:
             raise IceboxError(
                 f"'{self.path}' is not in an icebox! Please initialize first.")
+        # synchronize first, the shards a stale icebox refers to may have
+        # been replaced remotely.
+        self.icebox = utils.Synchronize(self.icebox)
         # path should exist locally or should be present in the icebox
         if (not (self.path and self.path.exists())
                 and not utils.ExistsInIcebox(self.path, self.icebox)):
             raise IceboxError("Invalid path!")
 
         # good to go
-        self.icebox = utils.Synchronize(self.icebox)
         print(f"Thawing '{self.path}'...")
 
         # create list of files in the path that need to be thawed
         filelist = self.__get_files_to_thaw()
-        # TODO: temporary limit on maximum number of files to thaw at a time.
-        # Might not be required so we can remove it later.
-        if len(filelist) > 50:
-            raise IceboxError("Too many files to thaw!")
 
-        # for each file in filelist, thaw file recursively
-        for i in range(len(filelist)):
-            sys.stdout.write(
-                f"Thawing {i+1}/{len(filelist)} -> {filelist[i]}... \r")
-            sys.stdout.flush()
-            self.__thaw_file(filelist[i])
-        utils.Finalize(self.icebox)
+        # download files in parallel, straight to their local paths
+        thawed = set()
+        downloads = utils.RunConcurrently(
+            self.__download_file, filelist, jobs=self.jobs)
+        try:
+            for i, (relpath, download) in enumerate(downloads):
+                sys.stdout.write(
+                    f"Thawing {i+1}/{len(filelist)} -> {relpath}... \r")
+                sys.stdout.flush()
+                if self.__thaw_file(relpath, download):
+                    thawed.add(relpath)
+        finally:
+            # remove thawed entries from the icebox once all downloads are
+            # done, even if we were interrupted midway.
+            for f in thawed:
+                self.icebox.remove_frozen_file(f)
+            utils.Finalize(self.icebox)
 
     def __get_files_to_thaw(self) -> typing.List[str]:
         relpath = utils.GetRelativeRemotePath(str(self.path), self.icebox.path)
-        if relpath == '.':
-            # Thaw entire icebox.
-            filelist = self.icebox.frozen_files
-        else:
-            # Thaw the files that are children to the given path.
-            filelist = [
-                f for f in self.icebox.frozen_files
-                if f == relpath or f.startswith(relpath + os.sep)]
+        utils.LoadShards(
+            self.icebox, self.icebox.shards_to_load(relpath),
+            storage=self.storage)
+        # Thaw the given file or the files that are children to the given
+        # path. Thaws the entire icebox for the root path.
+        filelist = self.icebox.path_index().under(relpath)
 
         # Only retain the files that are not overwritten locally.
         filtered_filelist = []
@@ -71,16 +79,20 @@ class IceboxThawCommand:
                 print(f"Skipping locally overwritten file at {str(f)}.")
         return filtered_filelist
 
-    def __thaw_file(self, relpath: str):
+    def __thaw_file(self, relpath: str, download: futures.Future) -> bool:
+        """Check the outcome of a download.
+
+        Returns True if the file was thawed and its entry should be removed
+        from the icebox.
+        """
         try:
-            self.__download_file(relpath)
-        except IceboxStorageError as e:
+            download.result()
+        except (IceboxStorageError, OSError) as e:
             # Print error if download was unsuccessful.
             print(e)
             print(f"Unable to thaw {relpath}! Check stack trace for error.")
-        else:
-            # If successful, remove file's entry from icebox.
-            self.icebox.frozen_files.remove(relpath)
+            return False
+        return True
 
     def __download_file(self, relpath: str):
         """Wrapper function to download file.
@@ -89,6 +101,7 @@ class IceboxThawCommand:
 
         Raises
             IceboxStorageError
+            OSError
         """
         # download file
         utils.DownloadFile(self.icebox, relpath, storage=self.storage)
@@ -0,0 +1,88 @@
+import hashlib
+import math
+import typing
+
+from app import config
+
+# number of bytes that decide a boundary.
+_WINDOW_SIZE = 64
+# bytes are mapped to random values first, so that runs of the same byte
+# (e.g. zero padding) hash like any other data.
+_SPREAD = bytes.maketrans(
+    bytes(range(256)),
+    bytes(hashlib.sha256(bytes([b])).digest()[0] for b in range(256)))
+# coefficients of the rolling hash, one random byte per window position.
+_MULTIPLIER = int.from_bytes(
+    hashlib.sha256(b"icebox chunking 0").digest()
+    + hashlib.sha256(b"icebox chunking 1").digest(), 'little')
+# bytes in front of the windows that only feed their carries.
+_CARRY_SIZE = 16
+# bounds of the number of positions hashed at once.
+_MIN_BLOCK_SIZE = 4 * 1024
+_MAX_BLOCK_SIZE = 1024 * 1024
+
+
+def _WindowHashes(data, begin: int, end: int) -> bytes:
+    """Hash the window ending at every position from begin up to end.
+
+    The hash of a window is the matching byte of the product of the
+    (spread) data and the multiplier, i.e. a polynomial over the bytes of
+    the window plus the carries from the positions right before it.
+    """
+    offset = max(0, begin - _WINDOW_SIZE + 1 - _CARRY_SIZE)
+    block = data[offset:end].translate(_SPREAD)
+    product = int.from_bytes(block, 'little') * _MULTIPLIER
+    return product.to_bytes(
+        len(block) + _WINDOW_SIZE, 'little')[begin - offset:end - offset]
+
+
+def SplitChunks(
+        data: typing.Union[bytes, typing.Any],
+        min_size: int = None,
+        avg_size: int = None,
+        max_size: int = None) -> typing.Iterator[typing.Tuple[int, int]]:
+    """Split data into content defined chunks.
+
+    Yields (offset, length) for every chunk. Boundaries only depend on the
+    bytes around them, so an insertion or deletion changes the chunks next to
+    the edit while the rest of the chunks stay the same. Data can be any
+    buffer that supports slicing (e.g. bytes or mmap).
+
+    Every byte position is a candidate boundary, which is accepted if the
+    rolling hashes of the windows ending there have enough zero bits. The
+    hashes of a whole block of positions come out of a single big integer
+    multiplication and the zeros are found with a substring search, both of
+    which run in C, orders of magnitude faster than rolling the hash over
+    every byte in Python.
+    """
+    min_size = max(min_size or config.ICEBOX_CHUNK_MIN_SIZE, _WINDOW_SIZE)
+    avg_size = max(avg_size or config.ICEBOX_CHUNK_AVG_SIZE, min_size)
+    max_size = max(max_size or config.ICEBOX_CHUNK_MAX_SIZE, avg_size)
+    # accept one in 2^bits positions to reach the average size: a run of
+    # zero hashes followed by a hash with its low bits set to zero.
+    bits = max(0, round(math.log2(max(1, avg_size - min_size))))
+    zeros = b'\0' * (bits // 8)
+    mask = (1 << bits % 8) - 1
+    # blocks about the expected distance to the next boundary
+    block_size = min(max(1 << bits, _MIN_BLOCK_SIZE), _MAX_BLOCK_SIZE)
+
+    size = len(data)
+    start = 0
+    while start < size:
+        limit = min(start + max_size, size)
+        cut = limit
+        # position of the first run that would end the chunk at min_size
+        pos = start + min_size - len(zeros) - 1
+        while cut == limit and pos + len(zeros) < limit:
+            end = min(pos + block_size, limit)
+            hashes = _WindowHashes(data, pos, end)
+            i = hashes.find(zeros)
+            while 0 <= i < len(hashes) - len(zeros):
+                if not hashes[i + len(zeros)] & mask:
+                    cut = pos + i + len(zeros) + 1
+                    break
+                i = hashes.find(zeros, i + 1)
+            # runs may continue into the next block
+            pos = end - len(zeros)
+        yield start, cut - start
+        start = cut
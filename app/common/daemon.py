@@ -0,0 +1,189 @@
+import contextlib
+import io
+import json
+import os
+import socket
+import sys
+import typing
+
+from pathlib import Path
+
+from app import config
+from app.elements.icebox import IceboxError
+
+# A resident daemon runs icebox commands on behalf of the CLI, so that storage
+# clients, access tokens and parsed iceboxes stay warm between commands.
+#
+# The client sends a request as one line of JSON: the command line, its
+# working directory and its icebox environment. The daemon answers with a
+# status line, "OK" if it runs the command or "FALLBACK" if the client should
+# run it itself (e.g. because the environments differ), followed by the
+# output of the command as it is written. Commands are run one at a time.
+
+_OK = b"OK\n"
+_FALLBACK = b"FALLBACK\n"
+
+
+def RunInDaemon(
+        argv: typing.List[str], out: typing.Optional[typing.BinaryIO] = None,
+        socket_path: typing.Optional[str] = None) -> bool:
+    """Run a command in the daemon and copy its output to out.
+
+    Returns False if there is no daemon to run the command, in which case it
+    should be run in process.
+    """
+    if config.ICEBOX_DAEMON == "off" or not hasattr(socket, 'AF_UNIX'):
+        return False
+    path = socket_path or config.ICEBOX_DAEMON_SOCKET
+    if not os.path.exists(path):
+        return False
+    out = out or sys.stdout.buffer
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(path)
+            sock.sendall(_EncodeRequest({
+                'argv': argv, 'cwd': os.getcwd(), 'env': _Environment()}))
+            response = sock.makefile('rb')
+            if response.readline() != _OK:
+                return False
+        except OSError:
+            # stale socket of a daemon that is gone
+            return False
+        for data in iter(lambda: response.read1(io.DEFAULT_BUFFER_SIZE), b""):
+            out.write(data)
+            out.flush()
+    return True
+
+
+def StopDaemon(socket_path: typing.Optional[str] = None) -> bool:
+    """Ask the daemon to stop, False if none is running."""
+    path = socket_path or config.ICEBOX_DAEMON_SOCKET
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(path)
+            sock.sendall(_EncodeRequest({'stop': True}))
+            return sock.makefile('rb').readline() == _OK
+        except OSError:
+            return False
+
+
+def Serve(
+        run: typing.Callable[[typing.List[str]], None],
+        socket_path: typing.Optional[str] = None):
+    """Serve commands on the daemon socket until asked to stop.
+
+    Commands are run by calling run with their command line, with the
+    working directory of the client and their output sent back to it. A
+    command keeps running if its client goes away, so that it completes
+    (and finalizes the icebox) as it would have in process.
+
+    Raises
+        IceboxError
+    """
+    if not hasattr(socket, 'AF_UNIX'):
+        raise IceboxError("Daemon is not supported on this platform.")
+    path = socket_path or config.ICEBOX_DAEMON_SOCKET
+    if os.path.exists(path):
+        if _IsServing(path):
+            raise IceboxError(f"Daemon already running at '{path}'.")
+        os.unlink(path)
+    Path(path).parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as listener:
+        # only the user can connect
+        umask = os.umask(0o177)
+        try:
+            listener.bind(path)
+        finally:
+            os.umask(umask)
+        listener.listen()
+        print(f"Serving icebox commands at '{path}'...")
+        try:
+            serving = True
+            while serving:
+                conn, _ = listener.accept()
+                with conn:
+                    serving = _Handle(conn, run)
+        finally:
+            os.unlink(path)
+
+
+def _Handle(
+        conn: socket.socket,
+        run: typing.Callable[[typing.List[str]], None]) -> bool:
+    """Handle a request, returns False if the daemon should stop."""
+    try:
+        request = json.loads(conn.makefile('rb').readline())
+    except (OSError, ValueError):
+        return True
+    if request.get('stop'):
+        _Send(conn, _OK)
+        return False
+    if request.get('env') != _Environment():
+        # the client is configured differently
+        _Send(conn, _FALLBACK)
+        return True
+    _Send(conn, _OK)
+    writer = _SocketWriter(conn)
+    cwd = os.getcwd()
+    try:
+        os.chdir(request['cwd'])
+        with contextlib.redirect_stdout(writer), \
+                contextlib.redirect_stderr(writer):
+            run(request['argv'])
+    except (Exception, SystemExit) as e:
+        # e.g. argument errors, which exit after printing the usage
+        if not isinstance(e, SystemExit):
+            writer.write(f"{e}\n")
+    finally:
+        os.chdir(cwd)
+    return True
+
+
+def _IsServing(path: str) -> bool:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(path)
+            return True
+        except OSError:
+            return False
+
+
+def _Send(conn: socket.socket, data: bytes):
+    try:
+        conn.sendall(data)
+    except OSError:
+        pass
+
+
+def _EncodeRequest(request: dict) -> bytes:
+    return json.dumps(request).encode() + b"\n"
+
+
+def _Environment() -> typing.Dict[str, str]:
+    """Environment variables that configure icebox, except the daemon."""
+    return {key: value for key, value in os.environ.items()
+            if (key.startswith("ICEBOX_")
+                and not key.startswith("ICEBOX_DAEMON"))
+            or key == "LOCAL_STORAGE_PATH"}
+
+
+class _SocketWriter(io.TextIOBase):
+    """Text stream that sends what is written to a client.
+
+    Output is dropped once the client has gone away.
+    """
+
+    def __init__(self, conn: socket.socket):
+        self._conn = conn
+        self._connected = True
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, s: str) -> int:
+        if self._connected:
+            try:
+                self._conn.sendall(s.encode())
+            except OSError:
+                self._connected = False
+        return len(s)
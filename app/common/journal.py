@@ -0,0 +1,126 @@
+import hashlib
+import json
+import typing
+
+from app import config
+from app.common import manifest_format
+from app.elements.icebox import FrozenFile
+from app.elements.icebox import FrozenFileChange
+from app.elements.icebox import Icebox
+
+# An icebox file is a snapshot of the icebox (a binary manifest or a line of
+# JSON) followed by the journal: one line per change made since, tagged with
+# the sequence number of the segment that recorded it. Remotely, the snapshot
+# is stored as the icebox file and every segment as a separate object in the
+# journal folder next to it. Top level directories with many frozen files are
+# kept in separate shards, which are snapshots of their own, so that
+# commands only load the part of the icebox they work on.
+
+
+def GetJournalPath(icebox_id: str) -> str:
+    return (f"{icebox_id}{config.REMOTE_PATH_DELIMITER}"
+            f"{config.ICEBOX_JOURNAL_FOLDER_NAME}")
+
+
+def GetSegmentPath(icebox_id: str, seq: int) -> str:
+    return (f"{GetJournalPath(icebox_id)}{config.REMOTE_PATH_DELIMITER}"
+            f"{seq:010d}")
+
+
+def GetShardPath(icebox_id: str, name: str, seq: int) -> str:
+    """Remote path of the shard of a top level directory.
+
+    Every version of a shard is written to a new object, so that readers of
+    an older snapshot can still load the shards it refers to.
+    """
+    key = hashlib.sha256(name.encode()).hexdigest()[:32]
+    return (f"{icebox_id}{config.REMOTE_PATH_DELIMITER}"
+            f"{config.ICEBOX_SHARDS_FOLDER_NAME}"
+            f"{config.REMOTE_PATH_DELIMITER}{key}_{seq:010d}")
+
+
+def ParseSegmentName(name: str) -> typing.Optional[int]:
+    """Sequence number of a segment from its name, None if it is not one."""
+    name = name.rstrip(config.REMOTE_PATH_DELIMITER)
+    return int(name) if name.isdigit() else None
+
+
+def EncodeSnapshot(icebox: Icebox) -> bytes:
+    """Encode a snapshot in the configured manifest format.
+
+    Falls back to JSON for iceboxes that the binary format cannot represent.
+    """
+    meta = {
+        'id': icebox.id,
+        'journal_seq': icebox.journal_seq,
+        'shards': icebox.shards,
+    }
+    if config.ICEBOX_MANIFEST_FORMAT == "binary":
+        try:
+            return manifest_format.Encode(
+                meta, icebox.frozen_files,
+                compression=config.ICEBOX_MANIFEST_COMPRESSION)
+        except ValueError:
+            pass
+    data = Icebox.dict(icebox)
+    return json.dumps(data).encode() + b"\n"
+
+
+def EncodeSegment(seq: int, changes: typing.List[FrozenFileChange]) -> bytes:
+    lines = []
+    for relpath, frozen_file in changes:
+        record = {
+            'seq': seq,
+            'path': relpath,
+            'file': (frozen_file.dict(exclude_none=True)
+                     if frozen_file is not None else None),
+        }
+        lines.append(json.dumps(record).encode() + b"\n")
+    return b"".join(lines)
+
+
+def ApplySegments(icebox: Icebox, data: bytes):
+    """Replay journaled changes on top of an icebox.
+
+    Changes from segments the icebox already includes are skipped.
+    """
+    applied_seq = icebox.journal_seq
+    for line in data.splitlines():
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        if record['seq'] <= applied_seq:
+            continue
+        frozen_file = record.get('file')
+        icebox.apply_change(
+            record['path'],
+            (FrozenFile.parse(frozen_file)
+             if frozen_file is not None else None),
+            record['seq'])
+        icebox.journal_seq = max(icebox.journal_seq, record['seq'])
+
+
+def Load(data: bytes, icebox_class=Icebox, **kwargs) -> Icebox:
+    """Load an icebox from a snapshot followed by its journal.
+
+    The snapshot can be binary or JSON, and data can be any buffer that
+    supports slicing (e.g. bytes or mmap).
+
+    Additional keyword arguments are passed on to icebox_class and take
+    precedence over the values in the snapshot.
+    """
+    frozen_files = None
+    if manifest_format.IsBinary(data):
+        values, frozen_files, size = manifest_format.Decode(data)
+        segments = data[size:]
+    else:
+        data = bytes(data)
+        snapshot, _, segments = data.partition(b"\n")
+        try:
+            values = json.loads(snapshot)
+        except ValueError:
+            # icebox files without a journal may span multiple lines.
+            values, segments = json.loads(data), b""
+    icebox = icebox_class.parse(values, frozen_files=frozen_files, **kwargs)
+    ApplySegments(icebox, segments)
+    return icebox
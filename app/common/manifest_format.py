@@ -0,0 +1,251 @@
+import json
+import struct
+import typing
+import zlib
+
+from app.elements.icebox import FrozenFile
+
+# Binary encoding of icebox snapshots.
+#
+# A manifest starts with a fixed header (magic, version, flags and the length
+# of the body that follows). The body holds the icebox fields other than the
+# frozen files as JSON, followed by the frozen files:
+# * their paths in sorted order, each stored as the length of the prefix it
+#   shares with the previous path and the remaining suffix (front coding).
+# * their metadata in fixed width columns, one value per path.
+# * the chunks of chunked files, concatenated in path order.
+# All integers are little endian. The body may be compressed with zlib.
+
+MAGIC = b"\x89ICEBOX\n"
+VERSION = 1
+
+_HEADER = struct.Struct("<8sBB6xQ")
+_COMPRESSED = 0x1
+
+_MODES = ["path", "content", "chunked"]
+_HAS_DIGEST = 0x1
+_HAS_GENERATION = 0x2
+_HAS_CHUNKS = 0x4
+_DIGEST_SIZE = 32
+
+
+def IsBinary(buffer) -> bool:
+    return buffer[:len(MAGIC)] == MAGIC
+
+
+def Encode(
+        meta: dict, frozen_files: typing.Mapping[str, FrozenFile],
+        compression: str = "none") -> bytes:
+    """Encode the frozen files of an icebox along with its other fields.
+
+    Raises ValueError if the frozen files cannot be represented, e.g. if a
+    digest is not a SHA-256 digest.
+    """
+    if compression not in ("none", "zlib"):
+        raise ValueError(f"Unknown compression '{compression}'.")
+    paths = sorted(frozen_files)
+    try:
+        body = _encode_body(meta, paths, frozen_files)
+    except (struct.error, TypeError) as e:
+        raise ValueError(f"Unable to encode manifest: {e}")
+    flags = 0
+    if compression == "zlib":
+        body = zlib.compress(body)
+        flags |= _COMPRESSED
+    return _HEADER.pack(MAGIC, VERSION, flags, len(body)) + body
+
+
+def Decode(
+        buffer
+) -> typing.Tuple[dict, typing.Dict[str, FrozenFile], int]:
+    """Decode the manifest at the start of buffer.
+
+    Buffer can be anything that supports the buffer protocol (e.g. bytes or
+    mmap). Returns the other fields of the icebox, its frozen files and the
+    size of the manifest in buffer, after which other data may follow.
+
+    Raises ValueError if buffer does not hold a supported manifest.
+    """
+    with memoryview(buffer) as view:
+        if len(view) < _HEADER.size:
+            raise ValueError("Truncated manifest.")
+        magic, version, flags, body_size = _HEADER.unpack_from(view)
+        if magic != MAGIC:
+            raise ValueError("Not a binary manifest.")
+        if version != VERSION:
+            raise ValueError(f"Unsupported manifest version {version}.")
+        end = _HEADER.size + body_size
+        if len(view) < end:
+            raise ValueError("Truncated manifest.")
+        with view[_HEADER.size:end] as body:
+            if flags & _COMPRESSED:
+                body = zlib.decompress(body)
+            try:
+                meta, frozen_files = _decode_body(body)
+            except (struct.error, IndexError, UnicodeDecodeError) as e:
+                raise ValueError(f"Corrupt manifest: {e}")
+    return meta, frozen_files, end
+
+
+def _encode_varint(value: int, out: bytearray):
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _decode_varint(buffer, pos: int) -> typing.Tuple[int, int]:
+    value, shift = 0, 0
+    while True:
+        byte = buffer[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def _encode_body(
+        meta: dict, paths: typing.List[str],
+        frozen_files: typing.Mapping[str, FrozenFile]) -> bytes:
+    out = bytearray()
+    meta_data = json.dumps(meta).encode()
+    out += struct.pack("<I", len(meta_data)) + meta_data
+    n = len(paths)
+    out += struct.pack("<Q", n)
+
+    # front coded paths
+    coded = bytearray()
+    previous = b""
+    for path in paths:
+        current = path.encode()
+        shared = 0
+        limit = min(len(previous), len(current))
+        while shared < limit and previous[shared] == current[shared]:
+            shared += 1
+        _encode_varint(shared, coded)
+        _encode_varint(len(current) - shared, coded)
+        coded += current[shared:]
+        previous = current
+    out += struct.pack("<Q", len(coded)) + coded
+
+    # metadata columns
+    files = [frozen_files[path] for path in paths]
+    modes, flags, digests, generations, chunk_counts = [], [], [], [], []
+    chunk_digests, chunk_sizes = [], []
+    for f in files:
+        flag = 0
+        mode = f.mode or "path"
+        if mode not in _MODES:
+            raise ValueError(f"Unknown mode '{mode}'.")
+        modes.append(_MODES.index(mode))
+        digest = f.digest
+        if digest is not None:
+            flag |= _HAS_DIGEST
+            digests.append(_digest_bytes(digest))
+        else:
+            digests.append(bytes(_DIGEST_SIZE))
+        generation = f.generation
+        if generation is not None:
+            flag |= _HAS_GENERATION
+        generations.append(generation or 0)
+        chunks = f.chunks
+        if chunks is not None:
+            flag |= _HAS_CHUNKS
+            for chunk_digest, chunk_size in chunks:
+                chunk_digests.append(_digest_bytes(chunk_digest))
+                chunk_sizes.append(chunk_size)
+        chunk_counts.append(len(chunks or []))
+        flags.append(flag)
+    out += struct.pack(f"<{n}Q", *(f.size or 0 for f in files))
+    out += struct.pack(f"<{n}d", *(f.mtime or 0 for f in files))
+    out += struct.pack(f"<{n}d", *(f.frozen_at or 0 for f in files))
+    out += struct.pack(f"<{n}q", *generations)
+    out += bytes(modes) + bytes(flags)
+    out += b"".join(digests)
+    out += struct.pack(f"<{n}I", *chunk_counts)
+    out += b"".join(chunk_digests)
+    out += struct.pack(f"<{len(chunk_sizes)}Q", *chunk_sizes)
+    return bytes(out)
+
+
+def _digest_bytes(digest: str) -> bytes:
+    data = bytes.fromhex(digest)
+    if len(data) != _DIGEST_SIZE:
+        raise ValueError(f"Invalid digest '{digest}'.")
+    return data
+
+
+def _decode_body(body) -> typing.Tuple[dict, typing.Dict[str, FrozenFile]]:
+    pos = 0
+    (meta_size,) = struct.unpack_from("<I", body, pos)
+    pos += 4
+    meta = json.loads(bytes(body[pos:pos + meta_size]))
+    pos += meta_size
+    (n,) = struct.unpack_from("<Q", body, pos)
+    pos += 8
+
+    # front coded paths
+    (coded_size,) = struct.unpack_from("<Q", body, pos)
+    pos += 8
+    end = pos + coded_size
+    paths = []
+    previous = b""
+    while pos < end:
+        shared, pos = _decode_varint(body, pos)
+        length, pos = _decode_varint(body, pos)
+        current = previous[:shared] + bytes(body[pos:pos + length])
+        pos += length
+        paths.append(current.decode())
+        previous = current
+    if len(paths) != n:
+        raise ValueError("Path count does not match.")
+
+    # metadata columns
+    def _column(fmt: str, count: int) -> tuple:
+        nonlocal pos
+        column = struct.unpack_from(f"<{count}{fmt}", body, pos)
+        pos += struct.calcsize(f"<{count}{fmt}")
+        return column
+
+    def _digests(count: int) -> typing.List[bytes]:
+        nonlocal pos
+        size = count * _DIGEST_SIZE
+        if len(body) < pos + size:
+            raise ValueError("Truncated digests.")
+        data = bytes(body[pos:pos + size])
+        pos += size
+        return [data[i:i + _DIGEST_SIZE] for i in range(0, size, _DIGEST_SIZE)]
+
+    sizes = _column("Q", n)
+    mtimes = _column("d", n)
+    frozen_ats = _column("d", n)
+    generations = _column("q", n)
+    modes = _column("B", n)
+    flags = _column("B", n)
+    digests = _digests(n)
+    chunk_counts = _column("I", n)
+    total_chunks = sum(chunk_counts)
+    chunk_digests = _digests(total_chunks)
+    chunk_sizes = _column("Q", total_chunks)
+
+    frozen_files = {}
+    chunk_pos = 0
+    for i, path in enumerate(paths):
+        flag = flags[i]
+        chunks = None
+        if flag & _HAS_CHUNKS:
+            count = chunk_counts[i]
+            chunks = [
+                (chunk_digests[j].hex(), chunk_sizes[j])
+                for j in range(chunk_pos, chunk_pos + count)]
+            chunk_pos += count
+        frozen_files[path] = FrozenFile(
+            size=sizes[i],
+            mtime=mtimes[i],
+            digest=digests[i].hex() if flag & _HAS_DIGEST else None,
+            frozen_at=frozen_ats[i],
+            generation=generations[i] if flag & _HAS_GENERATION else None,
+            mode=_MODES[modes[i]],
+            chunks=chunks)
+    return meta, frozen_files
@@ -1,19 +1,34 @@
+import asyncio
+import contextlib
+import hashlib
+import itertools
 import json
+import mmap
 import os
+import queue
+import random
 import shutil
+import threading
+import time
 import typing
+import uuid
 
+from concurrent import futures
 from pathlib import Path
+from stat import S_ISREG
 from typing import Optional
 
+from pydantic.json import pydantic_encoder
+
 from app import config
+from app.common import chunking
+from app.common import journal
 from app.elements.icebox import Icebox
 from app.elements.icebox import IceboxError
 from app.elements.icebox import LocalIcebox
 from app.elements.icebox_config import IceboxConfig
-from app.storage import google_cloud_storage as gcs
+from app.elements.icebox_files import IceboxRemoteFile
 from app.storage import icebox_storage
-from app.storage import local_storage
 
 
 def ResolveIcebox(icebox_path: Path) -> Path:
@@ -66,26 +81,44 @@ def GetStorage():
     returns a local storage in case of test env irrespective of what was
     configured.
 
+    Storages are built once per configuration and shared by every caller in
+    the process, so that their clients, credentials and connections are
+    reused across operations.
+
     Raises:
         IceboxError
     """
     if config.IsTest():
         # return local storage for test environment
-        return local_storage.LocalStorage(config.LOCAL_STORAGE_PATH)
-
-    # for non-test, read configuration and return the appropriate storage.
-    icebox_config = ReadConfig()
-    if not icebox_config:
-        raise IceboxError("Icebox not configured.")
-
-    if icebox_config.storage_choice == 'GCP':
-        return gcs.GoogleCloudStorage(
-            icebox_config.storage_options['credentials'],
-            icebox_config.storage_options['default_location'],
-            icebox_config.storage_options['bucket'])
+        key = (icebox_storage.IceboxStorageType.LOCAL,
+               config.LOCAL_STORAGE_PATH)
     else:
-        raise IceboxError(
-            f"Invalid storage choice '{icebox_config.storage_choice}'!")
+        # for non-test, read configuration and return the appropriate
+        # storage.
+        icebox_config = ReadConfig()
+        if not icebox_config:
+            raise IceboxError("Icebox not configured.")
+        if icebox_config.storage_choice != 'GCP':
+            raise IceboxError(
+                f"Invalid storage choice '{icebox_config.storage_choice}'!")
+        options = icebox_config.storage_options
+        # buckets validated by `icebox config` are not checked again
+        key = (icebox_storage.IceboxStorageType.GCP, options['credentials'],
+               options['default_location'], options['bucket'],
+               options.get('validated_bucket') == options['bucket'])
+
+    with _storages_lock:
+        storage = _storages.get(key)
+        if storage is None:
+            # backends are imported on first use
+            storage_class = icebox_storage.GetStorageClass(key[0])
+            storage = _storages[key] = storage_class(*key[1:])
+    return storage
+
+
+# storages built by GetStorage, by their type and configuration.
+_storages: typing.Dict[tuple, icebox_storage.IceboxStorage] = {}
+_storages_lock = threading.Lock()
 
 
 def SyncIcebox(remote: str, local: str, storage=None):
@@ -114,14 +147,35 @@ def SyncIcebox(remote: str, local: str, storage=None):
 
 
 def FindIcebox(path: Path) -> typing.Optional[LocalIcebox]:
-    print(f"Finding icebox for {str(path)}")
+    """Find the icebox that path is in.
+
+    The roots of iceboxes found are remembered for the lifetime of the
+    process, and icebox files are only parsed again once they change, so
+    that repeated lookups neither walk up the tree nor parse the file. Every
+    call returns a separate copy of the icebox.
+    """
     if not path:
         return None
+    path = Path(path)
+    # relative paths depend on the working directory and are not remembered
+    roots = _icebox_roots if path.is_absolute() else {}
+    visited = []
     while True:
+        root = roots.get(str(path))
+        if root is not None:
+            icebox = _ReadIceboxCached(Path(root))
+            if icebox:
+                roots.update(dict.fromkeys(visited, root))
+                return icebox
+            # the icebox is gone, forget the paths that led to it
+            for key in [k for k, v in roots.items() if v == root]:
+                del roots[key]
         # try to read icebox in current path and return if one was found
-        icebox = ReadIcebox(path)
+        visited.append(str(path))
+        icebox = _ReadIceboxCached(path)
         if icebox:
-            return LocalIcebox(path=str(path), **(icebox.dict()))
+            roots.update(dict.fromkeys(visited, str(path)))
+            return icebox
         elif path.parent == path:
             # icebox does not exist if we have reached the end of
             # upward iteration.
@@ -131,29 +185,679 @@ def FindIcebox(path: Path) -> typing.Optional[LocalIcebox]:
             path = path.parent
 
 
+def ClearIceboxCache():
+    """Forget the iceboxes found and parsed by FindIcebox."""
+    _icebox_roots.clear()
+    _icebox_files.clear()
+
+
+def _ReadIceboxCached(path: Path) -> typing.Optional[LocalIcebox]:
+    """Read the icebox at path, None if there is none.
+
+    Parsed icebox files are cached along with the stat they were read at.
+    """
+    icebox_path = ResolveIcebox(path)
+    try:
+        st = os.stat(icebox_path)
+    except OSError:
+        _icebox_files.pop(str(icebox_path), None)
+        return None
+    if not S_ISREG(st.st_mode):
+        return None
+    key = (st.st_ino, st.st_mtime_ns, st.st_size)
+    cached = _icebox_files.get(str(icebox_path))
+    if not cached or cached[0] != key:
+        icebox = ReadIceboxFile(
+            icebox_path, icebox_class=LocalIcebox, path=str(path))
+        cached = _icebox_files[str(icebox_path)] = (key, icebox)
+    return cached[1].copy()
+
+
+# icebox roots found by FindIcebox, by the paths they were looked up from.
+_icebox_roots: typing.Dict[str, str] = {}
+# parsed icebox files by their path, along with the stat they were parsed at.
+_icebox_files: typing.Dict[
+    str, typing.Tuple[typing.Tuple[int, int, int], LocalIcebox]] = {}
+
+
 def ReadIcebox(path: Path) -> typing.Optional[Icebox]:
     if not path:
         return None
     icebox_path = ResolveIcebox(path)
     if icebox_path.is_file():
-        with open(icebox_path, 'r') as f:
-            return Icebox(**json.loads(f.read()))
+        return ReadIceboxFile(icebox_path)
     return None
 
 
+def ReadIceboxFile(icebox_path: Path, icebox_class=Icebox, **kwargs) -> Icebox:
+    """Load the icebox from a local icebox file.
+
+    The file is memory mapped, so that binary manifests are decoded without
+    reading them into memory first.
+    """
+    with open(icebox_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return journal.Load(b"", icebox_class=icebox_class, **kwargs)
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return journal.Load(data, icebox_class=icebox_class, **kwargs)
+
+
+def ReadRemoteIcebox(icebox_name: str, storage=None) -> Icebox:
+    """Read the icebox file of a remote icebox.
+
+    Raises
+        IceboxError
+        IceboxStorageError
+    """
+    if not storage:
+        storage = GetStorage()
+    remote_path = (f"{icebox_name}{config.REMOTE_PATH_DELIMITER}"
+                   f"{config.ICEBOX_FILE_NAME}")
+    data = storage.DownloadData(remote_path)
+    try:
+        icebox = journal.Load(data)
+    except Exception:
+        raise IceboxError(
+            f"Error reading remote icebox '{icebox_name}'. Contents might be "
+            "invalid.")
+    FetchJournal(icebox, storage=storage)
+    return icebox
+
+
+def GetListingCachePath(storage, path: Optional[str] = None) -> Path:
+    """Path of the cached listing of a remote path of the storage."""
+    location = hashlib.sha256(storage.Location().encode()).hexdigest()[:32]
+    key = hashlib.sha256((path or "").encode()).hexdigest()
+    return (Path(config.ICEBOX_CACHE_LOCATION) / "listings" / location /
+            f"{key}.json")
+
+
+def ListRemoteCached(
+        path: Optional[str] = None, storage=None
+) -> typing.Tuple[
+        typing.List[IceboxRemoteFile], typing.List[IceboxRemoteFile]]:
+    """List a remote path, reusing a recent listing of it.
+
+    Listings are cached for ICEBOX_LISTING_TTL seconds. The cached listings
+    of a storage are invalidated whenever an icebox is finalized on it, so
+    only changes made from other machines can take up to the TTL to show.
+
+    Raises
+        IceboxStorageError
+    """
+    if not storage:
+        storage = GetStorage()
+    if config.ICEBOX_LISTING_TTL <= 0:
+        return storage.ListRemote(path)
+    cache_path = GetListingCachePath(storage, path)
+    try:
+        with open(cache_path, 'r') as f:
+            cached = json.loads(f.read())
+        if 0 <= time.time() - cached['time'] < config.ICEBOX_LISTING_TTL:
+            return ([IceboxRemoteFile(**x) for x in cached['folders']],
+                    [IceboxRemoteFile(**x) for x in cached['files']])
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    folders, files = storage.ListRemote(path)
+    listing = {'time': time.time(), 'folders': folders, 'files': files}
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+        with open(temp_path, 'w') as f:
+            f.write(json.dumps(listing, default=pydantic_encoder))
+        os.replace(temp_path, cache_path)
+    except OSError:
+        # the listing is still good without the cache
+        pass
+    return folders, files
+
+
+def InvalidateListings(storage=None):
+    """Drop the cached listings of a storage after writing to it."""
+    if not storage:
+        storage = GetStorage()
+    shutil.rmtree(GetListingCachePath(storage).parent, ignore_errors=True)
+
+
+# The registry is a single object in the store of a bucket recording every
+# icebox in it along with its number of frozen files, their total size and
+# when it was last changed, so that iceboxes can be listed without listing
+# the bucket. It is JSON of the form:
+# {"iceboxes": {<id>: {"files": .., "size": .., "updated": ..,
+#                      "shards": {<name>: {"seq": .., "journal_seq": ..,
+#                                          "files": .., "size": ..}}}}}
+# where the shards record the counts of the version of each shard that was
+# summarized along with its journaled changes up to journal_seq, so that
+# shards that are not loaded need not be counted again.
+# Entries of iceboxes that were found before they were summarized are empty.
+
+
+def GetRegistryPath() -> str:
+    return config.REMOTE_PATH_DELIMITER.join(
+        [config.ICEBOX_STORE_PREFIX, "registry.json"])
+
+
+def GetRegistryCachePath(storage) -> Path:
+    """Path of the local copy of the registry of the storage.
+
+    Kept apart from the cached listings, which are dropped on every write,
+    as the copy is only ever used along with its generation.
+    """
+    location = hashlib.sha256(storage.Location().encode()).hexdigest()[:32]
+    return Path(config.ICEBOX_CACHE_LOCATION) / "registry" / f"{location}.json"
+
+
+def ReadRegistry(
+        storage=None) -> typing.Tuple[Optional[dict], Optional[int]]:
+    """Read the registry of the iceboxes in the storage.
+
+    The registry is only downloaded again if it changed since it was last
+    read. Returns the registry, or None if the storage has none (anymore),
+    and its generation.
+
+    Raises
+        IceboxError
+        IceboxStorageError
+    """
+    if not storage:
+        storage = GetStorage()
+    remote_path = GetRegistryPath()
+    cached = None
+    try:
+        with open(GetRegistryCachePath(storage), 'r') as f:
+            cached = json.loads(f.read())
+    except (OSError, ValueError):
+        pass
+    if cached is None and not storage.Exists(remote_path):
+        return None, None
+    try:
+        data, generation = storage.DownloadDataIfModified(
+            remote_path, cached['generation'] if cached else None)
+    except icebox_storage.IceboxStorageError:
+        if cached is None or storage.Exists(remote_path):
+            raise
+        # the registry was deleted since it was cached
+        _CacheRegistry(storage, None, None)
+        return None, None
+    if data is None:
+        return cached['registry'], generation
+    try:
+        registry = json.loads(data)
+        registry['iceboxes'].items()
+    except (ValueError, KeyError, TypeError, AttributeError):
+        raise IceboxError(
+            "Invalid icebox registry. Rebuild it with "
+            "`icebox ls -a --rebuild`.")
+    _CacheRegistry(storage, registry, generation)
+    return registry, generation
+
+
+def _CacheRegistry(
+        storage, registry: Optional[dict], generation: Optional[int]):
+    cache_path = GetRegistryCachePath(storage)
+    if generation is None:
+        cache_path.unlink(missing_ok=True)
+        return
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+        with open(temp_path, 'w') as f:
+            f.write(json.dumps(
+                {'generation': generation, 'registry': registry}))
+        os.replace(temp_path, cache_path)
+    except OSError:
+        pass
+
+
+def UpdateRegistry(
+        update: typing.Callable[[dict], None], storage=None) -> dict:
+    """Change the registry of the storage with update and upload it.
+
+    The upload only goes through if the registry was not changed by anyone
+    else since it was read, otherwise update is applied again to the newer
+    registry after a short, randomized pause. A storage without a registry
+    starts with an empty entry for every icebox already in it.
+
+    Raises
+        IceboxError
+        IceboxStorageError
+    """
+    if not storage:
+        storage = GetStorage()
+    for attempt in range(_REGISTRY_ATTEMPTS):
+        registry, generation = ReadRegistry(storage=storage)
+        if registry is None:
+            folders, _ = storage.ListRemote()
+            registry = {'iceboxes': {
+                f.name.rstrip(config.REMOTE_PATH_DELIMITER): {}
+                for f in folders}}
+        update(registry)
+        data = json.dumps(registry, sort_keys=True).encode()
+        try:
+            generation = storage.UploadData(
+                data, GetRegistryPath(), if_generation_match=generation or 0)
+        except icebox_storage.IceboxStorageConflictError:
+            # back off so that concurrent updates do not keep colliding
+            time.sleep(random.uniform(0, _REGISTRY_BACKOFF * 2 ** attempt))
+            continue
+        _CacheRegistry(storage, registry, generation)
+        return registry
+    raise icebox_storage.IceboxStorageError(
+        "Icebox registry keeps changing, try again later.")
+
+
+# attempts at updating the registry while others are changing it, and the
+# initial upper bound in seconds of the random pause between them.
+_REGISTRY_ATTEMPTS = 5
+_REGISTRY_BACKOFF = 0.1
+
+
+def SummarizeIcebox(
+        icebox: Icebox, previous: Optional[dict] = None,
+        storage=None) -> dict:
+    """Count the frozen files of an icebox and their total size.
+
+    Every shard is counted along with the journal sequence number up to
+    which its changes are included. Shards that are not loaded are counted
+    from the previous summary if it saw the same version of them and all of
+    their journaled changes, and loaded to be counted otherwise. Returns a
+    registry entry without the time of the last change.
+
+    Raises
+        IceboxError
+        IceboxStorageError
+    """
+    previous_shards = (previous or {}).get('shards', {})
+
+    def counted(name: str) -> bool:
+        entry = previous_shards.get(name, {})
+        deferred_seq = icebox.deferred_seq(name)
+        return (entry.get('seq') == icebox.shards[name]
+                and deferred_seq is not None
+                and deferred_seq <= entry.get('journal_seq', entry['seq']))
+
+    LoadShards(icebox, [
+        name for name in icebox.shards_to_load("") if not counted(name)
+    ], storage=storage)
+
+    counts = {}
+    for relpath, frozen_file in icebox.frozen_files.items():
+        count = counts.setdefault(icebox.shard_of(relpath), [0, 0])
+        count[0] += 1
+        count[1] += frozen_file.size or 0
+    shards = {}
+    for name, seq in icebox.shards.items():
+        if not icebox.is_shard_loaded(name):
+            shards[name] = previous_shards[name]
+        else:
+            files, size = counts.get(name, (0, 0))
+            shards[name] = {'seq': seq, 'journal_seq': icebox.journal_seq,
+                            'files': files, 'size': size}
+    unloaded = [shards[name] for name in icebox.shards
+                if not icebox.is_shard_loaded(name)]
+    return {
+        'files': sum(count[0] for count in counts.values()) +
+        sum(shard['files'] for shard in unloaded),
+        'size': sum(count[1] for count in counts.values()) +
+        sum(shard['size'] for shard in unloaded),
+        'shards': shards,
+    }
+
+
+def RegisterIcebox(icebox: Icebox, storage=None):
+    """Record the current summary of an icebox in the registry.
+
+    Raises
+        IceboxError
+        IceboxStorageError
+    """
+    def update(registry: dict):
+        iceboxes = registry['iceboxes']
+        iceboxes[icebox.id] = dict(
+            SummarizeIcebox(
+                icebox, previous=iceboxes.get(icebox.id), storage=storage),
+            updated=time.time())
+
+    UpdateRegistry(update, storage=storage)
+
+
+def RebuildRegistry(storage=None) -> dict:
+    """Regenerate the registry from a full listing of the storage.
+
+    Every icebox is read and counted, which downloads all of its shards.
+    Iceboxes that cannot be read are left out with a warning.
+
+    Raises
+        IceboxError
+        IceboxStorageError
+    """
+    if not storage:
+        storage = GetStorage()
+    folders, _ = storage.ListRemote()
+
+    def summarize(name: str) -> Optional[dict]:
+        remote_path = (f"{name}{config.REMOTE_PATH_DELIMITER}"
+                       f"{config.ICEBOX_FILE_NAME}")
+        if not storage.Exists(remote_path):
+            return None
+        icebox = ReadRemoteIcebox(name, storage=storage)
+        summary = SummarizeIcebox(icebox, storage=storage)
+        # the last change is not recorded, the last freeze is close enough
+        summary['updated'] = max(
+            (f.frozen_at or 0 for f in icebox.frozen_files.values()),
+            default=0) or None
+        return summary
+
+    iceboxes = {}
+    names = [f.name.rstrip(config.REMOTE_PATH_DELIMITER) for f in folders]
+    for name, future in RunConcurrently(summarize, names):
+        try:
+            summary = future.result()
+        except (IceboxError, icebox_storage.IceboxStorageError) as e:
+            print(e)
+            print(f"Unable to read icebox {name}, skipping it.")
+            continue
+        if summary is not None:
+            iceboxes[name] = summary
+
+    def update(registry: dict):
+        registry['iceboxes'] = iceboxes
+
+    return UpdateRegistry(update, storage=storage)
+
+
 def ExistsInIcebox(path: Path, icebox: LocalIcebox) -> bool:
     relpath = GetRelativeRemotePath(str(path), icebox.path)
     if relpath:
-        for f in icebox.frozen_files:
-            if f.startswith(relpath):
-                return True
+        LoadShards(icebox, icebox.shards_to_load(relpath, recursive=False))
+        return icebox.path_index().exists_under(relpath)
     return False
 
 
+def GetSyncStatePath(icebox_path: Path) -> Path:
+    """Path of the file recording the last synchronization of an icebox."""
+    key = hashlib.sha256(
+        str(Path(icebox_path).resolve()).encode()).hexdigest()
+    return Path(config.ICEBOX_CACHE_LOCATION) / "sync" / f"{key}.json"
+
+
+def ReadSyncState(icebox_path: Path) -> Optional[dict]:
+    """Read how the local icebox file was last synchronized with its remote.
+
+    Returns None if the icebox was never synchronized or if the local icebox
+    file changed since.
+    """
+    try:
+        with open(GetSyncStatePath(icebox_path), 'r') as f:
+            state = json.loads(f.read())
+        stat = os.stat(icebox_path)
+    except (OSError, ValueError):
+        return None
+    if (state.get('mtime_ns') != stat.st_mtime_ns
+            or state.get('size') != stat.st_size):
+        return None
+    return state
+
+
+def ReadSyncedGeneration(icebox_path: Path) -> Optional[int]:
+    """Read the remote generation the local icebox file was synced with."""
+    state = ReadSyncState(icebox_path)
+    return state.get('generation') if state else None
+
+
+def WriteSyncState(
+        icebox_path: Path, generation: Optional[int], snapshot_size: int,
+        snapshot_seq: int):
+    """Record how the local icebox file is synchronized with its remote.
+
+    The generation and journal sequence number are those of the remote
+    snapshot, which takes up the first snapshot_size bytes of the local
+    icebox file.
+    """
+    state_path = GetSyncStatePath(icebox_path)
+    if generation is None:
+        state_path.unlink(missing_ok=True)
+        return
+    stat = os.stat(icebox_path)
+    state = {
+        'path': str(Path(icebox_path).resolve()),
+        'generation': generation,
+        'snapshot_size': snapshot_size,
+        'snapshot_seq': snapshot_seq,
+        'mtime_ns': stat.st_mtime_ns,
+        'size': stat.st_size,
+    }
+    state_path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = state_path.with_suffix('.tmp')
+    with open(temp_path, 'w') as f:
+        f.write(json.dumps(state))
+    os.replace(temp_path, state_path)
+
+
+def WriteIceboxFile(icebox_path: Path, data: bytes):
+    """Atomically replace the local icebox file with data."""
+    temp_path = Path(f"{icebox_path}_temp")
+    temp_path.write_bytes(data)
+    os.replace(temp_path, icebox_path)
+
+
+def ListJournalSegments(icebox_id: str, storage=None) -> typing.List[int]:
+    """List the sequence numbers of the remote journal segments."""
+    if not storage:
+        storage = GetStorage()
+    try:
+        _, files = storage.ListRemote(journal.GetJournalPath(icebox_id))
+    except icebox_storage.IceboxStorageError:
+        # nothing has been journaled yet
+        return []
+    seqs = (journal.ParseSegmentName(f.name) for f in files)
+    return sorted(seq for seq in seqs if seq is not None)
+
+
+def FetchJournal(icebox: Icebox, storage=None) -> bytes:
+    """Apply the remote journal segments that the icebox does not include.
+
+    Returns the contents of the applied segments.
+
+    Raises:
+        IceboxError
+        IceboxStorageError
+    """
+    if not storage:
+        storage = GetStorage()
+    seqs = [seq for seq in ListJournalSegments(icebox.id, storage=storage)
+            if seq > icebox.journal_seq]
+    if not seqs:
+        return b""
+    if seqs != list(range(icebox.journal_seq + 1, seqs[-1] + 1)):
+        # the journal was compacted into a newer snapshot in the meantime
+        raise IceboxError(
+            "Remote icebox changed during synchronization. Try again.")
+
+    def _download(seq: int) -> bytes:
+        return storage.DownloadData(journal.GetSegmentPath(icebox.id, seq))
+
+    segments = {}
+    for seq, future in RunConcurrently(_download, seqs):
+        segments[seq] = future.result()
+    data = b"".join(segments[seq] for seq in seqs)
+    try:
+        journal.ApplySegments(icebox, data)
+    except Exception:
+        raise IceboxError(
+            "Error reading remote icebox journal. Contents might be invalid.")
+    return data
+
+
+def GetShardCachePath(remote_path: str) -> Path:
+    """Local cache location of a remote manifest shard."""
+    return Path(config.ICEBOX_CACHE_LOCATION) / "shards" / Path(remote_path)
+
+
+def CacheShard(remote_path: str, data: bytes):
+    """Cache a manifest shard and drop older versions of it."""
+    cache_path = GetShardCachePath(remote_path)
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    key = cache_path.name.rpartition("_")[0]
+    for old in cache_path.parent.glob(f"{key}_*"):
+        if old != cache_path:
+            old.unlink(missing_ok=True)
+    temp_path = Path(f"{cache_path}.tmp")
+    temp_path.write_bytes(data)
+    os.replace(temp_path, cache_path)
+
+
+def FetchShard(icebox_id: str, name: str, seq: int, storage=None) -> Icebox:
+    """Read a manifest shard from the local cache or the remote.
+
+    Raises:
+        IceboxError
+        IceboxStorageError
+    """
+    remote_path = journal.GetShardPath(icebox_id, name, seq)
+    try:
+        # shards are never modified once written
+        data = GetShardCachePath(remote_path).read_bytes()
+    except OSError:
+        if not storage:
+            storage = GetStorage()
+        data = storage.DownloadData(remote_path)
+        CacheShard(remote_path, data)
+    try:
+        return journal.Load(data)
+    except Exception:
+        raise IceboxError(
+            f"Error reading shard '{name}' of icebox '{icebox_id}'. "
+            "Contents might be invalid.")
+
+
+def LoadShards(icebox: Icebox, names: typing.List[str], storage=None):
+    """Load the given manifest shards into the icebox.
+
+    Raises:
+        IceboxError
+        IceboxStorageError
+    """
+    if not names:
+        return
+    if not storage:
+        storage = GetStorage()
+    shards = RunConcurrently(
+        lambda name: FetchShard(
+            icebox.id, name, icebox.shards[name], storage=storage),
+        names)
+    for name, future in shards:
+        icebox.load_shard(name, future.result())
+
+
+def WriteSnapshot(icebox: LocalIcebox, storage=None) -> LocalIcebox:
+    """Upload a snapshot of the icebox and make it the local icebox file.
+
+    Top level directories with more than ICEBOX_SHARD_SIZE frozen files are
+    written to shards of their own, of which only those that changed are
+    uploaded again. Journal segments and shards that were folded into the
+    snapshot are deleted from the remote.
+
+    The snapshot only replaces the one the local icebox file was synchronized
+    with. If another clone wrote a snapshot meanwhile, the icebox is
+    synchronized, the pending changes are applied again on top and the
+    snapshot is written from there. Returns the icebox the snapshot was
+    written from, which is a new one in that case.
+
+    Raises:
+        IceboxError
+        IceboxStorageError
+    """
+    if not storage:
+        storage = GetStorage()
+    icebox_path = ResolveIcebox(icebox.path)
+    for _ in range(_JOURNAL_ATTEMPTS):
+        state = ReadSyncState(icebox_path)
+        try:
+            _WriteSnapshot(
+                icebox, icebox_path, state['generation'] if state else None,
+                storage)
+            return icebox
+        except icebox_storage.IceboxStorageConflictError:
+            icebox = _Resynchronize(icebox, icebox.pending_changes())
+    raise icebox_storage.IceboxStorageError(
+        "Icebox snapshot keeps changing, try again later.")
+
+
+def _WriteSnapshot(
+        icebox: LocalIcebox, icebox_path: Path, generation: Optional[int],
+        storage):
+    # changes to shards that are not loaded have to be folded into them
+    LoadShards(icebox, icebox.deferred_shards(), storage=storage)
+
+    delimiter = config.REMOTE_PATH_DELIMITER
+    root_files, groups = {}, {}
+    for relpath, frozen_file in icebox.frozen_files.items():
+        name, sep, _ = relpath.partition(delimiter)
+        if sep:
+            groups.setdefault(name, {})[relpath] = frozen_file
+        else:
+            root_files[relpath] = frozen_file
+    shards = {name: seq for name, seq in icebox.shards.items()
+              if not icebox.is_shard_loaded(name)}
+    changed_shards = []
+    for name, files in groups.items():
+        if (name not in icebox.shards
+                and len(files) <= config.ICEBOX_SHARD_SIZE):
+            root_files.update(files)
+        elif name in icebox.shards and not icebox.is_shard_dirty(name):
+            shards[name] = icebox.shards[name]
+        else:
+            shards[name] = icebox.journal_seq
+            changed_shards.append((name, Icebox(
+                id=icebox.id, journal_seq=icebox.journal_seq,
+                frozen_files=files)))
+    replaced = [journal.GetShardPath(icebox.id, name, seq)
+                for name, seq in icebox.shards.items()
+                if shards.get(name) != seq]
+
+    def _upload_shard(item: typing.Tuple[str, Icebox]):
+        name, shard = item
+        remote_path = journal.GetShardPath(
+            shard.id, name, shard.journal_seq)
+        data = journal.EncodeSnapshot(shard)
+        storage.UploadData(data, remote_path)
+        CacheShard(remote_path, data)
+
+    for _, future in RunConcurrently(_upload_shard, changed_shards):
+        future.result()
+
+    remote_path = (f"{icebox.id}{config.REMOTE_PATH_DELIMITER}"
+                   f"{config.ICEBOX_FILE_NAME}")
+    data = journal.EncodeSnapshot(Icebox(
+        id=icebox.id, journal_seq=icebox.journal_seq,
+        frozen_files=root_files, shards=shards))
+    # the folded segments are only deleted once the snapshot is in place
+    generation = storage.UploadData(
+        data, remote_path, if_generation_match=generation)
+    InvalidateListings(storage)
+    WriteIceboxFile(icebox_path, data)
+    icebox.set_shards(shards)
+    icebox.clear_pending_changes()
+    WriteSyncState(icebox_path, generation, len(data), icebox.journal_seq)
+
+    folded = [journal.GetSegmentPath(icebox.id, seq)
+              for seq in ListJournalSegments(icebox.id, storage=storage)
+              if seq <= icebox.journal_seq]
+    for _, future in RunConcurrently(storage.Delete, folded + replaced):
+        future.result()
+
+
 def Finalize(icebox: LocalIcebox):
     """Finalize an icebox.
 
-    Write out the icebox locally and upload it to the configured remote.
+    Record the changes made to the icebox as a new journal segment, both
+    remotely and at the end of the local icebox file. The journal is folded
+    into a new snapshot once it grows past the configured limits. A
+    snapshot is written instead if the local icebox file is not in sync
+    with the remote (e.g. for a new icebox). The icebox is then recorded in
+    the registry of the storage.
 
     Raises:
         IceboxError
@@ -161,44 +865,157 @@ def Finalize(icebox: LocalIcebox):
     """
     if not icebox:
         raise IceboxError("Cannot finalize without icebox!")
+    storage = GetStorage()
     icebox_path = ResolveIcebox(icebox.path)
-    # write the icebox file locally
-    with open(icebox_path, 'w') as f:
-        data = Icebox(**icebox.dict()).dict()
-        f.write(json.dumps(data))
+    state = ReadSyncState(icebox_path)
+    if state is None:
+        icebox = WriteSnapshot(icebox, storage=storage)
+    elif icebox.pending_changes():
+        icebox = _JournalChanges(icebox, icebox_path, storage)
+    else:
+        return
+
     try:
-        # upload icebox to remote
-        UploadFile(icebox, icebox_path)
-    except icebox_storage.IceboxStorageError as e:
-        icebox_path.unlink(missing_ok=True)
-        raise e
+        RegisterIcebox(icebox, storage=storage)
+    except (IceboxError, icebox_storage.IceboxStorageError) as e:
+        # the changes are in place, the registry can be rebuilt
+        print(e)
+        print(
+            "Unable to update the icebox registry. Rebuild it with "
+            "`icebox ls -a --rebuild`.")
+
+
+def _JournalChanges(
+        icebox: LocalIcebox, icebox_path: Path, storage) -> LocalIcebox:
+    """Upload the pending changes of an icebox as the next journal segment.
+
+    Segments are only created if they do not exist yet. If another clone
+    journaled the same sequence number first, or wrote a snapshot that may
+    already have folded it, the icebox is synchronized, the pending changes
+    are applied again on top and the next sequence number is tried. Returns
+    the icebox the changes were journaled on, which is a new one if the
+    remote snapshot changed meanwhile.
+    """
+    remote_path = (f"{icebox.id}{config.REMOTE_PATH_DELIMITER}"
+                   f"{config.ICEBOX_FILE_NAME}")
+    changes = icebox.pending_changes()
+    for _ in range(_JOURNAL_ATTEMPTS):
+        seq = icebox.journal_seq + 1
+        data = journal.EncodeSegment(seq, changes)
+        try:
+            storage.UploadData(
+                data, journal.GetSegmentPath(icebox.id, seq),
+                if_generation_match=0)
+        except icebox_storage.IceboxStorageConflictError:
+            icebox = _Resynchronize(icebox, changes)
+            continue
+        # a snapshot written meanwhile deletes the segments it folded, after
+        # which a stale sequence number can be created again but is ignored
+        snapshot, _ = storage.DownloadDataIfModified(
+            remote_path, ReadSyncedGeneration(icebox_path))
+        if snapshot is None:
+            break
+        icebox = _Resynchronize(icebox, changes)
+    else:
+        raise icebox_storage.IceboxStorageError(
+            "Icebox journal keeps changing, try again later.")
+    InvalidateListings(storage)
+    state = ReadSyncState(icebox_path)
+    with open(icebox_path, 'ab') as f:
+        f.write(data)
+    icebox.journal_seq = seq
+    icebox.clear_pending_changes()
+    WriteSyncState(
+        icebox_path, state['generation'], state['snapshot_size'],
+        state['snapshot_seq'])
+
+    journal_size = os.stat(icebox_path).st_size - state['snapshot_size']
+    if (journal_size > config.ICEBOX_JOURNAL_COMPACT_SIZE
+            or seq - state['snapshot_seq']
+            > config.ICEBOX_JOURNAL_COMPACT_SEGMENTS):
+        icebox = WriteSnapshot(icebox, storage=storage)
+    return icebox
+
+
+def _Resynchronize(
+        icebox: LocalIcebox, changes: typing.List) -> LocalIcebox:
+    """Synchronize an icebox after a conflicting write and redo changes.
+
+    The changes are applied again on top of the synchronized icebox, and
+    remain pending on it.
+    """
+    synchronized = Synchronize(icebox)
+    if synchronized is icebox:
+        # the fetched segments may have changed the same files
+        for relpath, frozen_file in changes:
+            icebox.apply_change(relpath, frozen_file)
+    else:
+        for relpath, frozen_file in changes:
+            if frozen_file is None:
+                synchronized.remove_frozen_file(relpath)
+            else:
+                synchronized.add_frozen_file(relpath, frozen_file)
+    return synchronized
+
+
+# attempts at writing to the journal or the snapshot while other clones are
+# writing to them.
+_JOURNAL_ATTEMPTS = 5
+
 
 def Synchronize(icebox: LocalIcebox) -> LocalIcebox:
+    """Synchronize an icebox with its remote.
+
+    The remote snapshot is only downloaded if its generation differs from
+    the one the local icebox file was last synchronized with. Journal
+    segments that are missing locally are then fetched and appended to the
+    local icebox file. The given icebox is returned as is if nothing
+    changed.
+
+    Raises:
+        IceboxError
+        IceboxStorageError
+    """
     if not icebox:
         raise IceboxError("Cannot synchronize without icebox!")
-    temp_file_name = f"{config.ICEBOX_FILE_NAME}_temp"
-    DownloadFile(
-        icebox, config.ICEBOX_FILE_NAME,
-        relative_destination_path=temp_file_name)
-    temp_file_path = Path(icebox.path) / Path(temp_file_name)
-    try:
-        with open(temp_file_path, 'r') as f:
-            remote_icebox = Icebox(**json.loads(f.read()))
-        local_icebox = LocalIcebox(
-            path=icebox.path, **remote_icebox.dict())
-        if not local_icebox.is_valid():
-            raise IceboxError("Invalid icebox found in remote location!")
-    except Exception:
-        # delete the temporary file
-        temp_file_path.unlink(missing_ok=True)
-        raise IceboxError(
-            "Error reading remote icebox. Contents might be invalid.")
+    storage = GetStorage()
+    icebox_path = ResolveIcebox(icebox.path)
+    remote_path = (f"{icebox.id}{config.REMOTE_PATH_DELIMITER}"
+                   f"{config.ICEBOX_FILE_NAME}")
+    state = ReadSyncState(icebox_path)
+    snapshot, generation = storage.DownloadDataIfModified(
+        remote_path, state['generation'] if state else None)
+    if snapshot is None:
+        # the local icebox file holds the remote snapshot
+        local_icebox = icebox
+    else:
+        try:
+            local_icebox = journal.Load(
+                snapshot, icebox_class=LocalIcebox, path=icebox.path)
+            if not local_icebox.is_valid():
+                raise IceboxError("Invalid icebox found in remote location!")
+        except Exception:
+            raise IceboxError(
+                "Error reading remote icebox. Contents might be invalid.")
+        if not snapshot.endswith(b"\n"):
+            snapshot += b"\n"
+        state = {
+            'generation': generation,
+            'snapshot_size': len(snapshot),
+            'snapshot_seq': local_icebox.journal_seq,
+        }
+    segments = FetchJournal(local_icebox, storage=storage)
+
+    if snapshot is not None:
+        WriteIceboxFile(icebox_path, snapshot + segments)
+    elif segments:
+        with open(icebox_path, 'ab') as f:
+            f.write(segments)
     else:
-        shutil.copyfile(
-            str(temp_file_path),
-            f"{icebox.path}{os.sep}{config.ICEBOX_FILE_NAME}")
-    # delete the temporary file
-    temp_file_path.unlink(missing_ok=True)
+        return icebox
+    WriteSyncState(
+        icebox_path, state['generation'], state['snapshot_size'],
+        state['snapshot_seq'])
     return local_icebox
 
 
@@ -225,12 +1042,167 @@ def GetAbsoluteLocalPath(relpath: str, parentpath: str) -> Path:
     return Path(parentpath) / Path(relpath)
 
 
-def UploadFile(icebox: LocalIcebox, filepath: str, storage=None):
+def GetRemotePath(icebox: Icebox, relative_path: str) -> str:
+    """Get the remote path of a file in the icebox.
+
+    Files frozen in content mode resolve to the shared blob of their digest.
+    """
+    frozen_file = icebox.frozen_files.get(relative_path)
+    if frozen_file and frozen_file.mode == "content":
+        return GetBlobPath(frozen_file.digest)
+    return f"{icebox.id}{config.REMOTE_PATH_DELIMITER}{relative_path}"
+
+
+def IsChunked(icebox: Icebox, relative_path: str) -> bool:
+    frozen_file = icebox.frozen_files.get(relative_path)
+    return bool(frozen_file and frozen_file.mode == "chunked")
+
+
+def GetBlobPath(digest: str) -> str:
+    return config.REMOTE_PATH_DELIMITER.join(
+        [config.ICEBOX_STORE_PREFIX, "blobs", digest])
+
+
+def HashFile(filepath: str) -> str:
+    """Returns the hex encoded SHA-256 digest of the file contents."""
+    sha = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def UploadBlob(
+        filepath: str, digest: Optional[str] = None, storage=None) -> str:
+    """Upload a file to the content addressed store.
+
+    The upload is skipped if a blob with the same digest already exists in
+    the bucket. Returns the digest of the file.
+
+    Raises
+        IceboxStorageError
+    """
+    if not storage:
+        storage = GetStorage()
+    if not digest:
+        try:
+            digest = HashFile(filepath)
+        except OSError as e:
+            # e.g. removed since it was found
+            raise icebox_storage.IceboxStorageError(
+                f"Unable to read '{filepath}': {e}")
+    blob_path = GetBlobPath(digest)
+    if not storage.Exists(blob_path):
+        storage.Upload(str(filepath), blob_path)
+    return digest
+
+
+def GetChunkPath(digest: str) -> str:
+    return config.REMOTE_PATH_DELIMITER.join(
+        [config.ICEBOX_STORE_PREFIX, "chunks", digest])
+
+
+def UploadChunks(
+        filepath: str, known_chunks: typing.AbstractSet[str] = frozenset(),
+        storage=None) -> typing.List[typing.Tuple[str, int]]:
+    """Upload the content defined chunks of a file.
+
+    Chunks that are known to be uploaded (e.g. referenced by the icebox) or
+    that already exist remotely are skipped. Chunks are uploaded in
+    parallel. Returns the (digest, size) of every chunk of the file in order.
+
+    Raises
+        IceboxStorageError
+    """
+    if not storage:
+        storage = GetStorage()
+    try:
+        f = open(filepath, 'rb')
+    except OSError as e:
+        # e.g. removed since it was found
+        raise icebox_storage.IceboxStorageError(
+            f"Unable to read '{filepath}': {e}")
+    with f:
+        try:
+            if os.fstat(f.fileno()).st_size == 0:
+                return []
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except OSError as e:
+            raise icebox_storage.IceboxStorageError(
+                f"Unable to read '{filepath}': {e}")
+        with mapped as data:
+            def upload_chunk(span: typing.Tuple[int, int]):
+                offset, length = span
+                chunk = data[offset:offset + length]
+                digest = hashlib.sha256(chunk).hexdigest()
+                if digest not in known_chunks:
+                    chunk_path = GetChunkPath(digest)
+                    if not storage.Exists(chunk_path):
+                        storage.UploadData(chunk, chunk_path)
+                return digest, length
+
+            chunks = {}
+            uploads = RunConcurrently(
+                upload_chunk, chunking.SplitChunks(data))
+            # make sure that no upload is running once data is unmapped.
+            with contextlib.closing(uploads):
+                for (offset, _), upload in uploads:
+                    chunks[offset] = upload.result()
+    return [chunks[offset] for offset in sorted(chunks)]
+
+
+def DownloadChunks(
+        icebox: Icebox, relative_path: str, filepath: Path, storage=None):
+    """Reassemble a file frozen in chunked mode.
+
+    Chunks are downloaded in parallel, verified against their digest and
+    written in place into a preallocated temporary file next to filepath,
+    which only replaces filepath once every chunk arrived intact.
+
+    Raises
+        IceboxStorageError
+    """
+    if not storage:
+        storage = GetStorage()
+    chunks = icebox.frozen_files[relative_path].chunks
+    offsets = itertools.accumulate(
+        [length for _, length in chunks], initial=0)
+    temp_path = filepath.with_name(f"{filepath.name}.{uuid.uuid4().hex}")
+
+    def download_chunk(item: typing.Tuple[int, typing.Tuple[str, int]]):
+        offset, (digest, length) = item
+        data = storage.DownloadData(GetChunkPath(digest))
+        if (len(data) != length
+                or hashlib.sha256(data).hexdigest() != digest):
+            raise icebox_storage.IceboxStorageError(
+                f"Chunk {digest} of '{relative_path}' is corrupt!")
+        with open(temp_path, 'r+b') as f:
+            f.seek(offset)
+            f.write(data)
+
+    try:
+        with open(temp_path, 'wb') as f:
+            f.truncate(sum(length for _, length in chunks))
+        downloads = RunConcurrently(download_chunk, zip(offsets, chunks))
+        for _, download in downloads:
+            download.result()
+        os.replace(temp_path, filepath)
+    finally:
+        # a failed download must not leave partial contents behind
+        temp_path.unlink(missing_ok=True)
+
+
+def UploadFile(
+        icebox: LocalIcebox, filepath: str, storage=None) -> Optional[int]:
+    """Upload a file to its path in the icebox.
+
+    Returns the generation of the remote object if the storage supports it.
+    """
     if not storage:
         storage = GetStorage()
     relative_path = GetRelativeRemotePath(filepath, icebox.path)
     dest_path = f"{icebox.id}{config.REMOTE_PATH_DELIMITER}{relative_path}"
-    storage.Upload(filepath, dest_path)
+    return storage.Upload(filepath, dest_path)
 
 
 def DownloadFile(
@@ -242,8 +1214,147 @@ def DownloadFile(
         relative_path if not relative_destination_path
         else relative_destination_path,
         icebox.path)
-    remote_path = f"{icebox.id}{config.REMOTE_PATH_DELIMITER}{relative_path}"
-    storage.Download(remote_path, filepath)
+    filepath.parent.mkdir(parents=True, exist_ok=True)
+    if IsChunked(icebox, relative_path):
+        DownloadChunks(icebox, relative_path, filepath, storage=storage)
+    else:
+        storage.Download(
+            GetRemotePath(icebox, relative_path), filepath,
+            size=_FrozenSize(icebox, relative_path))
+
+
+def _FrozenSize(icebox: Icebox, relative_path: str) -> Optional[int]:
+    """Size of a frozen file if it is known, for downloading it.
+
+    A size of 0 counts as unknown, as binary manifests store unknown sizes
+    as 0. Empty files are rare enough to look up their size.
+    """
+    frozen_file = icebox.frozen_files.get(relative_path)
+    if not frozen_file or not frozen_file.size:
+        return None
+    return frozen_file.size
+
+
+async def UploadFileAsync(icebox: LocalIcebox, filepath: str, storage=None):
+    """Asynchronous version of UploadFile."""
+    if not storage:
+        storage = GetStorage()
+    relative_path = GetRelativeRemotePath(filepath, icebox.path)
+    dest_path = f"{icebox.id}{config.REMOTE_PATH_DELIMITER}{relative_path}"
+    await storage.UploadAsync(filepath, dest_path)
+
+
+async def DownloadFileAsync(
+        icebox: LocalIcebox, relative_path: str,
+        relative_destination_path: str = None, storage=None):
+    """Asynchronous version of DownloadFile."""
+    if not storage:
+        storage = GetStorage()
+    filepath = GetAbsoluteLocalPath(
+        relative_path if not relative_destination_path
+        else relative_destination_path,
+        icebox.path)
+    filepath.parent.mkdir(parents=True, exist_ok=True)
+    if IsChunked(icebox, relative_path):
+        await asyncio.get_running_loop().run_in_executor(
+            None, DownloadChunks, icebox, relative_path, filepath, storage)
+    else:
+        await storage.DownloadAsync(
+            GetRemotePath(icebox, relative_path), str(filepath),
+            size=_FrozenSize(icebox, relative_path))
+
+
+def RunConcurrently(
+        func: typing.Callable[[typing.Any], typing.Any],
+        items: typing.Iterable[typing.Any],
+        jobs: int = config.ICEBOX_JOBS
+) -> typing.Iterator[typing.Tuple[typing.Any, futures.Future]]:
+    """Run func for every item on a bounded pool of worker threads.
+
+    At most `jobs` calls are in flight at any time, so items can be a lazy
+    iterable of any size. Yields (item, future) pairs in order of completion.
+    Results and errors are retrieved from the future by the caller, which
+    keeps all bookkeeping on the calling thread.
+    """
+    if jobs < 1:
+        raise IceboxError("Number of jobs should be at least 1.")
+    items = iter(items)
+    with futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        pending = {}
+        try:
+            while True:
+                # top up the in-flight window
+                for item in itertools.islice(items, jobs - len(pending)):
+                    pending[executor.submit(func, item)] = item
+                if not pending:
+                    return
+                done, _ = futures.wait(
+                    pending, return_when=futures.FIRST_COMPLETED)
+                for future in done:
+                    yield pending.pop(future), future
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def WalkFiles(
+        path: Path, jobs: int = config.ICEBOX_SCAN_JOBS
+) -> typing.Iterator[typing.Tuple[str, os.stat_result]]:
+    """Yield the path and stat of every file under path as it is found.
+
+    Directories are read with os.scandir on a pool of `jobs` threads, and
+    files are yielded in batches as each directory is read, in no particular
+    order. Symbolic links to directories are not followed and icebox files
+    are skipped. Directories that cannot be read are skipped as well.
+    """
+    if jobs < 1:
+        raise IceboxError("Number of jobs should be at least 1.")
+    found = queue.Queue()
+
+    def scan(directory: str):
+        batch = []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            found.put((_WALK_DIRECTORY, entry.path))
+                        elif (entry.is_file()
+                                and entry.name != config.ICEBOX_FILE_NAME):
+                            batch.append((entry.path, entry.stat()))
+                    except OSError:
+                        # removed or unreadable while walking
+                        continue
+                    if len(batch) >= _WALK_BATCH_SIZE:
+                        found.put((_WALK_FILES, batch))
+                        batch = []
+        except OSError:
+            pass
+        finally:
+            found.put((_WALK_FILES, batch))
+            found.put((_WALK_DONE, directory))
+
+    executor = futures.ThreadPoolExecutor(max_workers=jobs)
+    try:
+        executor.submit(scan, str(path))
+        scanning = 1
+        while scanning:
+            kind, value = found.get()
+            if kind == _WALK_DIRECTORY:
+                executor.submit(scan, value)
+                scanning += 1
+            elif kind == _WALK_FILES:
+                yield from value
+            else:
+                scanning -= 1
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+_WALK_DIRECTORY, _WALK_FILES, _WALK_DONE = range(3)
+# files found in a directory are handed over in batches of this size.
+_WALK_BATCH_SIZE = 256
+
 
 def CloneIcebox(icebox_name: str, dest: Path, storage=None):
     if not storage:
@@ -252,11 +1363,21 @@ def CloneIcebox(icebox_name: str, dest: Path, storage=None):
     if not dest.exists():
         raise IceboxError("Missing closing destination.")
     
-    # download .icebox file
-    remote_path = (
-        f"{icebox_name}{config.REMOTE_PATH_DELIMITER}{config.ICEBOX_FILE_NAME}")
-    local_path = dest / Path(config.ICEBOX_FILE_NAME)
-    storage.Download(remote_path, str(local_path))
+    # download .icebox file along with its journal
+    remote_path = (f"{icebox_name}{config.REMOTE_PATH_DELIMITER}"
+                   f"{config.ICEBOX_FILE_NAME}")
+    local_path = ResolveIcebox(dest)
+    snapshot, generation = storage.DownloadDataIfModified(remote_path)
+    if not snapshot.endswith(b"\n"):
+        snapshot += b"\n"
+    try:
+        remote_icebox = journal.Load(snapshot)
+    except Exception:
+        raise IceboxError("Failed to find a valid icebox in remote.")
+    snapshot_seq = remote_icebox.journal_seq
+    segments = FetchJournal(remote_icebox, storage=storage)
+    WriteIceboxFile(local_path, snapshot + segments)
+    WriteSyncState(local_path, generation, len(snapshot), snapshot_seq)
 
     # check icenox
     icebox = FindIcebox(dest)
@@ -264,6 +1385,7 @@ def CloneIcebox(icebox_name: str, dest: Path, storage=None):
         raise IceboxError("Failed to find a valid icebox in remote.")
 
     # create local previews of frozen files.
+    LoadShards(icebox, icebox.shards_to_load(""), storage=storage)
     for f in icebox.frozen_files:
         filepath = dest / Path(f)
         filepath.parent.mkdir(parents=True, exist_ok=True)
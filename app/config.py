@@ -5,12 +5,98 @@ REMOTE_PATH_DELIMITER: str = "/"
 LOCAL_STORAGE_PATH: str = os.environ.get('LOCAL_STORAGE_PATH')
 ICEBOX_CONFIG_LOCATION: str = os.environ.get('ICEBOX_CONFIG_LOCATION',
                                              str(Path.home() / Path(".iceboxcfg")))
+ICEBOX_CACHE_LOCATION: str = os.environ.get('ICEBOX_CACHE_LOCATION',
+                                            str(Path(ICEBOX_CONFIG_LOCATION) /
+                                                Path("cache")))
 ICEBOX_CONFIG_FILE_NAME: str = os.environ.get('ICEBOX_CONFIG_FILE_NAME',
                                               "config.json")
 ICEBOX_FILE_NAME: str = os.environ.get('ICEBOX_FILE_NAME', ".icebox")
+# folder next to the remote icebox file holding its numbered journal segments.
+ICEBOX_JOURNAL_FOLDER_NAME: str = os.environ.get('ICEBOX_JOURNAL_FOLDER_NAME',
+                                                 ".icebox_journal")
+# folder next to the remote icebox file holding its manifest shards.
+ICEBOX_SHARDS_FOLDER_NAME: str = os.environ.get('ICEBOX_SHARDS_FOLDER_NAME',
+                                                ".icebox_shards")
+# bucket level prefix for objects that are shared by or internal to iceboxes.
+ICEBOX_STORE_PREFIX: str = os.environ.get('ICEBOX_STORE_PREFIX',
+                                          ".icebox_store")
 ICEBOX_TIME_FORMAT: str = os.environ.get('ICEBOX_TIME_FORMAT',
                                          "%d %b %Y %H:%M")
 ICEBOX_ENV = os.environ.get('ICEBOX_ENV', "")
+ICEBOX_JOBS: int = int(os.environ.get('ICEBOX_JOBS', 8))
+# number of directories scanned in parallel while walking a tree to freeze.
+ICEBOX_SCAN_JOBS: int = int(os.environ.get('ICEBOX_SCAN_JOBS', 4))
+# how frozen files are stored remotely.
+# * path: under the icebox at the relative path of the file.
+# * content: once per bucket under the digest of the file contents.
+# * chunked: as content defined chunks, so that only the chunks changed
+#   since the last freeze are uploaded again.
+ICEBOX_FREEZE_MODE: str = os.environ.get('ICEBOX_FREEZE_MODE', "path")
+ICEBOX_CHUNK_MIN_SIZE: int = int(
+    os.environ.get('ICEBOX_CHUNK_MIN_SIZE', 512 * 1024))
+ICEBOX_CHUNK_AVG_SIZE: int = int(
+    os.environ.get('ICEBOX_CHUNK_AVG_SIZE', 2 * 1024 * 1024))
+ICEBOX_CHUNK_MAX_SIZE: int = int(
+    os.environ.get('ICEBOX_CHUNK_MAX_SIZE', 8 * 1024 * 1024))
+# files larger than this are uploaded in checkpointed chunks so that an
+# interrupted upload can be resumed. Chunks must be a multiple of 256 KiB.
+ICEBOX_RESUMABLE_THRESHOLD: int = int(
+    os.environ.get('ICEBOX_RESUMABLE_THRESHOLD', 16 * 1024 * 1024))
+ICEBOX_UPLOAD_CHUNK_SIZE: int = int(
+    os.environ.get('ICEBOX_UPLOAD_CHUNK_SIZE', 16 * 1024 * 1024))
+# files larger than this are downloaded as byte ranges over several parallel
+# connections.
+ICEBOX_SLICED_DOWNLOAD_THRESHOLD: int = int(
+    os.environ.get('ICEBOX_SLICED_DOWNLOAD_THRESHOLD', 64 * 1024 * 1024))
+ICEBOX_DOWNLOAD_SLICES: int = int(
+    os.environ.get('ICEBOX_DOWNLOAD_SLICES', 8))
+# files larger than this are split into parts that are uploaded in parallel
+# and composed into the final object. Finished parts are checkpointed, so an
+# interrupted upload only uploads the missing parts again.
+ICEBOX_COMPOSITE_THRESHOLD: int = int(
+    os.environ.get('ICEBOX_COMPOSITE_THRESHOLD', 256 * 1024 * 1024))
+ICEBOX_COMPOSITE_PART_SIZE: int = int(
+    os.environ.get('ICEBOX_COMPOSITE_PART_SIZE', 64 * 1024 * 1024))
+ICEBOX_COMPOSITE_MAX_PARTS: int = int(
+    os.environ.get('ICEBOX_COMPOSITE_MAX_PARTS', 32))
+# the journal is folded back into the icebox snapshot once it grows past
+# either of these limits.
+ICEBOX_JOURNAL_COMPACT_SIZE: int = int(
+    os.environ.get('ICEBOX_JOURNAL_COMPACT_SIZE', 1024 * 1024))
+ICEBOX_JOURNAL_COMPACT_SEGMENTS: int = int(
+    os.environ.get('ICEBOX_JOURNAL_COMPACT_SEGMENTS', 32))
+# encoding of icebox snapshots and shards, either "binary" or "json". Both
+# are readable regardless of this setting.
+ICEBOX_MANIFEST_FORMAT: str = os.environ.get('ICEBOX_MANIFEST_FORMAT',
+                                             "binary")
+# compression of binary manifests, either "none" or "zlib". Uncompressed
+# manifests are read straight from a memory map of the local icebox file.
+ICEBOX_MANIFEST_COMPRESSION: str = os.environ.get(
+    'ICEBOX_MANIFEST_COMPRESSION', "none")
+# top level directories with more frozen files than this are split off into
+# their own manifest shard when the icebox file is compacted.
+ICEBOX_SHARD_SIZE: int = int(os.environ.get('ICEBOX_SHARD_SIZE', 1000))
+
+# access tokens of service accounts are shared between invocations through
+# this folder, and refreshed once they are this close (in seconds) to expiry.
+ICEBOX_TOKEN_CACHE_LOCATION: str = os.environ.get(
+    'ICEBOX_TOKEN_CACHE_LOCATION',
+    str(Path(ICEBOX_CONFIG_LOCATION) / Path("tokens")))
+ICEBOX_TOKEN_REFRESH_MARGIN: int = int(
+    os.environ.get('ICEBOX_TOKEN_REFRESH_MARGIN', 300))
+
+# remote listings (e.g. of all iceboxes) are reused for this many seconds.
+# Writes made through icebox invalidate them right away, so the TTL only
+# bounds how long changes made from elsewhere can take to show. Set it to 0
+# to always list the remote.
+ICEBOX_LISTING_TTL: int = int(os.environ.get('ICEBOX_LISTING_TTL', 60))
+
+# commands are served by a resident daemon listening on this socket if one
+# is running. Set ICEBOX_DAEMON to "off" to always run commands in process.
+ICEBOX_DAEMON: str = os.environ.get('ICEBOX_DAEMON', "auto")
+ICEBOX_DAEMON_SOCKET: str = os.environ.get(
+    'ICEBOX_DAEMON_SOCKET',
+    str(Path(ICEBOX_CONFIG_LOCATION) / Path("daemon.sock")))
 
 
 def IsTest() -> bool:
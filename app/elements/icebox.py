@@ -1,17 +1,139 @@
+import copy
 import pydantic
 import typing
 
 from pathlib import Path
 
+from app import config
+from app.elements.path_index import PathIndex
 
-class Icebox(pydantic.BaseModel):
+
+# ordered (digest, size) of the chunks of a file.
+Chunks = typing.List[typing.Tuple[str, int]]
+
+
+class FrozenFile:
+    """Metadata of a file frozen in an icebox.
+
+    A plain class with slots rather than a pydantic model, as an icebox can
+    hold millions of them. Values read from icebox files are validated by
+    FrozenFile.parse.
+    """
+
+    __slots__ = (
+        'size', 'mtime', 'digest', 'frozen_at', 'generation', 'mode',
+        'chunks')
+
+    def __init__(
+            self,
+            size: typing.Optional[int] = 0,
+            mtime: float = 0,
+            digest: typing.Optional[str] = None,
+            frozen_at: float = 0,
+            generation: typing.Optional[int] = None,
+            mode: str = "path",
+            chunks: typing.Optional[Chunks] = None):
+        # size and modification time of the file when it was frozen. The
+        # size is None if it is not known, e.g. for files frozen before it
+        # was recorded.
+        self.size = size
+        self.mtime = mtime
+        # hex encoded SHA-256 digest of the contents.
+        self.digest = digest
+        # timestamp of the freeze.
+        self.frozen_at = frozen_at
+        # generation of the remote object, if known.
+        self.generation = generation
+        # how the contents are stored remotely (see config.ICEBOX_FREEZE_MODE).
+        self.mode = mode
+        # ordered (digest, size) of the chunks of the file in chunked mode.
+        self.chunks = chunks
+
+    @classmethod
+    def parse(cls, values: dict) -> "FrozenFile":
+        """Validate the values of a frozen file read from an icebox file."""
+        return cls(**_FrozenFileSchema(**values).dict())
+
+    def dict(self, exclude_none: bool = False) -> dict:
+        values = {name: getattr(self, name) for name in self.__slots__}
+        if exclude_none:
+            values = {k: v for k, v in values.items() if v is not None}
+        return values
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, FrozenFile):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name)
+                   for name in self.__slots__)
+
+    def __repr__(self) -> str:
+        values = ", ".join(
+            f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"FrozenFile({values})"
+
+
+# a frozen file added under a relative path, or removed if it is None.
+FrozenFileChange = typing.Tuple[str, typing.Optional[FrozenFile]]
+
+
+class _FrozenFileSchema(pydantic.BaseModel):
+    size: typing.Optional[int] = 0
+    mtime: float = 0
+    digest: typing.Optional[str] = None
+    frozen_at: float = 0
+    generation: typing.Optional[int] = None
+    mode: str = "path"
+    chunks: typing.Optional[Chunks] = None
+
+
+class _IceboxSchema(pydantic.BaseModel):
+    id: str
+    frozen_files: typing.Dict[str, _FrozenFileSchema] = {}
+    journal_seq: int = 0
+    shards: typing.Dict[str, int] = {}
+
+    @pydantic.root_validator(pre=True)
+    def upgrade_frozen_files(cls, values):
+        """Upgrade icebox files that list frozen files without metadata.
+
+        Digests and chunks were kept in separate maps by content and chunked
+        modes before they were part of the file metadata. The sizes of files
+        listed without metadata are not known.
+        """
+        frozen_files = values.get('frozen_files')
+        if isinstance(frozen_files, list):
+            frozen_files = {f: {'size': None} for f in frozen_files}
+        digests = values.pop('digests', None) or {}
+        chunks = values.pop('chunks', None) or {}
+        if digests or chunks:
+            frozen_files = dict(frozen_files or {})
+            for f, digest in digests.items():
+                if f in frozen_files:
+                    frozen_files[f] = dict(
+                        frozen_files[f], digest=digest, mode="content")
+            for f, file_chunks in chunks.items():
+                if f in frozen_files:
+                    frozen_files[f] = dict(
+                        frozen_files[f], chunks=file_chunks, mode="chunked")
+        if frozen_files is not None:
+            values['frozen_files'] = frozen_files
+        return values
+
+
+class Icebox:
     """Encapsulation for the icebox class.
 
     This class is extended by LocalIcebox for the local version.
+
+    Iceboxes are plain classes with slots that take ownership of the values
+    they are constructed with, so that commands can pass them around without
+    copying the frozen files. Values read from icebox files are validated by
+    Icebox.parse.
     """
 
-    id: str
-    frozen_files: typing.List[str] = []
+    __slots__ = (
+        'id', 'frozen_files', 'journal_seq', 'shards', '_path_index',
+        '_changes', '_loaded_shards', '_dirty_shards', '_deferred')
 
     # TODOs:
     # * Every Icebox should have a unique identifier (possibly human
@@ -24,9 +146,221 @@ class Icebox(pydantic.BaseModel):
     # ID.
     # * Adding path to .icebox makes us sure that moving the file around
     # would not affect operations.
-    # * frozen_files should be a set
-    # * files should contain more than a simple list of path. Perhaps
-    # metadata and a date of freeze.
+
+    def __init__(
+            self,
+            id: str,
+            frozen_files: typing.Optional[
+                typing.Dict[str, FrozenFile]] = None,
+            journal_seq: int = 0,
+            shards: typing.Optional[typing.Dict[str, int]] = None):
+        self.id = id
+        # frozen files indexed by their relative remote path.
+        self.frozen_files = frozen_files if frozen_files is not None else {}
+        # sequence number of the last journal segment applied to this icebox.
+        self.journal_seq = journal_seq
+        # top level directories whose frozen files are kept in separate
+        # manifest shards, mapped to the journal sequence number of their
+        # latest shard.
+        self.shards = shards if shards is not None else {}
+        # lazily built index over the paths of the frozen files.
+        self._path_index: typing.Optional[PathIndex] = None
+        # changes made through add_frozen_file and remove_frozen_file that
+        # are yet to be journaled.
+        self._changes: typing.List[FrozenFileChange] = []
+        # shards whose frozen files have been loaded, and those changed since.
+        self._loaded_shards: typing.Set[str] = set()
+        self._dirty_shards: typing.Set[str] = set()
+        # changes to shards that are not loaded yet, along with the sequence
+        # number of the journal segment they came from.
+        self._deferred: typing.Dict[
+            str,
+            typing.List[typing.Tuple[typing.Optional[int], FrozenFileChange]]
+        ] = {}
+
+    @classmethod
+    def parse(
+            cls, values: dict,
+            frozen_files: typing.Optional[
+                typing.Dict[str, FrozenFile]] = None,
+            **kwargs) -> "Icebox":
+        """Validate the values of an icebox read from an icebox file.
+
+        Frozen files that were already decoded can be passed separately, in
+        which case they are used as is. Additional keyword arguments are
+        passed on to the constructor.
+        """
+        schema = _IceboxSchema(**values)
+        if frozen_files is None:
+            frozen_files = {
+                relpath: FrozenFile(**frozen_file.dict())
+                for relpath, frozen_file in schema.frozen_files.items()}
+        return cls(
+            id=schema.id, frozen_files=frozen_files,
+            journal_seq=schema.journal_seq, shards=schema.shards, **kwargs)
+
+    @classmethod
+    def __get_validators__(cls):
+        # allows iceboxes as fields of pydantic models.
+        yield cls._validate
+
+    @classmethod
+    def _validate(cls, value):
+        if not isinstance(value, cls):
+            raise TypeError(f"{cls.__name__} required")
+        return value
+
+    def dict(self) -> dict:
+        return {
+            'id': self.id,
+            'frozen_files': {
+                relpath: frozen_file.dict()
+                for relpath, frozen_file in self.frozen_files.items()},
+            'journal_seq': self.journal_seq,
+            'shards': dict(self.shards),
+        }
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Icebox):
+            return NotImplemented
+        return self.dict() == other.dict()
+
+    def __repr__(self) -> str:
+        return (f"{type(self).__name__}(id={self.id!r}, "
+                f"frozen_files=<{len(self.frozen_files)} files>)")
+
+    def copy(self) -> "Icebox":
+        """Copy of the icebox that can be changed independently.
+
+        Frozen files are shared, since they are replaced rather than changed
+        in place.
+        """
+        other = copy.copy(self)
+        other.frozen_files = dict(self.frozen_files)
+        other.shards = dict(self.shards)
+        other._path_index = None
+        other._changes = list(self._changes)
+        other._loaded_shards = set(self._loaded_shards)
+        other._dirty_shards = set(self._dirty_shards)
+        other._deferred = {
+            name: list(changes) for name, changes in self._deferred.items()}
+        return other
+
+    def path_index(self) -> PathIndex:
+        """Index for subtree queries over the frozen files.
+
+        Stays up to date as long as frozen files are added and removed
+        through add_frozen_file and remove_frozen_file.
+        """
+        if self._path_index is None:
+            self._path_index = PathIndex(self.frozen_files.keys())
+        return self._path_index
+
+    def add_frozen_file(self, relpath: str, frozen_file: FrozenFile):
+        self._changes.append((relpath, frozen_file))
+        self.apply_change(relpath, frozen_file)
+
+    def remove_frozen_file(self, relpath: str):
+        if relpath in self.frozen_files:
+            self._changes.append((relpath, None))
+            self.apply_change(relpath, None)
+
+    def apply_change(
+            self, relpath: str, frozen_file: typing.Optional[FrozenFile],
+            seq: typing.Optional[int] = None):
+        """Add or, if frozen_file is None, remove a frozen file.
+
+        Unlike add_frozen_file and remove_frozen_file, the change is not
+        recorded as pending. Used to replay journaled changes, which are
+        held back until their shard is loaded.
+        """
+        shard = self.shard_of(relpath)
+        if shard is not None:
+            if shard not in self._loaded_shards:
+                self._deferred.setdefault(shard, []).append(
+                    (seq, (relpath, frozen_file)))
+                return
+            self._dirty_shards.add(shard)
+        if frozen_file is None:
+            self.frozen_files.pop(relpath, None)
+            if self._path_index is not None:
+                self._path_index.remove(relpath)
+        else:
+            self.frozen_files[relpath] = frozen_file
+            if self._path_index is not None:
+                self._path_index.add(relpath)
+
+    def shard_of(self, relpath: str) -> typing.Optional[str]:
+        """Name of the shard holding relpath, None if it is not sharded."""
+        name = relpath.partition(config.REMOTE_PATH_DELIMITER)[0]
+        return name if name in self.shards else None
+
+    def shards_to_load(
+            self, relpath: str, recursive: bool = True) -> typing.List[str]:
+        """Names of the shards that are needed for relpath but not loaded.
+
+        Queries that are recursive from the root need every shard. Others
+        only need the shard holding relpath, if any.
+        """
+        if relpath in ("", "."):
+            names = self.shards if recursive else []
+        else:
+            names = [self.shard_of(relpath)]
+        return sorted(name for name in names
+                      if name is not None and name not in self._loaded_shards)
+
+    def deferred_shards(self) -> typing.List[str]:
+        """Names of the shards that are not loaded but have changes."""
+        return sorted(self._deferred)
+
+    def deferred_seq(self, name: str) -> typing.Optional[int]:
+        """Sequence number of the last deferred change of a shard.
+
+        Returns 0 if the shard has no deferred changes, and None if some of
+        them have not been journaled yet.
+        """
+        seqs = [seq for seq, _ in self._deferred.get(name, [])]
+        if None in seqs:
+            return None
+        return max(seqs, default=0)
+
+    def is_shard_loaded(self, name: str) -> bool:
+        return name in self._loaded_shards
+
+    def is_shard_dirty(self, name: str) -> bool:
+        return name in self._dirty_shards
+
+    def load_shard(self, name: str, shard: "Icebox"):
+        """Add the frozen files of a shard and replay its deferred changes.
+
+        Changes that the shard already includes are skipped.
+        """
+        self._loaded_shards.add(name)
+        for relpath, frozen_file in shard.frozen_files.items():
+            self.frozen_files[relpath] = frozen_file
+            if self._path_index is not None:
+                self._path_index.add(relpath)
+        for seq, (relpath, frozen_file) in self._deferred.pop(name, []):
+            if seq is None or seq > shard.journal_seq:
+                self.apply_change(relpath, frozen_file, seq)
+
+    def set_shards(self, shards: typing.Dict[str, int]):
+        """Replace the shards once they have been written out.
+
+        New shards are split off from frozen files that are not sharded,
+        which are all in memory, so they count as loaded.
+        """
+        new_shards = set(shards) - set(self.shards)
+        self.shards = shards
+        self._loaded_shards &= set(shards)
+        self._loaded_shards |= new_shards
+        self._dirty_shards.clear()
+
+    def pending_changes(self) -> typing.List[FrozenFileChange]:
+        return list(self._changes)
+
+    def clear_pending_changes(self):
+        self._changes.clear()
 
     def is_valid(self) -> bool:
         return self.id
@@ -37,7 +371,15 @@ class LocalIcebox(Icebox):
 
     Contains an additional field to represent the path.
     """
-    path: str
+
+    __slots__ = ('path',)
+
+    def __init__(self, path: str, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+
+    def dict(self) -> dict:
+        return dict(super().dict(), path=self.path)
 
     def is_valid(self) -> bool:
         return super().is_valid() and self.path and Path(self.path).is_dir()
@@ -2,6 +2,7 @@ from pathlib import Path
 import pydantic
 
 from datetime import datetime
+from typing import Optional
 
 
 class IceboxRemoteFile(pydantic.BaseModel):
@@ -9,13 +10,38 @@ class IceboxRemoteFile(pydantic.BaseModel):
     size: int = 0
     updated: datetime = 0
     is_dir: bool = False
+    # number of frozen files, for iceboxes listed from the registry.
+    file_count: Optional[int] = None
 
 
-class IceboxLocalFile(pydantic.BaseModel):
-    name: str
-    size: int = 0
-    updated: datetime = 0
-    is_dir: bool = False
-    is_frozen: bool = False
-    is_modified: bool = False
+class IceboxLocalFile:
+    """A file or folder in a local icebox path.
+
+    Listings can hold many of these, so they are plain slotted records built
+    from a single stat, rather than validated models.
+    """
+
+    __slots__ = (
+        'name', 'size', 'mtime', 'is_dir', 'is_frozen', 'is_modified')
+
+    def __init__(
+            self, name: str, size: int = 0, mtime: Optional[float] = None,
+            is_dir: bool = False, is_frozen: bool = False,
+            is_modified: bool = False):
+        self.name = name
+        self.size = size
+        self.mtime = mtime
+        self.is_dir = is_dir
+        self.is_frozen = is_frozen
+        self.is_modified = is_modified
+
+    @property
+    def updated(self) -> Optional[datetime]:
+        return (datetime.fromtimestamp(self.mtime)
+                if self.mtime is not None else None)
+
+    def dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
 
+    def __repr__(self) -> str:
+        return f"IceboxLocalFile({self.dict()!r})"
@@ -0,0 +1,108 @@
+import bisect
+import heapq
+import typing
+
+from app import config
+
+# the character right after the delimiter, bounds the range of a subtree.
+_DELIMITER_END = chr(ord(config.REMOTE_PATH_DELIMITER) + 1)
+
+
+class PathIndex:
+    """Sorted index over relative remote paths.
+
+    Answers subtree queries with a binary search, in time proportional to the
+    size of the result instead of the size of the index. Additions and
+    removals are buffered and merged into the index on the next query, so
+    that bulk updates do not pay for an insertion into a large list each.
+    """
+
+    def __init__(self, paths: typing.Iterable[str] = ()):
+        self._paths: typing.List[str] = sorted(paths)
+        self._added: typing.Set[str] = set()
+        self._removed: typing.Set[str] = set()
+
+    def add(self, path: str):
+        self._removed.discard(path)
+        self._added.add(path)
+
+    def remove(self, path: str):
+        self._added.discard(path)
+        self._removed.add(path)
+
+    def __len__(self) -> int:
+        self._merge()
+        return len(self._paths)
+
+    def __iter__(self) -> typing.Iterator[str]:
+        self._merge()
+        return iter(self._paths)
+
+    def under(self, path: str) -> typing.List[str]:
+        """Returns the path itself, if indexed, and every path below it."""
+        self._merge()
+        if _is_root(path):
+            return list(self._paths)
+        lo, hi = self._subtree_range(path)
+        result = self._paths[lo:hi]
+        if self._contains(path):
+            result.insert(0, path)
+        return result
+
+    def exists_under(self, path: str) -> bool:
+        """Checks whether the path or anything below it is indexed."""
+        self._merge()
+        if _is_root(path):
+            return len(self._paths) > 0
+        lo, hi = self._subtree_range(path)
+        return lo < hi or self._contains(path)
+
+    def children(
+            self, path: str) -> typing.Iterator[typing.Tuple[str, bool]]:
+        """Lists the immediate children of a directory path.
+
+        Yields (name, is_dir) in the order of the indexed paths.
+        Subdirectories are skipped over with a binary search instead of
+        visiting every path in them.
+        """
+        self._merge()
+        if _is_root(path):
+            prefix = ""
+            lo, hi = 0, len(self._paths)
+        else:
+            prefix = f"{path}{config.REMOTE_PATH_DELIMITER}"
+            lo, hi = self._subtree_range(path)
+        while lo < hi:
+            name = self._paths[lo][len(prefix):]
+            delimiter = name.find(config.REMOTE_PATH_DELIMITER)
+            if delimiter < 0:
+                yield name, False
+                lo += 1
+            else:
+                name = name[:delimiter]
+                yield name, True
+                lo = bisect.bisect_left(
+                    self._paths, f"{prefix}{name}{_DELIMITER_END}", lo, hi)
+
+    def _subtree_range(self, path: str) -> typing.Tuple[int, int]:
+        lo = bisect.bisect_left(
+            self._paths, f"{path}{config.REMOTE_PATH_DELIMITER}")
+        hi = bisect.bisect_left(self._paths, f"{path}{_DELIMITER_END}", lo)
+        return lo, hi
+
+    def _contains(self, path: str) -> bool:
+        i = bisect.bisect_left(self._paths, path)
+        return i < len(self._paths) and self._paths[i] == path
+
+    def _merge(self):
+        if not self._added and not self._removed:
+            return
+        stale = self._added | self._removed
+        self._paths = list(heapq.merge(
+            [p for p in self._paths if p not in stale], sorted(self._added)))
+        self._added.clear()
+        self._removed.clear()
+
+
+def _is_root(path: typing.Optional[str]) -> bool:
+    return not path or path == "."
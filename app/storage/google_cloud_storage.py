@@ -1,32 +1,60 @@
+import base64
+import hashlib
 import json
 import os
 import typing
-from datetime import datetime
+import uuid
+from concurrent import futures
 from pathlib import Path
 
 from app import config
 from app.elements.icebox import Icebox
 from app.elements.icebox_files import IceboxLocalFile, IceboxRemoteFile
 
+from . import token_cache
 from .icebox_storage import IceboxStorage
+from .icebox_storage import IceboxStorageConflictError
 from .icebox_storage import IceboxStorageError
 from app.common import utils
 
+import google_crc32c
+from google.api_core import exceptions
 from google.cloud import storage
 
+# size of the resumable upload chunks must be a multiple of 256 KiB.
+_RESUMABLE_CHUNK_ALIGNMENT = 256 * 1024
+# maximum number of source objects in a single compose request.
+_MAX_COMPOSE_SOURCES = 32
+
 
 class GoogleCloudStorage(IceboxStorage):
     """Icebox Storage that uses Google Cloud Storage as the backend."""
 
-    def __init__(self, cred: str, location: str, bucket_name: str):
+    def __init__(
+            self, cred: str, location: str, bucket_name: str,
+            validated: bool = False):
+        """Create a storage on the given bucket.
+
+        The bucket is checked (and created if needed) unless it has been
+        validated before, e.g. during `icebox config`. A validated bucket is
+        used without any request and only checked again if an upload finds
+        it missing.
+        """
         # read credentials from the configuration file
-        self._client = storage.Client.from_service_account_json(cred)
-        self._location = location
         with open(cred) as f:
             cred_json = json.load(f)
             self.project_id = cred_json['project_id']
-        self._bucket = self._check_or_create_bucket(bucket_name)
+        self._client = storage.Client(
+            project=self.project_id,
+            credentials=token_cache.LoadCredentials(
+                cred, storage.Client.SCOPE))
+        self._location = location
         self._bucket_name = bucket_name
+        if validated:
+            self._bucket = self._client.bucket(
+                bucket_name, user_project=self.project_id)
+        else:
+            self._bucket = self._check_or_create_bucket(bucket_name)
 
     def _check_or_create_bucket(self, bucket_name):
         """Checks whether the bucket exists or creates one.
@@ -34,46 +62,447 @@ class GoogleCloudStorage(IceboxStorage):
         The application expects a bucket with given name. Create one if it does
         not already exist.
         """
-        bucket_names = [b.name for b in self._client.list_buckets()]
-        if bucket_name not in bucket_names:
+        bucket = self._client.bucket(bucket_name, user_project=self.project_id)
+        try:
+            bucket.reload()
+        except exceptions.NotFound:
             # create the bucket
             print(f"Creating {bucket_name} in {self._location}...")
-            self._client.create_bucket(
-                bucket_name, self._location)
+            self._client.create_bucket(bucket, location=self._location)
 
-        bucket = self._client.bucket(bucket_name, user_project=self.project_id)
         # disable bucket.requester_pays
         # TODO: return to requester_pays. Maybe it's a useful idea.
-        # TODO: this is not working for whatever reason. Check.
         if bucket.requester_pays:
             print(f"Disabling requester pays on bucket {bucket_name}.")
             bucket.requester_pays = False
             bucket.patch()
         return bucket
 
-    def Upload(self, source_path: str, dest_path: str):
-        """Upload a file to the remote location."""
+    def _with_bucket(self, func: typing.Callable, *args):
+        """Call func, checking the bucket and retrying once if it is missing.
+
+        Used for writes, which only fail with not found if the bucket itself
+        is missing.
+        """
+        try:
+            return func(*args)
+        except exceptions.NotFound:
+            print(f"Bucket {self._bucket_name} not found, checking again...")
+            self._bucket = self._check_or_create_bucket(self._bucket_name)
+            return func(*args)
+
+    def Location(self) -> str:
+        """Identify the bucket the storage keeps its objects in."""
+        return f"gs://{self._bucket_name}"
+
+    def Exists(self, relative_path: str) -> bool:
+        """Check whether an object exists at the remote location."""
         if not self._bucket:
             raise IceboxStorageError("Bucket not configured!")
         try:
-            blob = self._bucket.blob(dest_path)
-            blob.upload_from_filename(source_path)
+            return self._bucket.blob(relative_path).exists(
+                client=self._client)
+        except Exception as e:
+            print(e)
+            raise IceboxStorageError("Error checking remote file!")
+
+    def Delete(self, relative_path: str):
+        """Delete the object at the remote location if it exists."""
+        if not self._bucket:
+            raise IceboxStorageError("Bucket not configured!")
+        try:
+            self._bucket.delete_blob(relative_path, client=self._client)
+        except exceptions.NotFound:
+            pass
+        except Exception as e:
+            print(e)
+            raise IceboxStorageError("Error deleting remote file!")
+
+    def Upload(self, source_path: str, dest_path: str) -> int:
+        """Upload a file to the remote location.
+
+        Returns the generation of the uploaded object.
+        """
+        if not self._bucket:
+            raise IceboxStorageError("Bucket not configured!")
+        try:
+            generation = self._with_bucket(
+                self._upload, source_path, dest_path)
             print(f"File {source_path} uploaded to {dest_path}...")
+            return generation
         except Exception as e:
             print(e)
             raise IceboxStorageError("Error uploading file!")
 
-    def Download(self, source_path: str, dest_path: str):
-        """Download a file from the remote location."""
+    def _upload(self, source_path: str, dest_path: str) -> int:
+        size = os.path.getsize(source_path)
+        if (size > config.ICEBOX_COMPOSITE_THRESHOLD
+                and config.ICEBOX_COMPOSITE_MAX_PARTS > 1):
+            return self._upload_composite(source_path, dest_path)
+        elif size > config.ICEBOX_RESUMABLE_THRESHOLD:
+            return self._upload_resumable(source_path, dest_path)
+        blob = self._bucket.blob(dest_path)
+        blob.upload_from_filename(source_path)
+        return blob.generation
+
+    def _upload_composite(self, source_path: str, dest_path: str) -> int:
+        """Upload a large file as parallel parts composed into one object.
+
+        Parts are uploaded as temporary objects under the store prefix and
+        checkpointed locally as they finish. An interrupted upload of an
+        unchanged file only uploads the parts that are missing on the next
+        attempt. The parts are deleted once the final object has been
+        composed.
+        """
+        source_path = os.path.abspath(source_path)
+        stat = os.stat(source_path)
+        size = stat.st_size
+        part_count = min(
+            config.ICEBOX_COMPOSITE_MAX_PARTS,
+            -(-size // max(1, config.ICEBOX_COMPOSITE_PART_SIZE)))
+        part_size = -(-size // part_count)
+        checkpoint_path = _checkpoint_path(
+            self._bucket_name, dest_path, kind="composite")
+        checkpoint = {
+            'source': source_path,
+            'size': size,
+            'mtime_ns': stat.st_mtime_ns,
+            'part_size': part_size,
+            'parts_prefix': None,
+            'parts': {},
+        }
+
+        # reuse the parts of the previous attempt if the file has not
+        # changed since, and drop them otherwise.
+        previous = _read_checkpoint(checkpoint_path)
+        if previous and previous.get('parts_prefix'):
+            if all(previous.get(k) == checkpoint[k]
+                   for k in ['source', 'size', 'mtime_ns', 'part_size']):
+                checkpoint.update(
+                    parts_prefix=previous['parts_prefix'],
+                    parts=previous.get('parts', {}))
+            else:
+                self._delete_parts(previous)
+        if not checkpoint['parts_prefix']:
+            checkpoint['parts_prefix'] = (
+                f"{config.ICEBOX_STORE_PREFIX}{config.REMOTE_PATH_DELIMITER}"
+                f"parts{config.REMOTE_PATH_DELIMITER}{uuid.uuid4().hex}"
+                f"{config.REMOTE_PATH_DELIMITER}")
+        parts_prefix = checkpoint['parts_prefix']
+
+        def part_blob(
+                index: int, generation: typing.Optional[int] = None
+        ) -> storage.Blob:
+            # parts are pinned to the generation that was checkpointed
+            return self._bucket.blob(
+                f"{parts_prefix}{index:05d}", generation=generation)
+
+        done = {}
+        for index, generation in checkpoint['parts'].items():
+            part = part_blob(int(index), generation)
+            if part.exists(client=self._client):
+                done[int(index)] = part
+        if done:
+            print(f"Resuming upload of {source_path} with {len(done)} of "
+                  f"{part_count} parts...")
+        checkpoint['parts'] = {
+            str(index): part.generation for index, part in done.items()}
+        _write_checkpoint(checkpoint_path, checkpoint)
+
+        def upload_part(index: int) -> storage.Blob:
+            offset = index * part_size
+            part = part_blob(index)
+            with open(source_path, 'rb') as f:
+                f.seek(offset)
+                part.upload_from_file(
+                    f, size=min(part_size, size - offset),
+                    client=self._client, checksum='crc32c')
+            return part
+
+        missing = [index for index in range(part_count) if index not in done]
+        errors = []
+        with futures.ThreadPoolExecutor(
+                max_workers=max(1, min(len(missing), config.ICEBOX_JOBS))
+        ) as executor:
+            pending = {executor.submit(upload_part, index): index
+                       for index in missing}
+            # checkpoint every part that made it, even if others fail
+            for future in futures.as_completed(pending):
+                index = pending[future]
+                try:
+                    done[index] = future.result()
+                except Exception as e:
+                    errors.append(e)
+                    continue
+                checkpoint['parts'][str(index)] = done[index].generation
+                _write_checkpoint(checkpoint_path, checkpoint)
+        if errors:
+            raise errors[0]
+
+        parts = [done[index] for index in range(part_count)]
+        intermediates = []
+        try:
+            # a compose request takes a limited number of sources, so larger
+            # part lists are composed into intermediate objects first.
+            level = 0
+            while len(parts) > _MAX_COMPOSE_SOURCES:
+                composed = []
+                for i in range(0, len(parts), _MAX_COMPOSE_SOURCES):
+                    intermediate = self._bucket.blob(
+                        f"{parts_prefix}compose_{level}_{i:05d}")
+                    intermediate.compose(
+                        parts[i:i + _MAX_COMPOSE_SOURCES],
+                        client=self._client)
+                    intermediates.append(intermediate)
+                    composed.append(intermediate)
+                parts = composed
+                level += 1
+            blob = self._bucket.blob(dest_path)
+            blob.compose(parts, client=self._client)
+        finally:
+            self._bucket.delete_blobs(
+                intermediates, on_error=lambda blob: None,
+                client=self._client)
+        self._delete_parts(checkpoint)
+        Path(checkpoint_path).unlink(missing_ok=True)
+        return blob.generation
+
+    def _delete_parts(self, checkpoint: dict):
+        """Delete the checkpointed parts of a composite upload."""
+        self._bucket.delete_blobs(
+            [f"{checkpoint['parts_prefix']}{int(index):05d}"
+             for index in checkpoint.get('parts', {})],
+            on_error=lambda blob: None, client=self._client)
+
+    def _upload_resumable(self, source_path: str, dest_path: str) -> int:
+        """Upload a large file in chunks through a resumable session.
+
+        The session URI and the committed offset are checkpointed locally
+        after every chunk. An interrupted upload of an unchanged file resumes
+        from the last committed byte on the next attempt.
+        """
+        source_path = os.path.abspath(source_path)
+        stat = os.stat(source_path)
+        total = stat.st_size
+        chunk_size = max(
+            _RESUMABLE_CHUNK_ALIGNMENT,
+            config.ICEBOX_UPLOAD_CHUNK_SIZE
+            - config.ICEBOX_UPLOAD_CHUNK_SIZE % _RESUMABLE_CHUNK_ALIGNMENT)
+        checkpoint_path = _checkpoint_path(self._bucket_name, dest_path)
+        checkpoint = {
+            'source': source_path,
+            'size': total,
+            'mtime_ns': stat.st_mtime_ns,
+            'session_uri': None,
+            'offset': 0,
+        }
+
+        # resume the previous session if the file has not changed since.
+        previous = _read_checkpoint(checkpoint_path)
+        if previous and all(
+                previous.get(k) == checkpoint[k]
+                for k in ['source', 'size', 'mtime_ns']):
+            offset = self._query_resumable_offset(
+                previous['session_uri'], total)
+            if offset is not None:
+                print(f"Resuming upload of {source_path} at byte {offset}...")
+                checkpoint.update(
+                    session_uri=previous['session_uri'], offset=offset)
+            else:
+                # the session is gone, start over with a new one
+                Path(checkpoint_path).unlink(missing_ok=True)
+        if not checkpoint['session_uri']:
+            blob = self._bucket.blob(dest_path)
+            checkpoint['session_uri'] = blob.create_resumable_upload_session(
+                size=total, client=self._client)
+
+        response = None
+        with open(source_path, 'rb') as f:
+            while checkpoint['offset'] < total:
+                _write_checkpoint(checkpoint_path, checkpoint)
+                offset = checkpoint['offset']
+                f.seek(offset)
+                chunk = f.read(chunk_size)
+                response = self._client._http.put(
+                    checkpoint['session_uri'], data=chunk,
+                    headers={'Content-Range': (
+                        f"bytes {offset}-{offset + len(chunk) - 1}/{total}")})
+                checkpoint['offset'] = _committed_offset(response, total)
+        Path(checkpoint_path).unlink(missing_ok=True)
+        # the final response (if any) describes the uploaded object.
+        if response is not None and response.status_code in (200, 201):
+            return int(response.json()['generation'])
+        return None
+
+    def _query_resumable_offset(
+            self, session_uri: str, total: int) -> typing.Optional[int]:
+        """Ask the server how many bytes of a resumable session it has.
+
+        Returns None if the session has expired or is otherwise unusable,
+        i.e. for any client error (e.g. 404 or 410 for an expired session,
+        400 for a malformed one or 403), so that a new session is started.
+        Server and transport errors are raised, as the session may still be
+        resumed later.
+        """
+        response = self._client._http.put(
+            session_uri, data=b'',
+            headers={'Content-Range': f"bytes */{total}"})
+        if 400 <= response.status_code < 500:
+            return None
+        return _committed_offset(response, total)
+
+    def Download(
+            self, source_path: str, dest_path: str,
+            size: typing.Optional[int] = None):
+        """Download a file from the remote location.
+
+        The metadata of the object is only fetched if it might be large
+        enough to be sliced, i.e. if its size is unknown or above the
+        threshold. The object is downloaded into a temporary file next to
+        the destination, which only replaces the destination once the
+        download is complete and verified.
+        """
         if not self._bucket:
             raise IceboxStorageError("Bucket not configured!")
+
+        def sliced(size: int) -> bool:
+            return (size > config.ICEBOX_SLICED_DOWNLOAD_THRESHOLD
+                    and config.ICEBOX_DOWNLOAD_SLICES > 1)
+
+        temp_path = f"{dest_path}.{uuid.uuid4().hex}.part"
         try:
-            blob = self._bucket.blob(source_path)
-            blob.download_to_filename(dest_path)
+            if size is None or sliced(size):
+                blob = self._bucket.get_blob(source_path)
+                if not blob:
+                    raise IceboxStorageError(f"'{source_path}' not found.")
+                size = blob.size
+            else:
+                blob = self._bucket.blob(source_path)
+            if sliced(size):
+                self._download_sliced(blob, temp_path)
+            else:
+                # composite objects do not have an MD5 hash.
+                blob.download_to_filename(temp_path, checksum='crc32c')
+            os.replace(temp_path, dest_path)
             print(f"File {source_path} downloaded to {dest_path}...")
         except Exception as e:
             print(e)
             raise IceboxStorageError("Error downloading file!")
+        finally:
+            # a failed download must not leave partial contents behind
+            Path(temp_path).unlink(missing_ok=True)
+
+    def _download_sliced(self, blob: storage.Blob, dest_path: str):
+        """Download a large object as byte ranges over parallel connections.
+
+        Every slice is written in place into a preallocated destination file.
+        The checksums of the slices are combined and verified against the
+        CRC32C of the object.
+        """
+        size = blob.size
+        slice_size = -(-size // config.ICEBOX_DOWNLOAD_SLICES)
+        with open(dest_path, 'wb') as f:
+            f.truncate(size)
+
+        def download_slice(start: int) -> int:
+            end = min(start + slice_size, size) - 1
+            with open(dest_path, 'r+b') as f:
+                f.seek(start)
+                writer = _ChecksummedWriter(f)
+                # pin the generation so that every slice comes from the same
+                # version of the object.
+                blob.download_to_file(
+                    writer, start=start, end=end,
+                    if_generation_match=blob.generation, checksum=None)
+            if writer.length != end - start + 1:
+                raise IceboxStorageError(
+                    f"Incomplete slice at byte {start} of '{blob.name}'.")
+            return writer.crc32c()
+
+        starts = range(0, size, slice_size)
+        with futures.ThreadPoolExecutor(
+                max_workers=config.ICEBOX_DOWNLOAD_SLICES) as executor:
+            crcs = list(executor.map(download_slice, starts))
+
+        crc = 0
+        for start, slice_crc in zip(starts, crcs):
+            crc = _crc32c_combine(
+                crc, slice_crc, min(start + slice_size, size) - start)
+        if blob.crc32c and blob.crc32c != base64.b64encode(
+                crc.to_bytes(4, 'big')).decode():
+            raise IceboxStorageError(
+                f"Checksum mismatch for '{blob.name}'!")
+
+    def UploadData(
+            self, data: bytes, dest_path: str,
+            if_generation_match: typing.Optional[int] = None) -> int:
+        """Upload data from memory to the remote location.
+
+        Returns the generation of the uploaded object. The generation check
+        of conditional uploads is part of the upload request.
+        """
+        if not self._bucket:
+            raise IceboxStorageError("Bucket not configured!")
+
+        def upload() -> int:
+            blob = self._bucket.blob(dest_path)
+            blob.upload_from_string(
+                data, client=self._client, checksum='crc32c',
+                if_generation_match=if_generation_match)
+            return blob.generation
+
+        try:
+            return self._with_bucket(upload)
+        except exceptions.PreconditionFailed:
+            raise IceboxStorageConflictError(f"'{dest_path}' was changed!")
+        except Exception as e:
+            print(e)
+            raise IceboxStorageError("Error uploading data!")
+
+    def DownloadData(self, source_path: str) -> bytes:
+        """Download a remote file into memory."""
+        if not self._bucket:
+            raise IceboxStorageError("Bucket not configured!")
+        try:
+            blob = self._bucket.blob(source_path)
+            return blob.download_as_bytes(
+                client=self._client, checksum='crc32c')
+        except Exception as e:
+            print(e)
+            raise IceboxStorageError("Error downloading data!")
+
+    def DownloadDataIfModified(
+            self, source_path: str, generation: typing.Optional[int] = None
+    ) -> typing.Tuple[typing.Optional[bytes], int]:
+        """Download a remote file into memory unless it is at the generation.
+
+        The check is part of the download request, so an unchanged object
+        costs a single round trip without a body.
+        """
+        if not self._bucket:
+            raise IceboxStorageError("Bucket not configured!")
+        try:
+            blob = self._bucket.blob(source_path)
+            data = blob.download_as_bytes(
+                client=self._client, if_generation_not_match=generation,
+                checksum='crc32c')
+            return data, int(blob.generation)
+        except exceptions.NotModified:
+            return None, generation
+        except Exception as e:
+            print(e)
+            raise IceboxStorageError("Error downloading data!")
+
+    async def UploadAsync(self, source_path: str, dest_path: str):
+        """Asynchronously upload a file to the remote location."""
+        await self._run_in_executor(self.Upload, source_path, dest_path)
+
+    async def DownloadAsync(
+            self, source_path: str, dest_path: str,
+            size: typing.Optional[int] = None):
+        """Asynchronously download a file from the remote location."""
+        await self._run_in_executor(
+            self.Download, source_path, dest_path, size)
 
     def ListRemote(
             self, path: typing.Optional[str] = None
@@ -100,17 +529,49 @@ class GoogleCloudStorage(IceboxStorage):
         blobs = self._client.list_blobs(
             self._bucket_name, prefix=path, delimiter=delimiter)
         for blob in blobs:
-            name = blob.name[len(path):] if path else blob.name
-            if name != config.ICEBOX_FILE_NAME:
-                files.append(
-                    IceboxRemoteFile(name=name,
-                    size=blob.size, updated=blob.updated))
+            remote_file = _remote_from_blob(blob, path)
+            if remote_file:
+                files.append(remote_file)
         for prefix in blobs.prefixes:
-            name = prefix[len(path):] if path else prefix
-            folders.append(
-                IceboxRemoteFile(name=name, is_dir=True))
+            folder = _remote_from_prefix(prefix, path)
+            if folder:
+                folders.append(folder)
         return folders, files
 
+    async def ListRemoteAsync(
+            self, path: typing.Optional[str] = None
+    ) -> typing.AsyncIterator[IceboxRemoteFile]:
+        """Asynchronously iterate over the remote iceboxes.
+
+        Fetches one page of results at a time and yields its files and
+        folders before requesting the next one.
+
+        Raises
+            IceboxStorageError
+        """
+        if not self._client:
+            raise IceboxStorageError("Client not configured!")
+
+        delimiter = config.REMOTE_PATH_DELIMITER
+        if path and not path.endswith(delimiter):
+            path = f"{path}{delimiter}"
+
+        blobs = self._client.list_blobs(
+            self._bucket_name, prefix=path, delimiter=delimiter)
+        pages = blobs.pages
+        while True:
+            page = await self._run_in_executor(next, pages, None)
+            if page is None:
+                break
+            for blob in page:
+                remote_file = _remote_from_blob(blob, path)
+                if remote_file:
+                    yield remote_file
+            for prefix in page.prefixes:
+                folder = _remote_from_prefix(prefix, path)
+                if folder:
+                    yield folder
+
     def List(
             self, icebox: Icebox, relpath: str
     ) -> typing.Tuple[
@@ -122,48 +583,146 @@ class GoogleCloudStorage(IceboxStorage):
         Raises
             IceboxStorageError
         """
-        
-        path = (Path(icebox.path) / Path(relpath)).resolve()
-        if not path.exists():
-            raise IceboxStorageError(f"'{str(path)}' does not exist.")
-        
         folders, files = [], []
-        if path.is_file():
-            ilf = _from_path(path)
-            if ilf:
-                if relpath in icebox.frozen_files:
-                    ilf.is_frozen = True
-                    if ilf.size > 0:
-                        ilf.is_modified = True
-                files.append(ilf)
-        else:
-            for child in path.iterdir():
-                child_path = os.path.relpath(
-                    str(child), str(icebox.path))
-                if child.is_file():
-                    ilf = _from_path(Path(child))
-                    if ilf:
-                        if child_path in icebox.frozen_files:
-                            ilf.is_frozen = True
-                            if ilf.size > 0:
-                                ilf.is_modified = True
-                        files.append(ilf)
-                else:
-                    folders.append(_from_path(Path(child)))
-        folders = sorted(folders, key=lambda x: x.name)
-        files = sorted(files, key=lambda x: x.name)
+        for f in self.Scan(icebox, relpath):
+            (folders if f.is_dir else files).append(f)
+        folders.sort(key=lambda x: x.name)
+        files.sort(key=lambda x: x.name)
         return folders, files
 
+    async def ListAsync(
+            self, icebox: Icebox, relpath: str
+    ) -> typing.AsyncIterator[IceboxLocalFile]:
+        """Asynchronously iterate over the objects in the given icebox path.
 
-def _from_path(path: Path) -> IceboxLocalFile:
-    path = path.resolve()
-    if path.is_dir():
-        return IceboxLocalFile(
-            name=f"{path.name}{os.sep}", is_dir=True)
-    else:
-        if path.name == config.ICEBOX_FILE_NAME:
-            return None
-        return IceboxLocalFile(
-            name=path.name,
-            size=path.stat().st_size,
-            updated=datetime.fromtimestamp(path.stat().st_mtime))
+        Raises
+            IceboxStorageError
+        """
+        folders, files = await self._run_in_executor(
+            self.List, icebox, relpath)
+        for f in folders + files:
+            yield f
+
+
+def _committed_offset(response, total: int) -> int:
+    """Return the number of bytes committed to a resumable upload session."""
+    if response.status_code in (200, 201):
+        return total
+    if response.status_code != 308:
+        raise IceboxStorageError(
+            f"Resumable upload failed with status {response.status_code}.")
+    committed = response.headers.get('Range')
+    if not committed:
+        return 0
+    # Range header has the format 'bytes=0-<last committed byte>'
+    return int(committed.split('-')[-1]) + 1
+
+
+class _ChecksummedWriter:
+    """File-like wrapper that computes the CRC32C of the data written."""
+
+    def __init__(self, f: typing.BinaryIO):
+        self._f = f
+        self._checksum = google_crc32c.Checksum()
+        self.length = 0
+
+    def write(self, data: bytes) -> int:
+        self._checksum.update(data)
+        self.length += len(data)
+        return self._f.write(data)
+
+    def crc32c(self) -> int:
+        return int.from_bytes(self._checksum.digest(), 'big')
+
+
+def _gf2_matrix_times(matrix: typing.List[int], vector: int) -> int:
+    result, i = 0, 0
+    while vector:
+        if vector & 1:
+            result ^= matrix[i]
+        vector >>= 1
+        i += 1
+    return result
+
+
+def _gf2_matrix_square(matrix: typing.List[int]) -> typing.List[int]:
+    return [_gf2_matrix_times(matrix, row) for row in matrix]
+
+
+def _crc32c_combine(crc1: int, crc2: int, length2: int) -> int:
+    """Combine the CRC32C of two consecutive blocks of data.
+
+    Returns the CRC32C of the concatenation given the checksums of both
+    blocks and the length of the second one. Port of zlib's crc32_combine
+    for the Castagnoli polynomial.
+    """
+    if length2 <= 0:
+        return crc1
+    # operator for one zero bit
+    odd = [0x82F63B78] + [1 << n for n in range(31)]
+    even = _gf2_matrix_square(odd)
+    odd = _gf2_matrix_square(even)
+    # apply length2 zero bytes to crc1
+    while True:
+        even = _gf2_matrix_square(odd)
+        if length2 & 1:
+            crc1 = _gf2_matrix_times(even, crc1)
+        length2 >>= 1
+        if not length2:
+            break
+        odd = _gf2_matrix_square(even)
+        if length2 & 1:
+            crc1 = _gf2_matrix_times(odd, crc1)
+        length2 >>= 1
+        if not length2:
+            break
+    return crc1 ^ crc2
+
+
+def _checkpoint_path(
+        bucket_name: str, dest_path: str, kind: str = "resumable") -> str:
+    name = f"{bucket_name}/{dest_path}"
+    if kind != "resumable":
+        name = f"{kind}:{name}"
+    key = hashlib.sha256(name.encode()).hexdigest()
+    return os.path.join(config.ICEBOX_CACHE_LOCATION, "uploads", f"{key}.json")
+
+
+def _read_checkpoint(path: str) -> typing.Optional[dict]:
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_checkpoint(path: str, checkpoint: dict):
+    """Atomically write the checkpoint, readable only by the current user.
+
+    The session URI is sufficient to write to the object.
+    """
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    temp_path = f"{path}.tmp"
+    fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(temp_path, path)
+
+
+def _remote_from_blob(
+        blob: storage.Blob, path: typing.Optional[str]
+) -> typing.Optional[IceboxRemoteFile]:
+    name = blob.name[len(path):] if path else blob.name
+    if name == config.ICEBOX_FILE_NAME:
+        return None
+    return IceboxRemoteFile(name=name, size=blob.size, updated=blob.updated)
+
+
+def _remote_from_prefix(
+        prefix: str, path: typing.Optional[str]
+) -> typing.Optional[IceboxRemoteFile]:
+    name = prefix[len(path):] if path else prefix
+    if not path and name.rstrip(
+            config.REMOTE_PATH_DELIMITER) == config.ICEBOX_STORE_PREFIX:
+        return None
+    return IceboxRemoteFile(name=name, is_dir=True)
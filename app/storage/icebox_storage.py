@@ -1,5 +1,12 @@
+import asyncio
 import enum
+import importlib
+import os
 import typing
+
+from concurrent import futures
+
+from app import config
 from app.elements.icebox import Icebox
 
 from app.elements.icebox_files import IceboxLocalFile, IceboxRemoteFile
@@ -9,14 +16,55 @@ class IceboxStorageError(Exception):
     pass
 
 
+class IceboxStorageConflictError(IceboxStorageError):
+    """A conditional write found the object at a different generation."""
+
+
 class IceboxStorageType(str, enum.Enum):
     LOCAL = 'LOCAL'
     GCP = 'GCP'
     AWS = 'AWS'
 
 
+# storage classes by type as "module:class", so that a backend and its client
+# libraries are only imported once it is used.
+_BACKENDS = {
+    IceboxStorageType.LOCAL: "app.storage.local_storage:LocalStorage",
+    IceboxStorageType.GCP:
+        "app.storage.google_cloud_storage:GoogleCloudStorage",
+}
+
+
+def GetStorageClass(
+        storage_type: IceboxStorageType) -> typing.Type["IceboxStorage"]:
+    """Import and return the storage class of the given type.
+
+    Raises
+        IceboxStorageError
+    """
+    backend = _BACKENDS.get(storage_type)
+    if not backend:
+        raise IceboxStorageError(f"Unsupported storage '{storage_type}'.")
+    module_name, _, class_name = backend.partition(":")
+    return getattr(importlib.import_module(module_name), class_name)
+
+
 class IceboxStorage:
-    """Informal interface for all storage classes supported by Icebox."""
+    """Informal interface for all storage classes supported by Icebox.
+
+    Every blocking method has an asyncio counterpart suffixed with `Async`
+    so that many small operations can be overlapped on one event loop.
+    """
+
+    _executor: typing.Optional[futures.ThreadPoolExecutor] = None
+
+    def Location(self) -> str:
+        """Identify where the storage keeps its objects, e.g. a bucket URL.
+
+        Raises
+            IceboxStorageError
+        """
+        raise IceboxStorageError("Unimplemented.")
 
     def ListRemote(
             self, path: typing.Optional[str] = None
@@ -47,25 +95,208 @@ class IceboxStorage:
         """
         raise IceboxStorageError("Unimplemented.")
 
-    def Upload(self, source_path: str, relative_destination_path: str):
+    def Scan(
+            self, icebox: Icebox, relpath: str
+    ) -> typing.Iterator[IceboxLocalFile]:
+        """Iterate over the objects in the given icebox path.
+
+        Same as List, but entries are yielded unsorted as the directory is
+        read, with a single stat per file. The listing is of the local
+        icebox folder, so it is shared by every storage.
+
+        Raises
+            IceboxStorageError
+        """
+        path = os.path.normpath(os.path.join(icebox.path, relpath))
+        try:
+            is_dir = os.path.isdir(path)
+            if not is_dir:
+                st = os.stat(path)
+        except OSError:
+            raise IceboxStorageError(f"'{path}' does not exist.")
+        frozen_files = icebox.frozen_files
+        if not is_dir:
+            name = os.path.basename(path)
+            if name != config.ICEBOX_FILE_NAME:
+                yield _local_file(
+                    name, st, relpath.strip(config.REMOTE_PATH_DELIMITER)
+                    in frozen_files)
+            return
+        prefix = os.path.relpath(path, icebox.path)
+        prefix = (
+            "" if prefix == os.curdir else
+            f"{prefix.replace(os.sep, config.REMOTE_PATH_DELIMITER)}"
+            f"{config.REMOTE_PATH_DELIMITER}")
+        with os.scandir(path) as entries:
+            for entry in entries:
+                name = entry.name
+                try:
+                    if entry.is_dir():
+                        yield IceboxLocalFile(
+                            name=f"{name}{config.REMOTE_PATH_DELIMITER}",
+                            is_dir=True)
+                        continue
+                    if name == config.ICEBOX_FILE_NAME:
+                        continue
+                    st = entry.stat()
+                except OSError:
+                    # removed while listing
+                    continue
+                yield _local_file(name, st, f"{prefix}{name}" in frozen_files)
+
+    def Exists(self, relative_path: str) -> bool:
+        """Check whether an object exists at the remote relative_path.
+
+        Raises
+            IceboxStorageError
+        """
+        raise IceboxStorageError("Unimplemented.")
+
+    def Delete(self, relative_path: str):
+        """Delete the object at the remote relative_path if it exists.
+
+        Raises
+            IceboxStorageError
+        """
+        raise IceboxStorageError("Unimplemented.")
+
+    def Upload(
+            self, source_path: str, relative_destination_path: str
+    ) -> typing.Optional[int]:
         """Upload the source_path to the relative_destination_path.
 
         The source_path should be local and the relative_destination_path
         should be remote. The source_path should point to a file locally.
 
+        Returns the generation of the uploaded object if the storage
+        supports it.
+
         Raises
             IceboxStorageError
         """
         raise IceboxStorageError("Unimplemented.")
 
-    def Download(self, relative_source_path: str, destination_path: str):
+    def Download(
+            self, relative_source_path: str, destination_path: str,
+            size: typing.Optional[int] = None):
         """Download the relative_source_path to the destination_path.
 
         The source path should be remote and the destination path should be
         local. Destination path should not exist or should be a file which will
-        be **overwritten**.
+        be **overwritten**. The size of the object, if known, spares storages
+        a request for it.
 
         Raises
             IceboxStorageError
         """
         raise IceboxStorageError("Unimplemented.")
+
+    def UploadData(
+            self, data: bytes, relative_destination_path: str,
+            if_generation_match: typing.Optional[int] = None
+    ) -> typing.Optional[int]:
+        """Upload data from memory to the relative_destination_path.
+
+        With if_generation_match, the data is only uploaded if the object is
+        at that generation, or does not exist yet if it is 0.
+
+        Returns the generation of the uploaded object if the storage
+        supports it.
+
+        Raises
+            IceboxStorageError
+            IceboxStorageConflictError
+        """
+        raise IceboxStorageError("Unimplemented.")
+
+    def DownloadData(self, relative_source_path: str) -> bytes:
+        """Download the relative_source_path into memory.
+
+        Raises
+            IceboxStorageError
+        """
+        raise IceboxStorageError("Unimplemented.")
+
+    def DownloadDataIfModified(
+            self, relative_source_path: str,
+            generation: typing.Optional[int] = None
+    ) -> typing.Tuple[typing.Optional[bytes], typing.Optional[int]]:
+        """Download the relative_source_path unless it is at the generation.
+
+        Returns a tuple of the data and the current generation of the object.
+        The data is None if the object is still at the given generation.
+        Without a generation, the object is always downloaded.
+
+        Raises
+            IceboxStorageError
+        """
+        raise IceboxStorageError("Unimplemented.")
+
+    def ListRemoteAsync(
+            self, path: typing.Optional[str] = None
+    ) -> typing.AsyncIterator[IceboxRemoteFile]:
+        """Asynchronously iterate over the remote iceboxes.
+
+        Same as ListRemote but yields folders and files as they are listed.
+
+        Raises
+            IceboxStorageError
+        """
+        raise IceboxStorageError("Unimplemented.")
+
+    def ListAsync(
+            self, icebox: Icebox, relpath: str
+    ) -> typing.AsyncIterator[IceboxLocalFile]:
+        """Asynchronously iterate over the objects in the given icebox path.
+
+        Same as List but yields folders and files as they are listed.
+
+        Raises
+            IceboxStorageError
+        """
+        raise IceboxStorageError("Unimplemented.")
+
+    async def UploadAsync(
+            self, source_path: str, relative_destination_path: str):
+        """Asynchronously upload the source_path.
+
+        Same as Upload.
+
+        Raises
+            IceboxStorageError
+        """
+        raise IceboxStorageError("Unimplemented.")
+
+    async def DownloadAsync(
+            self, relative_source_path: str, destination_path: str,
+            size: typing.Optional[int] = None):
+        """Asynchronously download the relative_source_path.
+
+        Same as Download.
+
+        Raises
+            IceboxStorageError
+        """
+        raise IceboxStorageError("Unimplemented.")
+
+    def _run_in_executor(
+            self, func: typing.Callable, *args) -> asyncio.Future:
+        """Run a blocking call without blocking the running event loop.
+
+        Calls are dispatched to a pool owned by the storage and bounded by
+        config.ICEBOX_JOBS, so any number of pending operations share a
+        fixed set of workers and connections.
+        """
+        if not self._executor:
+            self._executor = futures.ThreadPoolExecutor(
+                max_workers=config.ICEBOX_JOBS)
+        return asyncio.get_running_loop().run_in_executor(
+            self._executor, func, *args)
+
+
+def _local_file(
+        name: str, st: os.stat_result, is_frozen: bool) -> IceboxLocalFile:
+    # frozen files are truncated locally, any content means a local change
+    return IceboxLocalFile(
+        name=name, size=st.st_size, mtime=st.st_mtime, is_frozen=is_frozen,
+        is_modified=is_frozen and st.st_size > 0)
@@ -1,17 +1,23 @@
 import os
 import shutil
+import threading
 import typing
+import uuid
 
 from datetime import datetime
 from pathlib import Path
 
 from .icebox_storage import IceboxStorage
+from .icebox_storage import IceboxStorageConflictError
 from .icebox_storage import IceboxStorageError
 from app import config
 from app.common import utils
 from app.elements.icebox import Icebox
 from app.elements.icebox_files import IceboxLocalFile, IceboxRemoteFile
 
+# serializes conditional uploads, which check and replace the stored file.
+_conditional_lock = threading.Lock()
+
 
 class LocalStorage(IceboxStorage):
     """Local storage for Icebox.
@@ -23,12 +29,35 @@ class LocalStorage(IceboxStorage):
         self.storage_path = Path(path)
         self.storage_path.mkdir(parents=True, exist_ok=True)
 
-    def Upload(self, source_path: str, relative_destination_path: str):
+    def Location(self) -> str:
+        """Identify the folder the storage keeps its objects in."""
+        return str(self.storage_path.resolve())
+
+    def Exists(self, relative_path: str) -> bool:
+        """Check whether an object exists at the remote relative_path.
+
+        Overrides the default unimplemented method in IceboxStorage.
+        """
+        return (self.storage_path / Path(relative_path)).is_file()
+
+    def Delete(self, relative_path: str):
+        """Delete the object at the remote relative_path if it exists.
+
+        Overrides the default unimplemented method in IceboxStorage.
+        """
+        (self.storage_path / Path(relative_path)).unlink(missing_ok=True)
+
+    def Upload(
+            self, source_path: str, relative_destination_path: str
+    ) -> int:
         """Upload the source_path to the relative_destination_path.
 
         The source_path should be local and the relative_destination_path
         should be remote. The source_path should point to a file locally.
 
+        Returns the modification time of the stored file in nanoseconds as
+        its generation.
+
         Overrides the default unimplemented method in IceboxStorage.
 
         Raises
@@ -47,8 +76,11 @@ class LocalStorage(IceboxStorage):
 
         # copy contents
         shutil.copyfile(_source_path, _destination_path)
+        return _destination_path.stat().st_mtime_ns
 
-    def Download(self, relative_source_path: str, destination_path: str):
+    def Download(
+            self, relative_source_path: str, destination_path: str,
+            size: typing.Optional[int] = None):
         """Download the relative_source_path to the destination_path.
 
         The source path should be remote and the destination path should be
@@ -74,12 +106,127 @@ class LocalStorage(IceboxStorage):
         # copy contents
         shutil.copyfile(_source_path, _destination_path)
 
+    def UploadData(
+            self, data: bytes, relative_destination_path: str,
+            if_generation_match: typing.Optional[int] = None) -> int:
+        """Upload data from memory to the relative_destination_path.
+
+        Returns the modification time of the stored file in nanoseconds as
+        its generation. Creating a file with if_generation_match=0 is
+        exclusive between processes, other conditional uploads only between
+        the threads of a process.
+
+        Overrides the default unimplemented method in IceboxStorage.
+
+        Raises
+            IceboxStorageError
+            IceboxStorageConflictError
+        """
+        _destination_path = self.storage_path / Path(relative_destination_path)
+        _destination_path.parent.mkdir(parents=True, exist_ok=True)
+        # write to a temporary file first so that concurrent readers never
+        # see partial contents.
+        _temp_path = _destination_path.with_name(
+            f"{_destination_path.name}.{uuid.uuid4().hex}")
+        _temp_path.write_bytes(data)
+        if if_generation_match is None:
+            os.replace(_temp_path, _destination_path)
+            return _destination_path.stat().st_mtime_ns
+        if if_generation_match == 0:
+            # linking fails if the destination exists, even across processes
+            try:
+                os.link(_temp_path, _destination_path)
+            except FileExistsError:
+                raise IceboxStorageConflictError(
+                    f"'{relative_destination_path}' was changed!")
+            finally:
+                _temp_path.unlink()
+            return _destination_path.stat().st_mtime_ns
+        with _conditional_lock:
+            try:
+                current = _destination_path.stat().st_mtime_ns
+            except FileNotFoundError:
+                current = 0
+            if current != if_generation_match:
+                _temp_path.unlink()
+                raise IceboxStorageConflictError(
+                    f"'{relative_destination_path}' was changed!")
+            os.replace(_temp_path, _destination_path)
+            st = _destination_path.stat()
+            if st.st_mtime_ns == current:
+                # written within the resolution of the file system clock
+                os.utime(_destination_path, ns=(st.st_atime_ns, current + 1))
+                return current + 1
+            return st.st_mtime_ns
+
+    def DownloadData(self, relative_source_path: str) -> bytes:
+        """Download the relative_source_path into memory.
+
+        Overrides the default unimplemented method in IceboxStorage.
+
+        Raises
+            IceboxStorageError
+        """
+        _source_path = self.storage_path / Path(relative_source_path)
+        if not _source_path.is_file():
+            raise IceboxStorageError("Path not found!")
+        return _source_path.read_bytes()
+
+    def DownloadDataIfModified(
+            self, relative_source_path: str,
+            generation: typing.Optional[int] = None
+    ) -> typing.Tuple[typing.Optional[bytes], int]:
+        """Download the relative_source_path unless it is at the generation.
+
+        The modification time of the stored file in nanoseconds serves as
+        its generation.
+
+        Overrides the default unimplemented method in IceboxStorage.
+
+        Raises
+            IceboxStorageError
+        """
+        _source_path = self.storage_path / Path(relative_source_path)
+        if not _source_path.is_file():
+            raise IceboxStorageError("Path not found!")
+        current = _source_path.stat().st_mtime_ns
+        if current == generation:
+            return None, current
+        return _source_path.read_bytes(), current
+
+    async def UploadAsync(
+            self, source_path: str, relative_destination_path: str):
+        """Asynchronously upload the source_path.
+
+        Overrides the default unimplemented method in IceboxStorage.
+
+        Raises
+            IceboxStorageError
+        """
+        await self._run_in_executor(
+            self.Upload, source_path, relative_destination_path)
+
+    async def DownloadAsync(
+            self, relative_source_path: str, destination_path: str,
+            size: typing.Optional[int] = None):
+        """Asynchronously download the relative_source_path.
+
+        Overrides the default unimplemented method in IceboxStorage.
+
+        Raises
+            IceboxStorageError
+        """
+        await self._run_in_executor(
+            self.Download, relative_source_path, destination_path, size)
+
     def Destroy(self):
         """Destroy the storage.
 
         Utility function.
         """
-        shutil.rmtree(self.storage_path)
+        if self.storage_path.exists():
+            shutil.rmtree(self.storage_path)
+        utils.InvalidateListings(self)
 
     def ListRemote(
             self, path: typing.Optional[str] = None
@@ -100,6 +247,9 @@ class LocalStorage(IceboxStorage):
         if path:
             p = self.storage_path / Path(path)
         if not p.exists():
+            if not path:
+                # nothing has been stored yet
+                return folders, files
             raise IceboxStorageError("Path not found!")
         if p.is_file():
             files.append(_remote_from_path(str(p), p))
@@ -110,7 +260,7 @@ class LocalStorage(IceboxStorage):
                 if child.is_file():
                     if child_path != config.ICEBOX_FILE_NAME:
                         files.append(_remote_from_path(child_path, child))
-                else:
+                elif path or child_path != config.ICEBOX_STORE_PREFIX:
                     folders.append(_remote_from_path(child_path, child))
         folders = sorted(folders, key=lambda x: x.name)
         files = sorted(files, key=lambda x: x.name)
@@ -124,42 +274,44 @@ class LocalStorage(IceboxStorage):
 
         Returns a tuple of folders and files.
 
-        TODO: This is untested!
+        Raises
+            IceboxStorageError
+        """
+        folders, files = [], []
+        for f in self.Scan(icebox, relpath):
+            (folders if f.is_dir else files).append(f)
+        folders.sort(key=lambda x: x.name)
+        files.sort(key=lambda x: x.name)
+        return folders, files
+
+    async def ListRemoteAsync(
+            self, path: typing.Optional[str] = None
+    ) -> typing.AsyncIterator[IceboxRemoteFile]:
+        """Asynchronously iterate over the remote iceboxes.
+
+        Overrides the default unimplemented method in IceboxStorage.
 
         Raises
             IceboxStorageError
         """
+        folders, files = await self._run_in_executor(self.ListRemote, path)
+        for f in folders + files:
+            yield f
 
-        path = (Path(icebox.path) / Path(relpath)).resolve()
-        if not path.exists():
-            raise IceboxStorageError(f"'{str(path)}' does not exist.")
+    async def ListAsync(
+            self, icebox: Icebox, relpath: str
+    ) -> typing.AsyncIterator[IceboxLocalFile]:
+        """Asynchronously iterate over the objects in the given icebox path.
 
-        folders, files = [], []
-        if path.is_file():
-            ilf = _local_from_path(str(path), path)
-            if ilf:
-                if relpath in icebox.frozen_files:
-                    ilf.is_frozen = True
-                    if ilf.size > 0:
-                        ilf.is_modified = True
-                files.append(ilf)
-        else:
-            for child in path.iterdir():
-                child_path = os.path.relpath(
-                    str(child), str(icebox.path))
-                if child.is_file():
-                    ilf = _local_from_path(child_path, Path(child))
-                    if ilf:
-                        if child_path in icebox.frozen_files:
-                            ilf.is_frozen = True
-                            if ilf.size > 0:
-                                ilf.is_modified = True
-                        files.append(ilf)
-                else:
-                    folders.append(_local_from_path(child_path, Path(child)))
-        folders = sorted(folders, key=lambda x: x.name)
-        files = sorted(files, key=lambda x: x.name)
-        return folders, files
+        Overrides the default unimplemented method in IceboxStorage.
+
+        Raises
+            IceboxStorageError
+        """
+        folders, files = await self._run_in_executor(
+            self.List, icebox, relpath)
+        for f in folders + files:
+            yield f
 
 
 def _remote_from_path(name: str, path: Path) -> IceboxRemoteFile:
@@ -172,17 +324,3 @@ def _remote_from_path(name: str, path: Path) -> IceboxRemoteFile:
         return IceboxRemoteFile(
             name=name, size=path.stat().st_size,
             updated=datetime.fromtimestamp(path.stat().st_mtime))
-
-
-def _local_from_path(name: str, path: Path) -> IceboxLocalFile:
-    if path.is_dir():
-        if not name.endswith(config.REMOTE_PATH_DELIMITER):
-            name = f"{name}{config.REMOTE_PATH_DELIMITER}"
-        return IceboxLocalFile(
-            name=name, is_dir=True)
-    else:
-        if name == config.ICEBOX_FILE_NAME:
-            return None
-        return IceboxLocalFile(
-            name=name, size=path.stat().st_size,
-            updated=datetime.fromtimestamp(path.stat().st_mtime))
@@ -0,0 +1,101 @@
+import datetime
+import hashlib
+import json
+import os
+import typing
+
+from pathlib import Path
+
+from google.oauth2 import service_account
+
+from app import config
+
+# Access tokens of service accounts are cached on disk, so that back to back
+# invocations reuse a valid token instead of minting a new one each. A token
+# is cached per credentials file, service account and scopes, in a file that
+# only the user can read.
+
+
+class CachedServiceAccountCredentials(service_account.Credentials):
+    """Service account credentials that share their token through a file.
+
+    Tokens are considered expired ICEBOX_TOKEN_REFRESH_MARGIN seconds ahead
+    of their expiry. A refresh first looks for a newer token in the cache
+    (e.g. from another invocation) and only mints one if there is none.
+    """
+
+    _cache_path: typing.Optional[Path] = None
+
+    @property
+    def expired(self) -> bool:
+        if not self.expiry:
+            return False
+        return _utcnow() >= self.expiry - _refresh_margin()
+
+    def refresh(self, request):
+        cached = ReadToken(self._cache_path)
+        if cached:
+            self.token, self.expiry = cached
+            return
+        super().refresh(request)
+        WriteToken(self._cache_path, self.token, self.expiry)
+
+
+def LoadCredentials(
+        cred: str, scopes: typing.Sequence[str]
+) -> CachedServiceAccountCredentials:
+    """Load service account credentials that use the token cache."""
+    credentials = CachedServiceAccountCredentials.from_service_account_file(
+        cred, scopes=scopes)
+    credentials._cache_path = GetTokenCachePath(
+        cred, credentials.service_account_email, scopes)
+    return credentials
+
+
+def GetTokenCachePath(
+        cred: str, account: str, scopes: typing.Sequence[str]) -> Path:
+    key = hashlib.sha256(json.dumps(
+        [str(Path(cred).resolve()), account, sorted(scopes)]).encode())
+    return Path(config.ICEBOX_TOKEN_CACHE_LOCATION) / f"{key.hexdigest()}.json"
+
+
+def ReadToken(
+        path: Path
+) -> typing.Optional[typing.Tuple[str, datetime.datetime]]:
+    """Read a cached token, None if there is none that is still fresh."""
+    try:
+        with open(path) as f:
+            cached = json.load(f)
+        expiry = datetime.datetime.utcfromtimestamp(cached['expiry'])
+        token = cached['token']
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    if _utcnow() >= expiry - _refresh_margin():
+        return None
+    return token, expiry
+
+
+def WriteToken(path: Path, token: str, expiry: datetime.datetime):
+    """Atomically cache a token in a file that only the user can read."""
+    if not token or not expiry:
+        return
+    path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    temp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    data = json.dumps({
+        'token': token,
+        'expiry': expiry.replace(
+            tzinfo=datetime.timezone.utc).timestamp(),
+    })
+    fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+def _utcnow() -> datetime.datetime:
+    # naive UTC, like the expiry of google.auth credentials
+    return datetime.datetime.utcnow()
+
+
+def _refresh_margin() -> datetime.timedelta:
+    return datetime.timedelta(seconds=config.ICEBOX_TOKEN_REFRESH_MARGIN)
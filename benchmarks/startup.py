@@ -0,0 +1,79 @@
+"""Measure the startup cost of the icebox CLI per command.
+
+Every command is loaded in a fresh interpreter, the way the CLI loads it,
+and timed over a number of runs. The import cost is taken from
+`python -X importtime`, along with the modules that contribute most to it.
+
+usage: python benchmarks/startup.py [runs]
+"""
+import statistics
+import subprocess
+import sys
+import time
+
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# commands mapped to the classes the CLI loads for them.
+COMMANDS = {
+    'help': None,
+    'config': 'IceboxConfigCommand',
+    'init': 'IceboxInitCommand',
+    'clone': 'IceboxCloneCommand',
+    'freeze': 'IceboxFreezeCommand',
+    'thaw': 'IceboxThawCommand',
+    'ls': 'IceboxListCommand',
+}
+TOP_MODULES = 3
+
+
+def _script(command_class: str) -> str:
+    script = "import icebox"
+    if command_class:
+        script += f"; getattr(icebox.commands, '{command_class}')"
+    return script
+
+
+def _run(args: list) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *args], cwd=ROOT, capture_output=True, text=True,
+        check=True)
+
+
+def _import_times(command_class: str) -> dict:
+    """Cumulative import time in microseconds of every module."""
+    result = _run(['-X', 'importtime', '-c', _script(command_class)])
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # nesting is shown by indentation, keep top level imports only
+        if not name.startswith("  "):
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def _wall_time(script: str) -> float:
+    start = time.perf_counter()
+    _run(['-c', script])
+    return time.perf_counter() - start
+
+
+def main(runs: int = 10):
+    baseline = statistics.median(_wall_time("pass") for _ in range(runs))
+    print(f"{'command':<8} {'wall ms':>8} {'import ms':>10}  heaviest imports")
+    for command, command_class in COMMANDS.items():
+        wall = statistics.median(
+            _wall_time(_script(command_class)) for _ in range(runs))
+        times = _import_times(command_class)
+        heaviest = sorted(times.items(), key=lambda x: -x[1])[:TOP_MODULES]
+        print(f"{command:<8} {wall * 1000:>8.1f} "
+              f"{sum(times.values()) / 1000:>10.1f}  "
+              + ", ".join(f"{n} {t / 1000:.1f}" for n, t in heaviest))
+    print(f"(interpreter alone: {baseline * 1000:.1f} ms)")
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:2]))
@@ -5,6 +5,8 @@ import traceback
 
 from app import common
 from app import commands
+from app import config as icebox_config
+from app.common import daemon as icebox_daemon
 from app.elements.icebox import IceboxError
 
 
@@ -25,11 +27,15 @@ These are the common icebox commands:
     freeze      Archive a given path.
                 The path can be a file or folder. All files within a folder are
                 recursively archived.
-                usage: freeze <path>
+                Options:
+                    -j / --jobs : Number of parallel uploads.
+                usage: freeze [options] <path>
     thaw        Unarchive a given path and restore original content.
                 The path can be a file or folder. All files within a folder are
                 recursively unarchived.
-                usage: thaw <path>
+                Options:
+                    -j / --jobs : Number of parallel downloads.
+                usage: thaw [options] <path>
     ls          List the contents of an icebox (local or remote).
                 * Local paths must be inside an initialized icebox. Omitting
                   the path resolves to the current working directory.
@@ -37,9 +43,25 @@ These are the common icebox commands:
                   available iceboxes.
                 Options:
                     -a / --remote : List remote iceboxes.
+                    -n / --limit  : Maximum number of entries to list.
+                    -s / --sort   : Sort by name (default), size, time or
+                                    none to list in directory order.
+                    -r / --reverse: Reverse the sort order.
+                    --json        : Print one JSON object per entry.
+                    --rebuild     : Regenerate the registry of remote
+                                    iceboxes before listing them.
                 usage: ls [options] [path]
+    daemon      Serve commands from a resident process.
+                Keeps storage clients and iceboxes warm between commands.
+                While it runs, init, clone, freeze, thaw and ls are sent to
+                it, and run in process otherwise.
+                usage: daemon [start|stop]
 ''')
 
+# commands that are sent to the daemon if one is running. Others are either
+# interactive or trivial and always run in process.
+DAEMON_COMMANDS = ['init', 'clone', 'freeze', 'thaw', 'ls']
+
 
 def print_usage():
     print(USAGE)
@@ -83,11 +105,20 @@ def clone(args):
 
 
 def freeze(args):
-    if len(args) != 1:
-        print("Exactly one argument required - freeze <path>")
-        return
+    parser = argparse.ArgumentParser(
+        description='Parse arguments for freeze command.')
+    parser.add_argument(
+        'path', type=str,
+        help='path to freeze.')
+    parser.add_argument(
+        '-j', '--jobs', dest='jobs', type=int,
+        default=icebox_config.ICEBOX_JOBS,
+        help='number of parallel uploads.')
+    parsed_args = parser.parse_args(args)
+    cmd = None
     try:
-        cmd = commands.IceboxFreezeCommand(path=args[0])
+        cmd = commands.IceboxFreezeCommand(
+            path=parsed_args.path, jobs=parsed_args.jobs)
         cmd.run()
     except IceboxError as e:
         print(e)
@@ -99,11 +130,20 @@ def freeze(args):
 
 
 def thaw(args):
-    if len(args) != 1:
-        print("Exactly one argument required - thaw <path>")
-        return
+    parser = argparse.ArgumentParser(
+        description='Parse arguments for thaw command.')
+    parser.add_argument(
+        'path', type=str,
+        help='path to thaw.')
+    parser.add_argument(
+        '-j', '--jobs', dest='jobs', type=int,
+        default=icebox_config.ICEBOX_JOBS,
+        help='number of parallel downloads.')
+    parsed_args = parser.parse_args(args)
+    cmd = None
     try:
-        cmd = commands.IceboxThawCommand(path=args[0])
+        cmd = commands.IceboxThawCommand(
+            path=parsed_args.path, jobs=parsed_args.jobs)
         cmd.run()
     except IceboxError as e:
         print(e)
@@ -123,19 +163,56 @@ def list(args):
     parser.add_argument(
         '-a', '--remote', dest='remote', action='store_true',
         help='list remote iceboxes.')
+    parser.add_argument(
+        '-n', '--limit', dest='limit', type=int, default=None,
+        help='maximum number of entries to list.')
+    parser.add_argument(
+        '-s', '--sort', dest='sort', default='name',
+        choices=['name', 'size', 'time', 'none'],
+        help='sort order of the entries.')
+    parser.add_argument(
+        '-r', '--reverse', dest='reverse', action='store_true',
+        help='reverse the sort order.')
+    parser.add_argument(
+        '--json', dest='as_json', action='store_true',
+        help='print one JSON object per entry.')
+    parser.add_argument(
+        '--rebuild', dest='rebuild', action='store_true',
+        help='regenerate the registry of remote iceboxes.')
     parsed_args = parser.parse_args(args)
     try:
         commands.IceboxListCommand(
-            path=parsed_args.path, remote=parsed_args.remote).run()
+            path=parsed_args.path, remote=parsed_args.remote,
+            limit=parsed_args.limit, sort=parsed_args.sort,
+            reverse=parsed_args.reverse, as_json=parsed_args.as_json,
+            rebuild=parsed_args.rebuild).run()
     except IceboxError as e:
         print(e)
     except Exception:
         traceback.print_exc()
 
 
-def main():
-    command = None if len(sys.argv) == 1 else sys.argv[1]
-    args = [] if len(sys.argv) < 3 else sys.argv[2:]
+def daemon(args):
+    if len(args) > 1 or (args and args[0] not in ['start', 'stop']):
+        print("At most one argument expected - daemon [start|stop]")
+        return
+    try:
+        if args == ['stop']:
+            if not icebox_daemon.StopDaemon():
+                print("Daemon is not running.")
+        else:
+            icebox_daemon.Serve(run)
+    except IceboxError as e:
+        print(e)
+    except KeyboardInterrupt:
+        pass
+    except Exception:
+        traceback.print_exc()
+
+
+def run(argv):
+    command = None if len(argv) == 0 else argv[0]
+    args = argv[1:]
     if not command or command in ['help', '-h']:
         print_usage()
     elif command == 'config':
@@ -150,10 +227,20 @@ def main():
         thaw(args)
     elif command == 'ls':
         list(args)
+    elif command == 'daemon':
+        daemon(args)
     else:
         print(f'Unknown command "{command}".')
         print_usage()
 
 
+def main():
+    argv = sys.argv[1:]
+    if argv and argv[0] in DAEMON_COMMANDS:
+        if icebox_daemon.RunInDaemon(argv):
+            return
+    run(argv)
+
+
 if __name__ == '__main__':
     main()
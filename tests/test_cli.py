@@ -0,0 +1,74 @@
+import io
+import unittest
+
+from unittest.mock import patch
+from dotenv import load_dotenv
+from pathlib import Path
+load_dotenv(dotenv_path=(Path('.') / '.env_test'))
+
+import icebox
+from .utils import TestUtils
+from app import common
+from app import config
+from app.storage import local_storage
+
+test_utils = TestUtils()
+
+
+class CliTest(unittest.TestCase):
+
+    storage: local_storage.LocalStorage
+
+    @classmethod
+    def setUpClass(cls):
+        # set up local storage
+        cls.storage = common.utils.GetStorage()
+
+    def setUp(self):
+        # set up the directory structure
+        self.test_folder = test_utils.CreateTestFolder('cli_test')
+        self.test_files = [
+            test_utils.CreateTestFile(f"file_{i}", prefix=self.test_folder)
+            for i in range(3)]
+
+    @classmethod
+    def tearDownClass(cls):
+        # destroy local storage
+        cls.storage.Destroy()
+
+    def tearDown(self):
+        # tear down the directory structure
+        test_utils.DeleteFolderAndContents(self.test_folder)
+
+    def _run(self, argv) -> str:
+        out = io.StringIO()
+        with patch('sys.stdout', out):
+            icebox.run(argv)
+        return out.getvalue()
+
+    def test_jobs(self):
+        self._run(["init", str(self.test_folder)])
+
+        # freeze and thaw run with the default and a given number of jobs
+        output = self._run(["freeze", str(self.test_files[0])])
+        self.assertIn(f"-> {self.test_files[0].resolve()}", output)
+        output = self._run(["freeze", "-j", "2", str(self.test_folder)])
+        self.assertNotIn("Traceback", output)
+        frozen = common.utils.FindIcebox(self.test_folder)
+        self.assertEqual(
+            sorted(frozen.frozen_files), [f.name for f in self.test_files])
+        for f in self.test_files:
+            self.assertEqual(f.stat().st_size, 0)
+
+        self._run(["thaw", str(self.test_files[0])])
+        self._run(["thaw", "--jobs", "2", str(self.test_folder)])
+        for f in self.test_files:
+            self.assertGreater(f.stat().st_size, 0)
+
+        # the default number of jobs comes from the configuration
+        with patch.object(icebox.commands, 'IceboxThawCommand') as thaw:
+            self._run(["thaw", str(self.test_folder)])
+            thaw.assert_called_once_with(
+                path=str(self.test_folder), jobs=config.ICEBOX_JOBS)
+            self._run(["thaw", "-j", "4", str(self.test_folder)])
+            thaw.assert_called_with(path=str(self.test_folder), jobs=4)
@@ -1,5 +1,6 @@
 import unittest
 
+from unittest.mock import patch
 from dotenv import load_dotenv
 from pathlib import Path
 load_dotenv(dotenv_path=(Path('.') / '.env_test'))
@@ -87,3 +88,18 @@ class CloneCommandTest(unittest.TestCase):
         with self.assertRaises(IceboxError):
             commands.IceboxCloneCommand(
                 self.icebox.id, str(clone_subfolder)).run()
+
+    def test_clone_probes_icebox(self):
+        """Clone checks for the icebox without listing the storage."""
+        list_remote = CloneCommandTest.storage.ListRemote
+
+        def list_path(path=None):
+            self.assertTrue(path, "listed every icebox")
+            return list_remote(path)
+
+        with patch.object(
+                CloneCommandTest.storage, 'ListRemote', side_effect=list_path):
+            commands.IceboxCloneCommand(
+                self.icebox.id, str(self.clone_path)).run()
+        self.assertTrue(
+            (self.clone_path / Path(config.ICEBOX_FILE_NAME)).is_file())
@@ -0,0 +1,98 @@
+import io
+import json
+import os
+import socket
+import threading
+import time
+import unittest
+
+from unittest.mock import patch
+from dotenv import load_dotenv
+from pathlib import Path
+load_dotenv(dotenv_path=(Path('.') / '.env_test'))
+
+from .utils import TestUtils
+from app import commands
+from app import common
+from app import config
+from app.common import daemon
+
+test_utils = TestUtils()
+
+
+def _run(argv):
+    # stand-in for the command line of the CLI
+    if argv[0] == 'init':
+        commands.IceboxInitCommand(argv[1]).run()
+    elif argv[0] == 'fail':
+        raise SystemExit(2)
+    else:
+        print(" ".join(argv), os.getcwd())
+
+
+class DaemonTest(unittest.TestCase):
+
+    def setUp(self):
+        # independent of whether the caller turned the daemon off
+        patcher = patch.object(config, 'ICEBOX_DAEMON', "auto")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.test_folder = test_utils.CreateTestFolder('daemon_test')
+        self.socket_path = str(Path("/tmp") / f"icebox_{os.getpid()}.sock")
+        self.thread = threading.Thread(
+            target=daemon.Serve, args=(_run, self.socket_path), daemon=True)
+        with patch('sys.stdout', io.StringIO()):
+            self.thread.start()
+            # wait for the daemon to listen
+            while not daemon._IsServing(self.socket_path):
+                time.sleep(0.01)
+
+    def tearDown(self):
+        daemon.StopDaemon(self.socket_path)
+        self.thread.join()
+        test_utils.DeleteFolderAndContents(self.test_folder)
+        common.utils.GetStorage().Destroy()
+
+    def _run_in_daemon(self, argv) -> str:
+        out = io.BytesIO()
+        self.assertTrue(daemon.RunInDaemon(argv, out, self.socket_path))
+        return out.getvalue().decode()
+
+    def test_daemon(self):
+        # commands run in the working directory of the client
+        self.assertEqual(
+            self._run_in_daemon(["echo", "hello"]),
+            f"echo hello {os.getcwd()}\n")
+        output = self._run_in_daemon(
+            ["init", str(self.test_folder.resolve())])
+        self.assertIn("Initializing icebox", output)
+        self.assertIsNotNone(common.utils.FindIcebox(self.test_folder))
+
+        # the daemon outlives failing commands
+        self.assertEqual(self._run_in_daemon(["fail"]), "")
+        self.assertIn("echo", self._run_in_daemon(["echo"]))
+
+        # differently configured clients run commands themselves
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(self.socket_path)
+            sock.sendall(json.dumps({
+                'argv': ["echo"], 'cwd': os.getcwd(),
+                'env': {'ICEBOX_FREEZE_MODE': "content"},
+            }).encode() + b"\n")
+            self.assertEqual(sock.makefile('rb').read(), b"FALLBACK\n")
+        with patch.object(config, 'ICEBOX_DAEMON', "off"):
+            self.assertFalse(
+                daemon.RunInDaemon(["echo"], io.BytesIO(), self.socket_path))
+
+    def test_no_daemon(self):
+        daemon.StopDaemon(self.socket_path)
+        self.thread.join()
+        self.assertFalse(os.path.exists(self.socket_path))
+        self.assertFalse(
+            daemon.RunInDaemon(["echo"], io.BytesIO(), self.socket_path))
+
+        # stale sockets are ignored
+        Path(self.socket_path).touch()
+        self.assertFalse(
+            daemon.RunInDaemon(["echo"], io.BytesIO(), self.socket_path))
+        os.unlink(self.socket_path)
@@ -8,6 +8,7 @@ load_dotenv(dotenv_path=(Path('.') / '.env_test'))
 from .utils import TestUtils
 from app import commands
 from app import common
+from app import config
 from app.elements.icebox import IceboxError
 from app.storage import local_storage
 from app.storage.icebox_storage import IceboxStorageError
@@ -100,6 +101,15 @@ class FreezeCommandTest(unittest.TestCase):
             else:
                 self.assertEqual(f.stat().st_size, s)
 
+        # the icebox should record the metadata of the frozen file
+        icebox = common.utils.FindIcebox(self.test_folder)
+        frozen_file = icebox.frozen_files["subfolder/thisisanotherfile"]
+        self.assertEqual(
+            frozen_file.size, file_size[self.test_subfolder_file])
+        self.assertIsNotNone(frozen_file.digest)
+        self.assertIsNotNone(frozen_file.generation)
+        self.assertGreater(frozen_file.frozen_at, 0)
+
         # freezing a frozen file should not have any effect
         commands.IceboxFreezeCommand(str(self.test_subfolder_file)).run()
         self.assertTrue(self.test_subfolder_file.exists())
@@ -113,6 +123,135 @@ class FreezeCommandTest(unittest.TestCase):
         self.assertTrue(self.test_subfolder_file.exists())
         self.assertEqual(self.test_subfolder_file.stat().st_size, 0)
 
+    def test_freeze_many_files(self):
+        # freeze should not limit the number of files frozen in one run
+        # * every file should be uploaded and replaced irrespective of the
+        # number of parallel jobs
+        many_files = [
+            test_utils.CreateTestFile(f'file_{i}', prefix=self.test_subfolder)
+            for i in range(120)]
+        commands.IceboxInitCommand(str(self.test_folder)).run()
+        commands.IceboxFreezeCommand(str(self.test_subfolder), jobs=4).run()
+        icebox = common.utils.FindIcebox(self.test_folder)
+        for f in many_files:
+            self.assertEqual(f.stat().st_size, 0)
+            self.assertIn(f"subfolder/{f.name}", icebox.frozen_files)
+
+        # freeze should require at least one job
+        with self.assertRaises(IceboxError):
+            commands.IceboxFreezeCommand(
+                str(self.test_folder_file), jobs=0).run()
+
+    def test_freeze_read_error(self):
+        # files that cannot be read should not stop the others from freezing
+        # * files replaced before the run fails should still be recorded
+        files = [
+            test_utils.CreateTestFile(f'file_{i}', prefix=self.test_subfolder)
+            for i in range(20)]
+        missing = str(files[7].resolve())
+        hash_file = common.utils.HashFile
+
+        def hash_or_fail(filepath: str) -> str:
+            if filepath == missing:
+                raise FileNotFoundError(filepath)
+            return hash_file(filepath)
+
+        commands.IceboxInitCommand(str(self.test_folder)).run()
+        with patch.object(common.utils, 'HashFile', side_effect=hash_or_fail):
+            commands.IceboxFreezeCommand(
+                str(self.test_subfolder), jobs=4).run()
+        icebox = common.utils.FindIcebox(self.test_folder)
+        for f in files:
+            frozen = f"subfolder/{f.name}" in icebox.frozen_files
+            self.assertEqual(frozen, f != files[7])
+            self.assertEqual(f.stat().st_size == 0, frozen)
+
+        replace_file = common.utils.ReplaceFile
+        replaced = []
+
+        def replace_or_fail(filepath: str):
+            if replaced:
+                raise RuntimeError("interrupted")
+            replace_file(filepath)
+            replaced.append(filepath)
+
+        with patch.object(
+                common.utils, 'ReplaceFile', side_effect=replace_or_fail):
+            with self.assertRaises(RuntimeError):
+                commands.IceboxFreezeCommand(str(self.test_folder)).run()
+        icebox = common.utils.FindIcebox(self.test_folder)
+        self.assertIn(common.utils.GetRelativeRemotePath(
+            replaced[0], icebox.path), icebox.frozen_files)
+
+    @patch.object(config, 'ICEBOX_FREEZE_MODE', "content")
+    def test_freeze_content_addressed(self):
+        # freeze in content mode should upload identical files only once
+        # * the digest of every frozen file should be recorded in the icebox
+        # * thaw should restore the files through their digest
+        copy = test_utils.CreateTestFile(
+            'thisisacopy', prefix=self.test_subfolder)
+        size = copy.stat().st_size
+        commands.IceboxInitCommand(str(self.test_folder)).run()
+        commands.IceboxFreezeCommand(str(self.test_folder)).run()
+        icebox = common.utils.FindIcebox(self.test_folder)
+        self.assertEqual(len(icebox.frozen_files), 3)
+        digests = {f.digest for f in icebox.frozen_files.values()}
+        self.assertEqual(len(digests), 1)
+        self.assertTrue(FreezeCommandTest.storage.Exists(
+            common.utils.GetBlobPath(digests.pop())))
+        self.assertFalse(FreezeCommandTest.storage.Exists(
+            f"{icebox.id}/subfolder/thisisacopy"))
+
+        commands.IceboxThawCommand(str(self.test_subfolder)).run()
+        self.assertEqual(copy.stat().st_size, size)
+        self.assertEqual(self.test_subfolder_file.stat().st_size, size)
+        icebox = common.utils.FindIcebox(self.test_folder)
+        self.assertEqual(list(icebox.frozen_files.keys()), ["thisisafile"])
+
+    @patch.object(config, 'ICEBOX_FREEZE_MODE', "chunked")
+    @patch.object(config, 'ICEBOX_CHUNK_MIN_SIZE', 64)
+    @patch.object(config, 'ICEBOX_CHUNK_AVG_SIZE', 128)
+    @patch.object(config, 'ICEBOX_CHUNK_MAX_SIZE', 256)
+    def test_freeze_chunked(self):
+        # freeze in chunked mode should only upload chunks that changed
+        # * thaw should reassemble the original contents from the chunks
+        log_file = self.test_subfolder / "log"
+        with log_file.open(mode='w') as f:
+            f.writelines(f"line {i} of the log\n" for i in range(200))
+        commands.IceboxInitCommand(str(self.test_folder)).run()
+        commands.IceboxFreezeCommand(str(log_file)).run()
+        chunk_folder = (
+            FreezeCommandTest.storage.storage_path
+            / config.ICEBOX_STORE_PREFIX / "chunks")
+        chunk_count = len(list(chunk_folder.iterdir()))
+        self.assertGreater(chunk_count, 1)
+
+        # re-freeze a locally overwritten file with appended data
+        commands.IceboxThawCommand(str(log_file)).run()
+        with log_file.open(mode='a') as f:
+            f.write("one more line\n")
+        contents = log_file.read_bytes()
+        commands.IceboxFreezeCommand(str(log_file)).run()
+        self.assertEqual(log_file.stat().st_size, 0)
+        self.assertLessEqual(
+            len(list(chunk_folder.iterdir())), chunk_count + 2)
+
+        # a corrupt chunk leaves the frozen file untouched
+        digest, _ = common.utils.FindIcebox(
+            self.test_folder).frozen_files["subfolder/log"].chunks[-1]
+        chunk = chunk_folder / digest
+        chunk_data = chunk.read_bytes()
+        chunk.write_bytes(b"corrupt")
+        commands.IceboxThawCommand(str(log_file)).run()
+        self.assertEqual(log_file.stat().st_size, 0)
+        self.assertEqual(
+            [f.name for f in log_file.parent.iterdir()
+             if f.name.startswith(log_file.name)], [log_file.name])
+        chunk.write_bytes(chunk_data)
+
+        commands.IceboxThawCommand(str(log_file)).run()
+        self.assertEqual(log_file.read_bytes(), contents)
+
     @patch(
         'app.commands.IceboxFreezeCommand._IceboxFreezeCommand__upload_file')
     def test_freeze_upload_error(self, mocked_function):
@@ -1,6 +1,10 @@
+import asyncio
 import json
+import random
 import unittest
 
+from unittest import mock
+
 from dotenv import load_dotenv
 from pathlib import Path
 load_dotenv(dotenv_path=(Path('.') / '.env_test'))
@@ -9,7 +13,14 @@ from .utils import TestUtils
 from app import config
 from app import commands
 from app import common
+from app.common import chunking
+from app.common import journal
+from app.common import manifest_format
+from app.elements.icebox import FrozenFile
+from app.elements.icebox import Icebox
 from app.elements.icebox import IceboxError
+from app.elements.path_index import PathIndex
+from app.storage import icebox_storage
 from app.storage import local_storage
 
 test_utils = TestUtils()
@@ -40,6 +51,17 @@ class IceboxUtilsTest(unittest.TestCase):
         # delete the directory structure
         test_utils.DeleteFolderAndContents(self.test_folder)
 
+    def test_get_storage(self):
+        # storages are built once and shared
+        self.assertIs(common.utils.GetStorage(), IceboxUtilsTest.storage)
+        with mock.patch.object(
+                config, 'LOCAL_STORAGE_PATH',
+                f"{config.LOCAL_STORAGE_PATH}_other"):
+            other = common.utils.GetStorage()
+            self.assertIsNot(other, IceboxUtilsTest.storage)
+            self.assertIs(common.utils.GetStorage(), other)
+            other.Destroy()
+
     def test_find_icebox(self):
         # no icebox should be found on uninitialized folder
         self.assertIsNone(common.utils.FindIcebox(self.test_folder))
@@ -56,12 +78,44 @@ class IceboxUtilsTest(unittest.TestCase):
         self.assertEqual(icebox.path, str(self.test_folder))
         self.assertEqual(icebox.id, icebox_parent.id)
 
+    def test_find_icebox_cached(self):
+        commands.IceboxInitCommand(str(self.test_folder)).run()
+        subfolder = self.test_subfolder.resolve()
+        icebox = common.utils.FindIcebox(subfolder)
+
+        # repeated lookups should neither walk up nor parse again
+        with mock.patch.object(
+                common.utils, 'ReadIceboxFile',
+                wraps=common.utils.ReadIceboxFile) as read, \
+                mock.patch.object(
+                    common.utils, 'ResolveIcebox',
+                    wraps=common.utils.ResolveIcebox) as resolve:
+            cached = common.utils.FindIcebox(subfolder)
+            read.assert_not_called()
+            self.assertEqual(resolve.call_count, 1)
+        self.assertEqual(cached, icebox)
+
+        # every lookup gets its own copy
+        cached.add_frozen_file("some_file", FrozenFile(size=1))
+        self.assertNotIn(
+            "some_file",
+            common.utils.FindIcebox(self.test_folder).frozen_files)
+
+        # changed icebox files are parsed again
+        common.utils.Finalize(cached)
+        self.assertIn(
+            "some_file",
+            common.utils.FindIcebox(self.test_folder).frozen_files)
+
+        # removed iceboxes are not found anymore
+        common.utils.ResolveIcebox(self.test_folder).unlink()
+        self.assertIsNone(common.utils.FindIcebox(subfolder))
+
     def test_finalize(self):
         # initialize and get icebox
         commands.IceboxInitCommand(str(self.test_folder)).run()
         icebox = common.utils.FindIcebox(str(self.test_folder))
         self.assertIsNotNone(icebox)
-        temp_file = self.test_folder / "temp_file"
         remote_path = (f"{icebox.id}{config.REMOTE_PATH_DELIMITER}"
                        f"{config.ICEBOX_FILE_NAME}")
 
@@ -71,13 +125,53 @@ class IceboxUtilsTest(unittest.TestCase):
 
         # any changes made locally should reflect in remote after finalize
         test_string = "something random"
-        icebox.frozen_files.append(test_string)
+        icebox.add_frozen_file(test_string, FrozenFile(size=1))
+        common.utils.Finalize(icebox)
+        remote_icebox = common.utils.ReadRemoteIcebox(
+            icebox.id, storage=IceboxUtilsTest.storage)
+        self.assertEqual(remote_icebox.id, icebox.id)
+        self.assertIn(test_string, remote_icebox.frozen_files)
+
+        # changes are journaled instead of rewriting the snapshot
+        snapshot = journal.Load(
+            IceboxUtilsTest.storage.DownloadData(remote_path))
+        self.assertNotIn(test_string, snapshot.frozen_files)
+        self.assertTrue(IceboxUtilsTest.storage.Exists(
+            journal.GetSegmentPath(icebox.id, 1)))
+        local_icebox = common.utils.FindIcebox(self.test_folder)
+        self.assertEqual(local_icebox.journal_seq, 1)
+        self.assertIn(test_string, local_icebox.frozen_files)
+
+    def test_compact_journal(self):
+        commands.IceboxInitCommand(str(self.test_folder)).run()
+        icebox = common.utils.FindIcebox(self.test_folder)
+        segments = config.ICEBOX_JOURNAL_COMPACT_SEGMENTS
+        for i in range(segments + 1):
+            icebox.add_frozen_file(f"file_{i}", FrozenFile(size=i))
+            if i % 3 == 0:
+                icebox.remove_frozen_file(f"file_{i}")
+            common.utils.Finalize(icebox)
+
+        # the journal was folded into a new snapshot
+        self.assertEqual(icebox.journal_seq, segments + 1)
+        self.assertEqual(
+            common.utils.ListJournalSegments(
+                icebox.id, storage=IceboxUtilsTest.storage), [])
+        expected = {f"file_{i}" for i in range(segments + 1) if i % 3}
+        for loaded in (
+                common.utils.FindIcebox(self.test_folder),
+                common.utils.ReadRemoteIcebox(
+                    icebox.id, storage=IceboxUtilsTest.storage)):
+            self.assertEqual(set(loaded.frozen_files), expected)
+            self.assertEqual(loaded.journal_seq, segments + 1)
+
+        # other copies of the icebox pick up the new snapshot
+        icebox.add_frozen_file("file_new", FrozenFile(size=1))
         common.utils.Finalize(icebox)
-        IceboxUtilsTest.storage.Download(remote_path, str(temp_file))
-        with open(str(temp_file), 'r') as f:
-            icebox_remote_data = json.load(f)
-        self.assertEqual(icebox_remote_data['id'], icebox.id)
-        self.assertIn(test_string, icebox_remote_data['frozen_files'])
+        remote_icebox = common.utils.ReadRemoteIcebox(
+            icebox.id, storage=IceboxUtilsTest.storage)
+        self.assertIn("file_new", remote_icebox.frozen_files)
+        self.assertEqual(remote_icebox.journal_seq, segments + 2)
 
     def test_synchronize(self):
         # initialize and get icebox
@@ -105,9 +199,481 @@ class IceboxUtilsTest(unittest.TestCase):
         # synchronize
         test_string = "something random"
         self.assertNotIn(test_string, data['frozen_files'])
-        data['frozen_files'].append(test_string)
+        data['frozen_files'][test_string] = {'size': 1}
         with open(temp_file, 'w') as f:
             json.dump(data, f)
         IceboxUtilsTest.storage.Upload(str(temp_file), remote_path)
         icebox = common.utils.Synchronize(icebox)
         self.assertIn(test_string, icebox.frozen_files)
+        self.assertEqual(icebox.frozen_files[test_string].size, 1)
+
+    def test_synchronize_unchanged(self):
+        commands.IceboxInitCommand(str(self.test_folder)).run()
+        icebox = common.utils.FindIcebox(self.test_folder)
+        icebox_path = common.utils.ResolveIcebox(self.test_folder)
+        remote_path = (f"{icebox.id}{config.REMOTE_PATH_DELIMITER}"
+                       f"{config.ICEBOX_FILE_NAME}")
+
+        # an unchanged remote should not be downloaded again
+        with mock.patch.object(
+                local_storage.LocalStorage, 'DownloadData') as download:
+            self.assertIs(common.utils.Synchronize(icebox), icebox)
+            download.assert_not_called()
+        self.assertIsNotNone(common.utils.ReadSyncedGeneration(icebox_path))
+
+        # remote changes should still be picked up
+        data = icebox.dict()
+        data['frozen_files']['remote_file'] = {'size': 1}
+        IceboxUtilsTest.storage.UploadData(
+            json.dumps(data).encode(), remote_path)
+        synced = common.utils.Synchronize(icebox)
+        self.assertIsNot(synced, icebox)
+        self.assertIn('remote_file', synced.frozen_files)
+        self.assertIn('remote_file', common.utils.FindIcebox(
+            self.test_folder).frozen_files)
+
+        # local changes to the icebox file force a download
+        icebox_path.write_text(json.dumps(icebox.dict()))
+        self.assertIsNone(common.utils.ReadSyncedGeneration(icebox_path))
+        synced = common.utils.Synchronize(icebox)
+        self.assertIn('remote_file', synced.frozen_files)
+
+        # journaled remote changes are appended to the local icebox file
+        seq = synced.journal_seq + 1
+        IceboxUtilsTest.storage.UploadData(
+            journal.EncodeSegment(
+                seq, [('journaled_file', FrozenFile(size=2))]),
+            journal.GetSegmentPath(icebox.id, seq))
+        synced = common.utils.Synchronize(synced)
+        self.assertEqual(synced.journal_seq, seq)
+        self.assertIn('journaled_file', synced.frozen_files)
+        self.assertIn('journaled_file', common.utils.FindIcebox(
+            self.test_folder).frozen_files)
+        self.assertIsNotNone(common.utils.ReadSyncedGeneration(icebox_path))
+
+    def test_journal_conflict(self):
+        commands.IceboxInitCommand(str(self.test_folder)).run()
+        icebox = common.utils.FindIcebox(self.test_folder)
+        icebox_path = common.utils.ResolveIcebox(self.test_folder)
+
+        # another clone journals the next segment first
+        seq = icebox.journal_seq + 1
+        IceboxUtilsTest.storage.UploadData(
+            journal.EncodeSegment(seq, [
+                ('other_file', FrozenFile(size=1)),
+                ('shared_file', FrozenFile(size=1))]),
+            journal.GetSegmentPath(icebox.id, seq))
+
+        # our changes are journaled on top of it instead of replacing it
+        icebox.add_frozen_file('own_file', FrozenFile(size=2))
+        icebox.add_frozen_file('shared_file', FrozenFile(size=2))
+        common.utils.Finalize(icebox)
+        self.assertEqual(icebox.journal_seq, seq + 1)
+        for frozen in [
+                icebox,
+                common.utils.FindIcebox(self.test_folder),
+                common.utils.ReadRemoteIcebox(
+                    icebox.id, storage=IceboxUtilsTest.storage)]:
+            self.assertIn('other_file', frozen.frozen_files)
+            self.assertIn('own_file', frozen.frozen_files)
+            self.assertEqual(frozen.frozen_files['shared_file'].size, 2)
+        self.assertIsNotNone(common.utils.ReadSyncedGeneration(icebox_path))
+
+        # existing segments are never overwritten
+        with self.assertRaises(icebox_storage.IceboxStorageConflictError):
+            IceboxUtilsTest.storage.UploadData(
+                b"", journal.GetSegmentPath(icebox.id, seq),
+                if_generation_match=0)
+
+    def test_snapshot_conflict(self):
+        commands.IceboxInitCommand(str(self.test_folder)).run()
+        icebox_path = common.utils.ResolveIcebox(self.test_folder)
+
+        def compact_elsewhere(name: str):
+            # another clone journals a change and compacts the journal,
+            # which leaves the local icebox file behind
+            stale = icebox_path.read_bytes()
+            state = common.utils.ReadSyncState(icebox_path)
+            other = common.utils.FindIcebox(self.test_folder)
+            other.add_frozen_file(name, FrozenFile(size=1))
+            common.utils.Finalize(other)
+            common.utils.WriteSnapshot(other)
+            icebox_path.write_bytes(stale)
+            common.utils.WriteSyncState(
+                icebox_path, state['generation'], state['snapshot_size'],
+                state['snapshot_seq'])
+
+        def assert_frozen(*names: str):
+            for frozen in [
+                    common.utils.FindIcebox(self.test_folder),
+                    common.utils.ReadRemoteIcebox(
+                        icebox.id, storage=IceboxUtilsTest.storage)]:
+                for name in names:
+                    self.assertIn(name, frozen.frozen_files)
+
+        # snapshots only replace the one they were synchronized with
+        icebox = common.utils.FindIcebox(self.test_folder)
+        compact_elsewhere("other_file")
+        icebox.add_frozen_file("own_file", FrozenFile(size=2))
+        icebox = common.utils.WriteSnapshot(icebox)
+        assert_frozen("other_file", "own_file")
+
+        # segments are not hidden by a snapshot that folded their sequence
+        # number, even though it was deleted
+        icebox = common.utils.FindIcebox(self.test_folder)
+        compact_elsewhere("another_file")
+        icebox.add_frozen_file("journaled_file", FrozenFile(size=3))
+        common.utils.Finalize(icebox)
+        assert_frozen("another_file", "journaled_file")
+
+    def test_sharded_manifest(self):
+        commands.IceboxInitCommand(str(self.test_folder)).run()
+        icebox = common.utils.FindIcebox(self.test_folder)
+        for relpath in ["big/a", "big/b", "big/sub/c", "small/x", "top"]:
+            icebox.add_frozen_file(relpath, FrozenFile(size=1))
+        common.utils.Finalize(icebox)
+        with mock.patch.object(config, 'ICEBOX_SHARD_SIZE', 2):
+            common.utils.WriteSnapshot(icebox)
+        shard_seq = icebox.shards["big"]
+
+        # the root icebox file only lists the small directories
+        root = common.utils.ReadIcebox(self.test_folder)
+        self.assertEqual(set(root.shards), {"big"})
+        self.assertEqual(set(root.frozen_files), {"small/x", "top"})
+
+        # shards are only loaded for the paths that need them
+        loaded = common.utils.FindIcebox(self.test_folder)
+        self.assertNotIn("big/a", loaded.frozen_files)
+        self.assertEqual(loaded.shards_to_load("small"), [])
+        self.assertEqual(loaded.shards_to_load("big/sub"), ["big"])
+        self.assertEqual(loaded.shards_to_load(".", recursive=False), [])
+        self.assertTrue(common.utils.ExistsInIcebox(
+            self.test_folder / "big" / "sub", loaded))
+        self.assertIn("big/sub/c", loaded.frozen_files)
+
+        # new shards are split off from files in memory and count as loaded
+        self.assertTrue(icebox.is_shard_loaded("big"))
+        icebox.remove_frozen_file("big/a")
+        self.assertEqual(icebox.deferred_shards(), [])
+        self.assertNotIn("big/a", icebox.frozen_files)
+
+        # journaled changes wait for their shard to be loaded
+        common.utils.Finalize(icebox)
+        loaded = common.utils.FindIcebox(self.test_folder)
+        self.assertEqual(loaded.deferred_shards(), ["big"])
+        common.utils.LoadShards(loaded, loaded.shards_to_load("."))
+        self.assertEqual(
+            set(loaded.frozen_files), {"big/b", "big/sub/c", "small/x", "top"})
+
+        # compaction folds the changes into a new version of the shard
+        loaded = common.utils.FindIcebox(self.test_folder)
+        common.utils.WriteSnapshot(loaded)
+        self.assertGreater(loaded.shards["big"], shard_seq)
+        self.assertFalse(IceboxUtilsTest.storage.Exists(
+            journal.GetShardPath(icebox.id, "big", shard_seq)))
+        remote_icebox = common.utils.ReadRemoteIcebox(
+            icebox.id, storage=IceboxUtilsTest.storage)
+        common.utils.LoadShards(
+            remote_icebox, remote_icebox.shards_to_load("."),
+            storage=IceboxUtilsTest.storage)
+        self.assertEqual(
+            set(remote_icebox.frozen_files),
+            {"big/b", "big/sub/c", "small/x", "top"})
+
+    def test_registry(self):
+        storage = IceboxUtilsTest.storage
+        commands.IceboxInitCommand(str(self.test_folder)).run()
+        icebox = common.utils.FindIcebox(self.test_folder)
+        for relpath, size in [("big/a", 1), ("big/b", 2), ("big/c", 3),
+                              ("top", 4)]:
+            icebox.add_frozen_file(relpath, FrozenFile(size=size))
+        with mock.patch.object(config, 'ICEBOX_SHARD_SIZE', 2):
+            common.utils.Finalize(icebox)
+            common.utils.WriteSnapshot(icebox)
+        common.utils.RegisterIcebox(icebox)
+        registry, _ = common.utils.ReadRegistry()
+        entry = registry['iceboxes'][icebox.id]
+        self.assertEqual((entry['files'], entry['size']), (4, 10))
+
+        # the local copy of the registry outlives the cached listings
+        common.utils.InvalidateListings()
+        with mock.patch.object(storage, 'Exists') as exists, \
+                mock.patch.object(
+                    storage, 'DownloadDataIfModified',
+                    wraps=storage.DownloadDataIfModified) as download:
+            self.assertEqual(common.utils.ReadRegistry()[0], registry)
+            exists.assert_not_called()
+            self.assertIsNotNone(download.call_args.args[1])
+        self.assertEqual(entry['shards']['big']['seq'], icebox.shards["big"])
+
+        # shards that did not change are not loaded to be counted again
+        loaded = common.utils.FindIcebox(self.test_folder)
+        loaded.add_frozen_file("small", FrozenFile(size=5))
+        common.utils.Finalize(loaded)
+        self.assertFalse(loaded.is_shard_loaded("big"))
+        registry, _ = common.utils.ReadRegistry()
+        entry = registry['iceboxes'][icebox.id]
+        self.assertEqual((entry['files'], entry['size']), (5, 15))
+
+        # changes to shards that are not loaded are counted
+        loaded = common.utils.FindIcebox(self.test_folder)
+        common.utils.LoadShards(loaded, ["big"])
+        loaded.remove_frozen_file("big/a")
+        common.utils.Finalize(loaded)
+        loaded = common.utils.FindIcebox(self.test_folder)
+        self.assertEqual(loaded.deferred_shards(), ["big"])
+        summary = common.utils.SummarizeIcebox(
+            loaded, previous=entry, storage=storage)
+        self.assertEqual((summary['files'], summary['size']), (4, 14))
+
+        # shards are counted along with their journaled changes, so they are
+        # not loaded again for changes elsewhere
+        loaded = common.utils.FindIcebox(self.test_folder)
+        loaded.add_frozen_file("other", FrozenFile(size=6))
+        common.utils.Finalize(loaded)
+        self.assertFalse(loaded.is_shard_loaded("big"))
+        registry, _ = common.utils.ReadRegistry()
+        entry = registry['iceboxes'][icebox.id]
+        self.assertEqual((entry['files'], entry['size']), (5, 20))
+
+        # stale conditional uploads are refused
+        generation = storage.UploadData(
+            b"{}", "conditional", if_generation_match=0)
+        storage.UploadData(
+            b"{}", "conditional", if_generation_match=generation)
+        with self.assertRaises(icebox_storage.IceboxStorageConflictError):
+            storage.UploadData(
+                b"{}", "conditional", if_generation_match=generation)
+
+        # concurrent changes to the registry are not lost
+        def update(registry: dict):
+            if "other" not in registry['iceboxes']:
+                common.utils.UpdateRegistry(
+                    lambda other: other['iceboxes'].update(other={}))
+            registry['iceboxes']["mine"] = {}
+
+        with mock.patch.object(common.utils.time, 'sleep') as sleep:
+            common.utils.UpdateRegistry(update)
+            sleep.assert_called_once()
+        registry, _ = common.utils.ReadRegistry()
+        self.assertTrue({"other", "mine", icebox.id} <=
+                        set(registry['iceboxes']))
+
+        # a deleted registry is not read from the cache
+        storage.Delete(common.utils.GetRegistryPath())
+        self.assertEqual(common.utils.ReadRegistry(), (None, None))
+        self.assertFalse(common.utils.GetRegistryCachePath(storage).exists())
+
+    def test_manifest_format(self):
+        digest = "ab" * 32
+        meta = {'id': "some_icebox", 'journal_seq': 3, 'shards': {"big": 2}}
+        frozen_files = {
+            "deep/path/to/file": FrozenFile(
+                size=10, mtime=1.5, digest=digest, frozen_at=2.25,
+                generation=7, mode="content"),
+            "deep/path/to/file_2": FrozenFile(
+                size=20, chunks=[(digest, 15), ("cd" * 32, 5)],
+                mode="chunked"),
+            "deep/päth": FrozenFile(chunks=[]),
+            "top": FrozenFile(),
+        }
+        for compression in ["none", "zlib"]:
+            data = manifest_format.Encode(
+                meta, frozen_files, compression=compression)
+            self.assertTrue(manifest_format.IsBinary(data))
+            decoded_meta, decoded_files, size = manifest_format.Decode(
+                data + b"journal")
+            self.assertEqual(size, len(data))
+            self.assertEqual(decoded_meta, meta)
+            self.assertEqual(decoded_files, frozen_files)
+
+        # manifests are smaller than JSON for deep trees
+        deep_files = {
+            f"a/very/deep/folder/hierarchy/file_{i}": FrozenFile(
+                size=i, digest=digest)
+            for i in range(100)}
+        self.assertLess(
+            len(manifest_format.Encode({}, deep_files)),
+            len(json.dumps({
+                path: f.dict() for path, f in deep_files.items()})) / 2)
+
+        # unsupported versions and corrupt data are rejected
+        data = bytearray(manifest_format.Encode(meta, frozen_files))
+        with self.assertRaises(ValueError):
+            manifest_format.Decode(data[:-1])
+        data[8] = manifest_format.VERSION + 1
+        with self.assertRaises(ValueError):
+            manifest_format.Decode(data)
+        with self.assertRaises(ValueError):
+            manifest_format.Encode(
+                {}, {"a": FrozenFile(digest="not a digest")})
+
+        # snapshots fall back to JSON, which stays readable
+        icebox = Icebox(frozen_files=dict(frozen_files), **meta)
+        icebox.frozen_files["bad"] = FrozenFile(digest="xyz")
+        snapshot = journal.EncodeSnapshot(icebox)
+        self.assertFalse(manifest_format.IsBinary(snapshot))
+        self.assertEqual(journal.Load(snapshot), icebox)
+        icebox.remove_frozen_file("bad")
+        snapshot = journal.EncodeSnapshot(icebox)
+        self.assertTrue(manifest_format.IsBinary(snapshot))
+        self.assertEqual(journal.Load(snapshot), icebox)
+
+    def test_icebox_parse(self):
+        # values are validated when read, not when built in memory
+        icebox = Icebox.parse({
+            'id': "some_icebox",
+            'frozen_files': {"a": {'size': "10", 'frozen_at': 1}},
+        })
+        self.assertEqual(icebox.frozen_files["a"].size, 10)
+        self.assertIsInstance(icebox.frozen_files["a"], FrozenFile)
+        with self.assertRaises(ValueError):
+            Icebox.parse({'frozen_files': {}})
+        with self.assertRaises(AttributeError):
+            icebox.frozen_files["a"].unknown = 1
+
+    def test_upgrade_icebox(self):
+        # icebox files that list frozen files without metadata should be
+        # upgraded on read
+        commands.IceboxInitCommand(str(self.test_folder)).run()
+        icebox = common.utils.FindIcebox(self.test_folder)
+        with open(self.test_folder / config.ICEBOX_FILE_NAME, 'w') as f:
+            json.dump({
+                'id': icebox.id,
+                'frozen_files': ['file', 'copy', 'log'],
+                'digests': {'copy': 'abc'},
+                'chunks': {'log': [['def', 10]]},
+            }, f)
+        icebox = common.utils.FindIcebox(self.test_folder)
+        self.assertEqual(
+            sorted(icebox.frozen_files.keys()), ['copy', 'file', 'log'])
+        self.assertEqual(icebox.frozen_files['file'].mode, "path")
+        self.assertEqual(icebox.frozen_files['copy'].mode, "content")
+        self.assertEqual(icebox.frozen_files['copy'].digest, "abc")
+        self.assertEqual(icebox.frozen_files['log'].mode, "chunked")
+        self.assertEqual(icebox.frozen_files['log'].chunks, [("def", 10)])
+
+        # the sizes of upgraded files are not known, and neither passed on to
+        # downloads as such nor when stored as 0
+        self.assertIsNone(icebox.frozen_files['file'].size)
+        with mock.patch.object(
+                local_storage.LocalStorage, 'Download') as download:
+            common.utils.DownloadFile(
+                icebox, 'file', storage=IceboxUtilsTest.storage)
+            self.assertIsNone(download.call_args.kwargs['size'])
+            icebox.frozen_files['file'] = FrozenFile(size=0)
+            common.utils.DownloadFile(
+                icebox, 'file', storage=IceboxUtilsTest.storage)
+            self.assertIsNone(download.call_args.kwargs['size'])
+
+    def test_async_transfers(self):
+        # initialize and get icebox
+        commands.IceboxInitCommand(str(self.test_folder)).run()
+        icebox = common.utils.FindIcebox(self.test_folder)
+        files = [
+            test_utils.CreateTestFile(f'file_{i}', prefix=self.test_subfolder)
+            for i in range(10)]
+
+        # concurrent uploads should all reach the remote
+        async def upload_all():
+            await asyncio.gather(*[
+                common.utils.UploadFileAsync(
+                    icebox, str(f), storage=IceboxUtilsTest.storage)
+                for f in files])
+        asyncio.run(upload_all())
+
+        async def list_remote(path):
+            return [f.name async for f in
+                    IceboxUtilsTest.storage.ListRemoteAsync(path)]
+        remote_files = asyncio.run(list_remote(f"{icebox.id}/subfolder"))
+        self.assertEqual(
+            sorted(remote_files), sorted([f.name for f in files]))
+
+        # concurrent downloads should restore the original contents
+        for f in files:
+            f.unlink()
+
+        async def download_all():
+            await asyncio.gather(*[
+                common.utils.DownloadFileAsync(
+                    icebox, f"subfolder/{f.name}",
+                    storage=IceboxUtilsTest.storage)
+                for f in files])
+        asyncio.run(download_all())
+        for f in files:
+            self.assertGreater(f.stat().st_size, 0)
+
+    def test_split_chunks(self):
+        data = random.Random(0).randbytes(4 * 1024 * 1024)
+        sizes = (16 * 1024, 64 * 1024, 256 * 1024)
+        chunks = list(chunking.SplitChunks(data, *sizes))
+        # chunks should cover the data and respect the size limits
+        self.assertEqual(sum(length for _, length in chunks), len(data))
+        for offset, length in chunks[:-1]:
+            self.assertGreaterEqual(length, sizes[0])
+            self.assertLessEqual(length, sizes[2])
+
+        # an insertion should only affect the chunks around it
+        edited = data[:100000] + b"inserted" + data[100000:]
+        original = {data[o:o + n] for o, n in chunks}
+        edited_chunks = list(chunking.SplitChunks(edited, *sizes))
+        reused = [o for o, n in edited_chunks if edited[o:o + n] in original]
+        self.assertGreaterEqual(len(reused), len(edited_chunks) - 2)
+
+        # boundaries do not depend on any particular byte, e.g. newlines
+        binary = data.replace(b"\n", b"\0")
+        chunks = list(chunking.SplitChunks(binary, *sizes))
+        self.assertLess(
+            sum(length == sizes[2] for _, length in chunks), len(chunks) // 4)
+        original = {binary[o:o + n] for o, n in chunks}
+        edited = binary[:1000] + b"x" + binary[1000:]
+        edited_chunks = list(chunking.SplitChunks(edited, *sizes))
+        reused = [o for o, n in edited_chunks if edited[o:o + n] in original]
+        self.assertGreaterEqual(len(reused), len(edited_chunks) - 2)
+
+    def test_walk_files(self):
+        expected = set()
+        for i in range(300):
+            f = test_utils.CreateTestFile(
+                f"file_{i}", prefix=self.test_subfolder)
+            expected.add(str(f))
+        deep = test_utils.CreateTestFolder(
+            "a/b/c", prefix=self.test_folder)
+        expected.add(str(test_utils.CreateTestFile("deep", prefix=deep)))
+        (self.test_folder / config.ICEBOX_FILE_NAME).write_text("{}")
+        # links to directories are not followed
+        (self.test_folder / "link").symlink_to(self.test_subfolder)
+
+        walked = list(common.utils.WalkFiles(self.test_folder, jobs=3))
+        self.assertEqual({f for f, _ in walked}, expected)
+        self.assertEqual(len(walked), len(expected))
+        for f, stat in walked:
+            self.assertEqual(stat.st_size, Path(f).stat().st_size)
+
+        # walks can be abandoned midway
+        walk = common.utils.WalkFiles(self.test_folder)
+        next(walk)
+        walk.close()
+
+    def test_path_index(self):
+        index = PathIndex(["a/b/c", "a/b/d", "a/e", "a.txt", "ab/f", "g"])
+        # subtree queries should not match siblings sharing a prefix
+        self.assertEqual(index.under("a"), ["a/b/c", "a/b/d", "a/e"])
+        self.assertEqual(index.under("a/e"), ["a/e"])
+        self.assertEqual(len(index.under(".")), 6)
+        self.assertTrue(index.exists_under("a/b"))
+        self.assertFalse(index.exists_under("a/b/c/d"))
+        self.assertFalse(index.exists_under("b"))
+        self.assertEqual(
+            list(index.children(".")),
+            [("a.txt", False), ("a", True), ("ab", True), ("g", False)])
+        self.assertEqual(
+            list(index.children("a")), [("b", True), ("e", False)])
+
+        # the index should reflect additions and removals
+        index.add("a/b/x")
+        index.remove("a/b/c")
+        index.remove("a/b/d")
+        self.assertEqual(index.under("a/b"), ["a/b/x"])
+        index.remove("a/b/x")
+        self.assertEqual(list(index.children("a")), [("e", False)])
@@ -1,6 +1,8 @@
+import json
 import shutil
 import unittest
 
+from unittest.mock import patch
 from dotenv import load_dotenv
 from pathlib import Path
 load_dotenv(dotenv_path=(Path('.') / '.env_test'))
@@ -8,9 +10,11 @@ load_dotenv(dotenv_path=(Path('.') / '.env_test'))
 from .utils import TestUtils
 from app import common
 from app import commands
+from app import config
 from app.commands.list import ListResult
 from app.elements.icebox import IceboxError
 from app.storage import local_storage
+from app.storage.icebox_storage import IceboxStorageError
 
 test_utils = TestUtils()
 
@@ -107,6 +111,118 @@ class ListCommandTest(unittest.TestCase):
         self.assertEqual(len(res.folders), 3)
         self.assertIn(f"{icebox_1.id}/", [x.name for x in res.folders])
 
+    def test_list_remote_cached(self):
+        ListCommandTest.storage.Destroy()
+        commands.IceboxInitCommand(str(self.test_folder_1)).run()
+        # storages without a registry are listed
+        ListCommandTest.storage.Delete(common.utils.GetRegistryPath())
+        common.utils.InvalidateListings(ListCommandTest.storage)
+
+        def list_all() -> ListResult:
+            return commands.IceboxListCommand(
+                path=None, remote=True).list_remote()
+
+        # listings of all iceboxes are reused within the TTL
+        res = list_all()
+        self.assertEqual(len(res.folders), 1)
+        with patch.object(ListCommandTest.storage, 'ListRemote') as listed:
+            res = list_all()
+            listed.assert_not_called()
+        self.assertEqual(len(res.folders), 1)
+        self.assertIsNotNone(res.folders[0].updated)
+
+        # changes made elsewhere show once the TTL has passed
+        ListCommandTest.storage.UploadData(b"{}", "elsewhere/.icebox")
+        self.assertEqual(len(list_all().folders), 1)
+        with patch.object(config, 'ICEBOX_LISTING_TTL', 0):
+            self.assertEqual(len(list_all().folders), 2)
+
+        # our own writes invalidate the cached listing right away
+        self.assertEqual(len(list_all().folders), 1)
+        commands.IceboxInitCommand(str(self.test_folder_2)).run()
+        self.assertEqual(len(list_all().folders), 3)
+
+    def test_list_remote_registry(self):
+        ListCommandTest.storage.Destroy()
+        size = self.test_subfile_1.stat().st_size
+        commands.IceboxInitCommand(str(self.test_folder_1)).run()
+        commands.IceboxFreezeCommand(str(self.test_folder_1)).run()
+        icebox_1 = common.utils.FindIcebox(self.test_folder_1)
+
+        def list_all(rebuild: bool = False) -> ListResult:
+            return commands.IceboxListCommand(
+                path=None, remote=True, rebuild=rebuild).list_remote()
+
+        # iceboxes are listed from the registry with their summary
+        with patch.object(ListCommandTest.storage, 'ListRemote') as listed:
+            res = list_all()
+            listed.assert_not_called()
+        self.assertEqual([x.name for x in res.folders], [f"{icebox_1.id}/"])
+        self.assertEqual(res.folders[0].file_count, 1)
+        self.assertEqual(res.folders[0].size, size)
+        self.assertIsNotNone(res.folders[0].updated)
+        self.assertIn("(1 file, ", res.output)
+
+        # iceboxes that are not registered show up once it is rebuilt
+        ListCommandTest.storage.UploadData(
+            ListCommandTest.storage.DownloadData(
+                f"{icebox_1.id}/{config.ICEBOX_FILE_NAME}"),
+            f"elsewhere/{config.ICEBOX_FILE_NAME}")
+        self.assertEqual(len(list_all().folders), 1)
+
+        # iceboxes that cannot be read are skipped by the rebuild
+        read = common.utils.ReadRemoteIcebox
+
+        def failing_read(name: str, storage=None):
+            if name == "elsewhere":
+                raise IceboxStorageError("unreadable")
+            return read(name, storage=storage)
+
+        with patch.object(
+                common.utils, 'ReadRemoteIcebox', side_effect=failing_read):
+            res = list_all(rebuild=True)
+        self.assertEqual([x.name for x in res.folders], [f"{icebox_1.id}/"])
+
+        res = list_all(rebuild=True)
+        self.assertEqual(
+            {x.name: x.file_count for x in res.folders},
+            {"elsewhere/": 1, f"{icebox_1.id}/": 1})
+
+        # a deleted registry falls back to listing the storage
+        ListCommandTest.storage.Delete(common.utils.GetRegistryPath())
+        self.assertEqual(
+            sorted(x.name for x in list_all().folders),
+            sorted(["elsewhere/", f"{icebox_1.id}/"]))
+
+        # only the listing of all remote iceboxes can be rebuilt
+        with self.assertRaises(IceboxError):
+            commands.IceboxListCommand(path=None, rebuild=True)
+        with self.assertRaises(IceboxError):
+            commands.IceboxListCommand(
+                path=icebox_1.id, remote=True, rebuild=True)
+
+    @patch.object(config, 'ICEBOX_FREEZE_MODE', "content")
+    def test_list_remote_content_addressed(self):
+        # remote listing should show files that are not stored at their path
+        commands.IceboxInitCommand(str(self.test_folder)).run()
+        commands.IceboxFreezeCommand(str(self.test_folder)).run()
+        icebox = common.utils.FindIcebox(self.test_folder)
+        res: ListResult = commands.IceboxListCommand(
+            path=icebox.id, remote=True).list_remote()
+        self.assertEqual(
+            [x.name for x in res.folders], [f"{self.test_subfolder.name}/"])
+        self.assertEqual(
+            [x.name for x in res.files], [self.test_folder_file.name])
+        res: ListResult = commands.IceboxListCommand(
+            path=f"{icebox.id}/subfolder", remote=True).list_remote()
+        self.assertEqual(len(res.files), 2)
+        self.assertGreater(res.files[0].size, 0)
+
+        # listing a missing path should raise an error
+        with self.assertRaises(IceboxStorageError):
+            commands.IceboxListCommand(
+                path=f"{icebox.id}/doesnotexist", remote=True).list_remote()
+
     def test_local(self):
         # clean init
         ListCommandTest.storage.Destroy()
@@ -135,3 +251,41 @@ class ListCommandTest(unittest.TestCase):
         self.assertEqual(res.folders[0].name,  f"{self.test_subfolder.name}/")
         self.assertTrue(len(res.files), 1)
         self.assertEqual(res.files[0].name, self.test_folder_file.name)
+
+    def test_local_options(self):
+        commands.IceboxInitCommand(str(self.test_folder)).run()
+        big_file = self.test_folder / "zbigfile"
+        big_file.write_bytes(b"x" * 100)
+
+        # folders come before files, sorted by name by default
+        res: ListResult = commands.IceboxListCommand(
+            path=str(self.test_folder)).list_local()
+        self.assertEqual(
+            [x.name for x in res.folders + res.files],
+            ["subfolder/", "thisisafile", "zbigfile"])
+        self.assertTrue(res.output.endswith("total 3\n\n"))
+
+        # the limit applies after sorting, in either direction
+        res: ListResult = commands.IceboxListCommand(
+            path=str(self.test_folder), sort="size", reverse=True,
+            limit=2).list_local()
+        self.assertEqual(
+            [x.name for x in res.folders + res.files],
+            ["subfolder/", "zbigfile"])
+        res: ListResult = commands.IceboxListCommand(
+            path=str(self.test_folder), sort="none", limit=1).list_local()
+        self.assertEqual(len(res.folders) + len(res.files), 1)
+
+        # nested paths list names, and frozen files are marked
+        commands.IceboxFreezeCommand(str(self.test_subfolder)).run()
+        res: ListResult = commands.IceboxListCommand(
+            path=str(self.test_subfolder), as_json=True).list_local()
+        lines = [json.loads(x) for x in res.output.splitlines()]
+        self.assertEqual(
+            [x['name'] for x in lines],
+            [self.test_subfolder_file.name, self.test_subfolder_file_2.name])
+        self.assertTrue(all(x['is_frozen'] for x in lines))
+        self.assertFalse(any(x['is_modified'] for x in lines))
+
+        with self.assertRaises(IceboxError):
+            commands.IceboxListCommand(sort="color")
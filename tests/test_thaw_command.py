@@ -8,6 +8,8 @@ load_dotenv(dotenv_path=(Path('.') / '.env_test'))
 from .utils import TestUtils
 from app import commands
 from app import common
+from app import config
+from app.elements.icebox import FrozenFile
 from app.elements.icebox import IceboxError
 from app.storage import local_storage
 from app.storage.icebox_storage import IceboxStorageError
@@ -155,6 +157,75 @@ class ThawCommandTest(unittest.TestCase):
         self.assertEqual(
             self.test_subfolder_file.stat().st_size, overwritten_file_size)
 
+    def test_thaw_stale_shards(self):
+        # thaw should synchronize before loading the shards it needs
+        commands.IceboxInitCommand(str(self.test_folder)).run()
+        file_size = self.test_subfolder_file.stat().st_size
+        commands.IceboxFreezeCommand(str(self.test_subfolder)).run()
+        icebox = common.utils.FindIcebox(self.test_folder)
+        with patch.object(config, 'ICEBOX_SHARD_SIZE', 1):
+            common.utils.WriteSnapshot(icebox)
+        icebox_path = common.utils.ResolveIcebox(self.test_folder)
+        stale = icebox_path.read_bytes()
+
+        # another clone replaces the shard of the subfolder
+        other = common.utils.FindIcebox(self.test_folder)
+        common.utils.LoadShards(other, other.shards_to_load(""))
+        other.add_frozen_file("subfolder/other", FrozenFile(size=1))
+        common.utils.Finalize(other)
+        with patch.object(config, 'ICEBOX_SHARD_SIZE', 1):
+            common.utils.WriteSnapshot(other)
+        self.assertNotEqual(
+            other.shards["subfolder"], icebox.shards["subfolder"])
+
+        icebox_path.write_bytes(stale)
+        self.test_subfolder_file.unlink()
+        commands.IceboxThawCommand(str(self.test_subfolder_file)).run()
+        self.assertEqual(self.test_subfolder_file.stat().st_size, file_size)
+
+    def test_thaw_many_files(self):
+        # thaw should not limit the number of files thawed in one run
+        # * every file should be restored and removed from the icebox
+        many_files = [
+            test_utils.CreateTestFile(f'file_{i}', prefix=self.test_subfolder)
+            for i in range(120)]
+        file_size = {f: f.stat().st_size for f in many_files}
+        commands.IceboxInitCommand(str(self.test_folder)).run()
+        commands.IceboxFreezeCommand(str(self.test_subfolder)).run()
+        commands.IceboxThawCommand(str(self.test_subfolder), jobs=4).run()
+        icebox = common.utils.FindIcebox(self.test_folder)
+        for f, s in file_size.items():
+            self.assertEqual(f.stat().st_size, s)
+            self.assertNotIn(f"subfolder/{f.name}", icebox.frozen_files)
+
+    def test_thaw_file_error(self):
+        # a file that cannot be thawed is skipped, the others are thawed
+        # and removed from the icebox
+        many_files = [
+            test_utils.CreateTestFile(f'file_{i}', prefix=self.test_subfolder)
+            for i in range(20)]
+        file_size = {f: f.stat().st_size for f in many_files}
+        commands.IceboxInitCommand(str(self.test_folder)).run()
+        commands.IceboxFreezeCommand(str(self.test_subfolder)).run()
+        download = common.utils.DownloadFile
+
+        def failing_download(icebox, relpath, storage=None):
+            if relpath == "subfolder/file_7":
+                raise PermissionError(relpath)
+            download(icebox, relpath, storage=storage)
+
+        with patch.object(
+                common.utils, 'DownloadFile', side_effect=failing_download):
+            commands.IceboxThawCommand(str(self.test_subfolder), jobs=2).run()
+        icebox = common.utils.FindIcebox(self.test_folder)
+        for f, s in file_size.items():
+            if f.name == "file_7":
+                self.assertEqual(f.stat().st_size, 0)
+                self.assertIn("subfolder/file_7", icebox.frozen_files)
+            else:
+                self.assertEqual(f.stat().st_size, s)
+                self.assertNotIn(f"subfolder/{f.name}", icebox.frozen_files)
+
     @patch(
         'app.commands.IceboxThawCommand._IceboxThawCommand__download_file')
     def test_thaw_download_error(self, mocked_function):
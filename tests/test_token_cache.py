@@ -0,0 +1,114 @@
+import json
+import os
+import stat
+import threading
+import unittest
+
+from http import server
+from unittest.mock import patch
+from dotenv import load_dotenv
+from pathlib import Path
+load_dotenv(dotenv_path=(Path('.') / '.env_test'))
+
+import rsa
+from google.auth.transport import requests
+
+from .utils import TestUtils
+from app import config
+from app.storage import token_cache
+
+test_utils = TestUtils()
+
+SCOPES = ["https://www.googleapis.com/auth/devstorage.full_control"]
+
+
+class _TokenHandler(server.BaseHTTPRequestHandler):
+    """Stand-in for the OAuth token endpoint of service accounts."""
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        self.server.requests += 1
+        body = json.dumps({
+            'access_token': f"token_{self.server.requests}",
+            'expires_in': self.server.expires_in,
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', "application/json")
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TokenCacheTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        _, key = rsa.newkeys(1024)
+        cls.private_key = key.save_pkcs1().decode()
+
+    def setUp(self):
+        self.test_folder = test_utils.CreateTestFolder('token_test')
+        self.server = server.HTTPServer(('127.0.0.1', 0), _TokenHandler)
+        self.server.requests = 0
+        self.server.expires_in = 3600
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.cred = self.test_folder / "creds.json"
+        self.cred.write_text(json.dumps({
+            'type': "service_account",
+            'project_id': "some_project",
+            'private_key_id': "some_key",
+            'private_key': self.private_key,
+            'client_email': "icebox@some_project.iam.gserviceaccount.com",
+            'token_uri': f"http://127.0.0.1:{self.server.server_port}/token",
+        }))
+        patcher = patch.object(
+            config, 'ICEBOX_TOKEN_CACHE_LOCATION',
+            str(self.test_folder / "tokens"))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        test_utils.DeleteFolderAndContents(self.test_folder)
+
+    def _refresh(self) -> token_cache.CachedServiceAccountCredentials:
+        credentials = token_cache.LoadCredentials(str(self.cred), SCOPES)
+        credentials.before_request(requests.Request(), "GET", "url", {})
+        return credentials
+
+    def test_token_cache(self):
+        # the first invocation mints a token and caches it
+        credentials = self._refresh()
+        self.assertEqual(credentials.token, "token_1")
+        cached = list((self.test_folder / "tokens").iterdir())
+        self.assertEqual(len(cached), 1)
+        if os.name == 'posix':
+            self.assertEqual(stat.S_IMODE(cached[0].stat().st_mode), 0o600)
+
+        # later invocations reuse it
+        self.assertEqual(self._refresh().token, "token_1")
+        self.assertEqual(self.server.requests, 1)
+
+        # other scopes do not share it
+        token_cache.LoadCredentials(
+            str(self.cred), SCOPES + ["other"]).before_request(
+                requests.Request(), "GET", "url", {})
+        self.assertEqual(self.server.requests, 2)
+
+    def test_refresh_ahead_of_expiry(self):
+        # tokens that expire within the margin are refreshed
+        self.server.expires_in = config.ICEBOX_TOKEN_REFRESH_MARGIN // 2
+        credentials = self._refresh()
+        self.assertTrue(credentials.expired)
+        self.assertEqual(self._refresh().token, "token_2")
+
+        # corrupt cache files are ignored
+        for f in (self.test_folder / "tokens").iterdir():
+            f.write_text("not json")
+        self.server.expires_in = 3600
+        self.assertEqual(self._refresh().token, "token_3")
+        self.assertEqual(self._refresh().token, "token_3")